@@ -58,6 +58,11 @@ CREATE TABLE IF NOT EXISTS groups_config (
     max_members INT DEFAULT 0,
     welcome_message TEXT,
     kick_message TEXT,
+    notice_mode ENUM('individual', 'digest') NULL DEFAULT NULL,
+    reencode_after_days INT NULL DEFAULT NULL,
+    archive_after_days INT NULL DEFAULT NULL,
+    delete_after_days INT NULL DEFAULT NULL,
+    storage_mode ENUM('eager', 'lazy') NULL DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (license_key) REFERENCES licenses(license_key) ON DELETE CASCADE
 );
@@ -122,6 +127,8 @@ CREATE TABLE IF NOT EXISTS group_members (
     last_active_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (user_id, group_id),
+    INDEX idx_last_active (last_active_timestamp),
+    INDEX idx_cycle_start (is_restricted, cycle_start_date),
     FOREIGN KEY (group_id) REFERENCES groups_config(group_id) ON DELETE CASCADE
 );
 
@@ -170,9 +177,38 @@ CREATE TABLE IF NOT EXISTS user_activity_log (
     message_content TEXT,
     telegram_file_id VARCHAR(255),
     local_file_path TEXT,
+    display_file_path TEXT,
+    thumbnail_file_path TEXT,
     points_earned INT DEFAULT 0,
     is_valid BOOLEAN DEFAULT TRUE,
+    suspected_duplicate BOOLEAN DEFAULT FALSE,
+    duplicate_of_file_id VARCHAR(255) NULL DEFAULT NULL,
     activity_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_activity_file (group_id, user_id, telegram_file_id),
+    FOREIGN KEY (group_id) REFERENCES groups_config(group_id) ON DELETE CASCADE
+);
+
+-- PHOTO HASHES TABLE (perceptual hashes of stored photos, for re-post detection)
+CREATE TABLE IF NOT EXISTS photo_hashes (
+    hash_id INT AUTO_INCREMENT PRIMARY KEY,
+    group_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    telegram_file_id VARCHAR(255) NOT NULL,
+    dhash BIGINT UNSIGNED NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_photo_hashes_recent (group_id, created_at),
+    FOREIGN KEY (group_id) REFERENCES groups_config(group_id) ON DELETE CASCADE
+);
+
+-- STORAGE USAGE TABLE (bytes and files on disk per group, media type and day)
+CREATE TABLE IF NOT EXISTS storage_usage (
+    group_id BIGINT NOT NULL,
+    media_type VARCHAR(32) NOT NULL,
+    day DATE NOT NULL,
+    file_count INT NOT NULL DEFAULT 0,
+    byte_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, media_type, day),
     FOREIGN KEY (group_id) REFERENCES groups_config(group_id) ON DELETE CASCADE
 );
 
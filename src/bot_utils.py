@@ -1,23 +1,369 @@
 import asyncio
+import heapq
+import itertools
 import logging
+import time
+from collections import deque
+from enum import IntEnum
 from telegram import Update, CallbackQuery, Message
+from telegram.constants import MessageLimit, ParseMode
 from telegram.ext import ContextTypes
+from telegram.helpers import mention_html
 from telegram.error import RetryAfter, TimedOut
+import config
 
 logger = logging.getLogger(__name__)
 
+MAX_MESSAGE_LENGTH = MessageLimit.MAX_TEXT_LENGTH
+
+
+class Priority(IntEnum):
+    """Outbound request classes, most urgent first."""
+    INTERACTIVE = 0   # replies to a user who just did something
+    ANNOUNCEMENT = 1  # slot announcements, welcomes, kicks
+    DIGEST = 2        # job notices and leaderboards
+    CLEANUP = 3       # deleting our own transient messages
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`. `pause` blocks it after a RetryAfter."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        blocked = max(0.0, self.updated - now)
+        return blocked + (max(0.0, 1 - self.tokens) / self.rate)
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        # Hold everything until the pause is over, then allow a single request through
+        self.tokens = min(self.tokens, 1)
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+    @property
+    def idle(self):
+        return self.tokens >= self.capacity and self.updated <= time.monotonic()
+
+
+class _Lane:
+    """Pending requests of one rate-limit key, one FIFO per priority."""
+
+    __slots__ = ("queues", "version", "ready_rank")
+
+    def __init__(self):
+        self.queues = {priority: deque() for priority in Priority}
+        self.version = 0
+        self.ready_rank = None  # (priority, seq) it sits in the ready heap with, None while waiting
+
+    def head(self):
+        for priority, queue in self.queues.items():
+            if queue:
+                return priority, queue[0][0]
+        return None
+
+    def pop(self):
+        """The most urgent request whose caller is still waiting, or None."""
+        for queue in self.queues.values():
+            while queue:
+                request = queue.popleft()
+                if not request[2].done():
+                    return request
+        return None
+
+
+class OutboundDispatcher:
+    """
+    Single gate for every Telegram call the bot makes.
+
+    Requests are grouped into lanes by rate-limit key: (chat_id, False) for messages into a chat and
+    (chat_id, True) for deleting messages there. Deletes have their own per-chat bucket, so clearing
+    transient messages never spends the group's 20 messages a minute. Within a lane there is one
+    FIFO per Priority. A lane whose bucket has a token sits in a ready heap ordered by its most urgent
+    request (priority, then arrival); a lane that is out of tokens sits in a waiting heap ordered by
+    when its next token is due, and moves back to the ready heap then. So each dispatch costs
+    O(log lanes) however many chats have something queued, and a group that is out of tokens never
+    holds up other chats. The bot-wide bucket gates every dispatch.
+
+    Each request is started as its own task, so a slow HTTP round trip never stalls the queue. The
+    caller awaits the result (or exception) of its own call. A RetryAfter from Telegram pauses the
+    bucket it applies to, so everything else queued in that lane waits too.
+
+    Until `start` is called, `submit` simply runs the call directly.
+    """
+
+    def __init__(self, global_rate, group_rate_per_minute, cleanup_rate_per_minute=None):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate_per_minute = group_rate_per_minute
+        self.cleanup_rate_per_minute = cleanup_rate_per_minute or group_rate_per_minute
+        self._buckets = {}  # lane key -> TokenBucket (groups and channels only)
+        self._lanes = {}    # lane key -> _Lane, only while it has requests
+        self._ready = []    # (priority, seq, tick, version, key)
+        self._waiting = []  # (ready_at monotonic, tick, version, key)
+        self._seq = itertools.count()
+        self._tick = itertools.count()
+        self._inflight = set()
+        self._wakeup = None
+        self._task = None
+        self.counters = {"sent": 0, "retry_after": 0, "errors": 0}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def stats(self):
+        """Pending requests per priority plus lifetime counters."""
+        pending = {priority.name.lower(): 0 for priority in Priority}
+        for lane in self._lanes.values():
+            for priority, queue in lane.queues.items():
+                pending[priority.name.lower()] += len(queue)
+        return {**pending, "inflight": len(self._inflight), **self.counters}
+
+    def _bucket(self, key):
+        # Only groups and channels (negative IDs) have a per-chat limit; private chats share the global one.
+        chat_id, cleanup = key
+        if chat_id is None or chat_id >= 0:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.idle}
+            rate = self.cleanup_rate_per_minute if cleanup else self.group_rate_per_minute
+            bucket = self._buckets[key] = TokenBucket(rate / 60, rate)
+        return bucket
+
+    async def submit(self, chat_id, call, priority=Priority.ANNOUNCEMENT):
+        """Queue `call` (a zero-argument coroutine function) for `chat_id` and return its result."""
+        if not self.running:
+            return await call()
+        future = asyncio.get_running_loop().create_future()
+        key = (chat_id, priority == Priority.CLEANUP)
+        seq = next(self._seq)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+            lane.queues[priority].append((seq, call, future))
+            self._schedule(key, lane, time.monotonic())
+        else:
+            lane.queues[priority].append((seq, call, future))
+            if lane.ready_rank is not None and (priority, seq) < lane.ready_rank:
+                self._schedule(key, lane, time.monotonic())
+        self._wakeup.set()
+        return await future
+
+    def _schedule(self, key, lane, now):
+        """(Re)place a lane in the ready or waiting heap; older heap entries for it go stale."""
+        head = lane.head()
+        if head is None:
+            del self._lanes[key]
+            return
+        lane.version += 1
+        bucket = self._bucket(key)
+        wait = bucket.wait_time(now) if bucket else 0
+        if wait > 0:
+            lane.ready_rank = None
+            heapq.heappush(self._waiting, (now + wait, next(self._tick), lane.version, key))
+        else:
+            lane.ready_rank = head
+            heapq.heappush(self._ready, (*head, next(self._tick), lane.version, key))
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Outbound dispatcher started (%s msg/s global, %s msg/min per group)",
+                    self.global_bucket.rate, self.group_rate_per_minute)
+
+    async def stop(self):
+        """Stop dispatching, cancel requests that never started and wait for the ones in flight."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes.values():
+            for queue in lane.queues.values():
+                while queue:
+                    queue.popleft()[2].cancel()
+        self._lanes.clear()
+        self._ready.clear()
+        self._waiting.clear()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        logger.info("Outbound dispatcher stopped: %s", self.stats())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            wait = self._dispatch_ready()
+            if wait == 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch_ready(self):
+        """
+        Start the most urgent request the buckets allow. Returns 0 if one was started,
+        otherwise the seconds until one could be (None when nothing is queued).
+        """
+        now = time.monotonic()
+        while self._waiting and self._waiting[0][0] <= now:
+            _, _, version, key = heapq.heappop(self._waiting)
+            lane = self._lanes.get(key)
+            if lane is not None and lane.version == version:
+                self._schedule(key, lane, now)
+
+        while self._ready:
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                return global_wait
+            _, _, _, version, key = heapq.heappop(self._ready)
+            lane = self._lanes.get(key)
+            if lane is None or lane.version != version:
+                continue  # stale entry
+            bucket = self._bucket(key)
+            if bucket and bucket.wait_time(now) > 0:  # paused by a RetryAfter since it was scheduled
+                self._schedule(key, lane, now)
+                continue
+            request = lane.pop()
+            if request is None:
+                del self._lanes[key]
+                continue
+            _, call, future = request
+            self.global_bucket.consume(now)
+            if bucket:
+                bucket.consume(now)
+            self._schedule(key, lane, now)
+            task = asyncio.create_task(self._execute(key, call, future))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            return 0
+
+        return max(0.0, self._waiting[0][0] - now) if self._waiting else None
+
+    async def _execute(self, key, call, future):
+        try:
+            result = await call()
+        except RetryAfter as e:
+            self.counters["retry_after"] += 1
+            (self._bucket(key) or self.global_bucket).pause(e.retry_after)
+            self._wakeup.set()
+            if not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            self.counters["errors"] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.counters["sent"] += 1
+            if not future.done():
+                future.set_result(result)
+
+
+# Shared by every safe_* helper (started from main.post_init)
+outbound = OutboundDispatcher(config.OUTBOUND_GLOBAL_RATE, config.OUTBOUND_GROUP_RATE_PER_MINUTE,
+                              config.OUTBOUND_CLEANUP_RATE_PER_MINUTE)
+
+
+async def run_for_groups(groups, handler, job_name, concurrency=None):
+    """
+    Runs `handler(group)` for every group concurrently, with at most `concurrency`
+    (default JOB_GROUP_CONCURRENCY) groups in flight. A failure in one group is logged
+    and does not affect the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency or config.JOB_GROUP_CONCURRENCY)
+
+    async def run(group):
+        async with semaphore:
+            try:
+                await handler(group)
+            except Exception as e:
+                logger.error("%s failed for group %s: %s", job_name, group.get("group_id"), e, exc_info=True)
+
+    await asyncio.gather(*(run(group) for group in groups))
+
+
+def mention(user_id, name):
+    """HTML text mention of a member that works without a username."""
+    return mention_html(user_id, name or "User")
+
+
+def chunk_digest(header, lines, footer="", limit=MAX_MESSAGE_LENGTH):
+    """
+    Splits a digest into messages of at most `limit` characters. The header opens the
+    first message and the footer closes the last one; lines are never split across messages.
+    """
+    chunks, current = [], header
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if footer:
+        if len(current) + 2 + len(footer) > limit:
+            chunks.append(current)
+            current = footer
+        else:
+            current = f"{current}\n\n{footer}"
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def send_member_notices(context: ContextTypes.DEFAULT_TYPE, chat_id: int, notices, mode: str, header: str, footer: str = ""):
+    """
+    Announces per-member notices from a job to one group.
+
+    `notices` is a list of (individual_text, digest_line) pairs. In "digest" mode the HTML
+    digest lines are gathered under `header`, chunked at Telegram's message length
+    limit; in "individual" mode every member gets their own plain message as before.
+    """
+    if not notices:
+        return
+    if mode != "digest":
+        for individual_text, _ in notices:
+            await safe_send_message(context=context, chat_id=chat_id, text=individual_text, priority=Priority.DIGEST)
+        return
+    for text in chunk_digest(header, [line for _, line in notices], footer):
+        await safe_send_message(context=context, chat_id=chat_id, text=text, priority=Priority.DIGEST, parse_mode=ParseMode.HTML)
+
+
+async def _wait_retry_after(error):
+    # The dispatcher has already paused the chat's bucket, so the retry simply queues behind it.
+    if not outbound.running:
+        await asyncio.sleep(error.retry_after)
+
 # safely send messages
-async def safe_send_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, max_retries: int = 2, **kwargs) -> Message | None:
+async def safe_send_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, max_retries: int = 2,
+                            priority: Priority = Priority.ANNOUNCEMENT, **kwargs) -> Message | None:
     """
-    Safely sends a message, handling common Telegram API errors like rate limits and timeouts.
+    Safely sends a message through the outbound dispatcher, handling common Telegram API errors like rate limits and timeouts.
     """
     for attempt in range(max_retries):
         try:
-            message = message = await context.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            message = await outbound.submit(chat_id, lambda: context.bot.send_message(chat_id=chat_id, text=text, **kwargs), priority)
             return message
         except RetryAfter as e:
             logger.warning("Rate limit exceeded for chat %s. Waiting for %s seconds. Attempt %s/%s.", chat_id, e.retry_after, attempt + 1, max_retries,exc_info=True)
-            await asyncio.sleep(e.retry_after)
+            await _wait_retry_after(e)
         except TimedOut:
             wait_time = 5 * (attempt + 1)
             logger.warning("Telegram API timed out for chat %s. Retrying in %s seconds. Attempt %s/%s.", chat_id, wait_time, attempt + 1, max_retries,exc_info=True)
@@ -30,14 +376,17 @@ async def safe_send_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, te
     return None
 
 # safely replies ot messages
-async def safe_reply_text(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, max_retries: int = 2, **kwargs) -> Message | None:
+async def safe_reply_text(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, max_retries: int = 2,
+                          priority: Priority = Priority.INTERACTIVE, **kwargs) -> Message | None:
+    chat_id = update.effective_chat.id
     for attempt in range(max_retries):
         try:
-            message = await context.bot.send_message(chat_id=update.effective_chat.id, text=text, reply_to_message_id=update.message.message_id, **kwargs)
+            message = await outbound.submit(chat_id, lambda: context.bot.send_message(
+                chat_id=chat_id, text=text, reply_to_message_id=update.message.message_id, **kwargs), priority)
             return message
         except RetryAfter as e:
             logger.warning("Rate limit on reply. Waiting %s s.", e.retry_after,exc_info=True)
-            await asyncio.sleep(e.retry_after)
+            await _wait_retry_after(e)
         except TimedOut:
             logger.warning("Timeout on reply. Retrying...",exc_info=True)
             await asyncio.sleep(5 * (attempt + 1))
@@ -49,14 +398,16 @@ async def safe_reply_text(update: Update, context: ContextTypes.DEFAULT_TYPE, te
     return None
 
 # safely edits messages
-async def safe_edit_message_text(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int, text: str, max_retries: int = 2, **kwargs) -> Message | None:
+async def safe_edit_message_text(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int, text: str, max_retries: int = 2,
+                                 priority: Priority = Priority.INTERACTIVE, **kwargs) -> Message | None:
     for attempt in range(max_retries):
         try:
-            message = await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, **kwargs)
+            message = await outbound.submit(chat_id, lambda: context.bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, **kwargs), priority)
             return message
         except RetryAfter as e:
             logger.warning("Rate limit on edit. Waiting %s s.", e.retry_after,exc_info=True)
-            await asyncio.sleep(e.retry_after)
+            await _wait_retry_after(e)
         except TimedOut:
             logger.warning("Timeout on edit. Retrying...",exc_info=True)
             await asyncio.sleep(5 * (attempt + 1))
@@ -68,7 +419,8 @@ async def safe_edit_message_text(context: ContextTypes.DEFAULT_TYPE, chat_id: in
     return None
 
 
-async def safe_callback_reply_text(query: "CallbackQuery", context: ContextTypes.DEFAULT_TYPE, text: str, max_retries: int = 2, **kwargs) -> Message | None:
+async def safe_callback_reply_text(query: "CallbackQuery", context: ContextTypes.DEFAULT_TYPE, text: str, max_retries: int = 2,
+                                   priority: Priority = Priority.INTERACTIVE, **kwargs) -> Message | None:
     """
     Safely replies to the message that a callback query originated from.
     """
@@ -77,11 +429,12 @@ async def safe_callback_reply_text(query: "CallbackQuery", context: ContextTypes
 
     for attempt in range(max_retries):
         try:
-            message = await context.bot.send_message(chat_id=query.message.chat_id, text=text, reply_to_message_id=query.message.message_id, **kwargs)
+            message = await outbound.submit(query.message.chat_id, lambda: context.bot.send_message(
+                chat_id=query.message.chat_id, text=text, reply_to_message_id=query.message.message_id, **kwargs), priority)
             return message
         except RetryAfter as e:
             logger.warning("Rate limit on callback reply. Waiting %s s.", e.retry_after)
-            await asyncio.sleep(e.retry_after)
+            await _wait_retry_after(e)
         except TimedOut:
             logger.warning("Timeout on callback reply. Retrying...")
             await asyncio.sleep(5 * (attempt + 1))
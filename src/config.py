@@ -6,6 +6,49 @@ load_dotenv(override=False)
 # Telegram Bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# How updates are received: "polling" (getUpdates) or "webhook" (PTB's built-in webhook server)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public HTTPS URL Telegram posts to, including WEBHOOK_PATH
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+try:
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+except ValueError:
+    WEBHOOK_PORT = 8443
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+try:
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+except ValueError:
+    WEBHOOK_MAX_CONNECTIONS = 40
+
+# Bot API server, e.g. a local fake server for testing (default: https://api.telegram.org)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+
+# Received updates wait in a queue of this size; when it is full the webhook server stops
+# acknowledging new requests, so Telegram backs off instead of the bot buffering without bound.
+# The queue only fills once UPDATE_MAX_IN_FLIGHT updates are being handled (see below).
+try:
+    UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+except ValueError:
+    UPDATE_QUEUE_SIZE = 1000
+# Number of updates handled at the same time. Updates of the same member in the same group
+# are always handled in order; only unrelated members run in parallel.
+try:
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+except ValueError:
+    UPDATE_CONCURRENCY = 16
+# Updates taken off the queue but not finished yet (running or waiting behind an earlier update
+# of the same member). Past this, updates stay in the queue, so UPDATE_QUEUE_SIZE really applies.
+try:
+    UPDATE_MAX_IN_FLIGHT = int(os.getenv("UPDATE_MAX_IN_FLIGHT", str(UPDATE_CONCURRENCY * 4)))
+except ValueError:
+    UPDATE_MAX_IN_FLIGHT = UPDATE_CONCURRENCY * 4
+# How many recent update_ids are remembered to drop redelivered updates
+try:
+    UPDATE_DEDUPE_WINDOW = int(os.getenv("UPDATE_DEDUPE_WINDOW", "10000"))
+except ValueError:
+    UPDATE_DEDUPE_WINDOW = 10000
+
 # MySQL Database
 DB_HOST = os.getenv("DB_HOST", "localhost")
 try:
@@ -16,6 +59,13 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "1234")
 DB_NAME = os.getenv("DB_NAME", "telegram_bot_manager")
 
+# Size of the MySQL connection pool. The async data layer runs queries on a
+# thread pool of the same size so a checkout never fails with pool exhaustion.
+try:
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+except ValueError:
+    DB_POOL_SIZE = 5
+
 # Bot Settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -32,10 +82,164 @@ try:
 except ValueError:
     CONFIRMATION_TIMEOUT = 60
 
+# How long (seconds) an in-memory slot schedule is trusted before it is reloaded.
+# In-process slot changes invalidate it immediately; this only bounds how stale a
+# schedule edited directly in MySQL can get.
+try:
+    SLOT_SCHEDULE_TTL = int(os.getenv("SLOT_SCHEDULE_TTL", "300"))
+except ValueError:
+    SLOT_SCHEDULE_TTL = 300
+
+# Interval (seconds) of the safety re-sync of slot boundary jobs. Boundaries themselves fire as exact one-shot jobs.
+try:
+    SLOT_RESYNC_INTERVAL = int(os.getenv("SLOT_RESYNC_INTERVAL", "3600"))
+except ValueError:
+    SLOT_RESYNC_INTERVAL = 3600
+
+# Number of groups a periodic job processes at the same time. Kept low so a job burst
+# stays well inside Telegram's ~30 messages/second bot-wide limit.
+try:
+    JOB_GROUP_CONCURRENCY = int(os.getenv("JOB_GROUP_CONCURRENCY", "5"))
+except ValueError:
+    JOB_GROUP_CONCURRENCY = 5
+
+# How long (seconds) a compiled banned-word matcher is reused before the word list is re-read.
+try:
+    BANNED_WORDS_TTL = int(os.getenv("BANNED_WORDS_TTL", "300"))
+except ValueError:
+    BANNED_WORDS_TTL = 300
+
+# Write-behind batching for last-active updates and activity-log rows
+try:
+    WRITE_BEHIND_FLUSH_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "1000"))
+except ValueError:
+    WRITE_BEHIND_FLUSH_MS = 1000
+try:
+    WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "200"))
+except ValueError:
+    WRITE_BEHIND_MAX_ROWS = 200
+
+# Outbound Telegram rate limits enforced by bot_utils.outbound: bot-wide messages per
+# second and messages per minute into a single group.
+try:
+    OUTBOUND_GLOBAL_RATE = int(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+except ValueError:
+    OUTBOUND_GLOBAL_RATE = 30
+try:
+    OUTBOUND_GROUP_RATE_PER_MINUTE = int(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+except ValueError:
+    OUTBOUND_GROUP_RATE_PER_MINUTE = 20
+# Deleting our own transient messages has a separate per-group budget, so cleanup never
+# uses up the messages a group may receive.
+try:
+    OUTBOUND_CLEANUP_RATE_PER_MINUTE = int(os.getenv("OUTBOUND_CLEANUP_RATE_PER_MINUTE", "30"))
+except ValueError:
+    OUTBOUND_CLEANUP_RATE_PER_MINUTE = 30
+
+# How jobs announce per-member notices (warnings, kicks, cycle resets) when a group has no
+# notice_mode of its own: "digest" gathers them into as few messages as possible,
+# "individual" sends one message per member.
+NOTICE_MODE = os.getenv("NOTICE_MODE", "digest").lower()
+
 # Storage Path
 STORAGE_PATH = os.getenv("STORAGE_PATH", "storage")
 # os.makedirs(STORAGE_PATH, exist_ok=True)  # ensure path exists
 
+# Background download of submitted media: worker count, queue size, attempts per file, and
+# the file queued downloads are kept in across restarts
+try:
+    MEDIA_DOWNLOAD_WORKERS = int(os.getenv("MEDIA_DOWNLOAD_WORKERS", "3"))
+except ValueError:
+    MEDIA_DOWNLOAD_WORKERS = 3
+try:
+    MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "1000"))
+except ValueError:
+    MEDIA_QUEUE_SIZE = 1000
+try:
+    MEDIA_DOWNLOAD_ATTEMPTS = int(os.getenv("MEDIA_DOWNLOAD_ATTEMPTS", "4"))
+except ValueError:
+    MEDIA_DOWNLOAD_ATTEMPTS = 4
+MEDIA_STATE_FILE = os.getenv("MEDIA_STATE_FILE", os.path.join(STORAGE_PATH, "state", "media_downloads.json"))
+
+# Pending Yes/No confirmations: cap on how many may be outstanding, and the file they are
+# kept in across restarts (set CONFIRMATION_STATE_FILE to an empty value to keep them in memory only)
+try:
+    CONFIRMATION_MAX_PENDING = int(os.getenv("CONFIRMATION_MAX_PENDING", "10000"))
+except ValueError:
+    CONFIRMATION_MAX_PENDING = 10000
+CONFIRMATION_STATE_FILE = os.getenv("CONFIRMATION_STATE_FILE", os.path.join(STORAGE_PATH, "state", "confirmations.json"))
+
+# Store each distinct media file once under STORAGE_PATH/objects and hardlink it into the
+# per-group date/slot tree, instead of writing a separate copy per submission
+CONTENT_ADDRESSED_STORAGE = os.getenv("CONTENT_ADDRESSED_STORAGE", "true").lower() == "true"
+
+# Display and thumbnail renditions of submitted photos, encoded on a process pool
+# (IMAGE_WORKERS=0 turns renditions off). Sizes are the longest edge in pixels.
+try:
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+except ValueError:
+    IMAGE_WORKERS = 2
+try:
+    IMAGE_DISPLAY_SIZE = int(os.getenv("IMAGE_DISPLAY_SIZE", "1600"))
+except ValueError:
+    IMAGE_DISPLAY_SIZE = 1600
+try:
+    IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+except ValueError:
+    IMAGE_THUMBNAIL_SIZE = 320
+try:
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+except ValueError:
+    IMAGE_QUALITY = 80
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "webp").lower()  # "webp" or "jpeg"
+
+# Perceptual-hash re-post detection: photos within PHOTO_DUPLICATE_DISTANCE bits (of 64) of a
+# group photo from the last PHOTO_DUPLICATE_WINDOW_DAYS days are flagged (0 days turns it off).
+# Hashes are computed by the image processor, so IMAGE_WORKERS must be above 0.
+try:
+    PHOTO_DUPLICATE_DISTANCE = int(os.getenv("PHOTO_DUPLICATE_DISTANCE", "6"))
+except ValueError:
+    PHOTO_DUPLICATE_DISTANCE = 6
+try:
+    PHOTO_DUPLICATE_WINDOW_DAYS = int(os.getenv("PHOTO_DUPLICATE_WINDOW_DAYS", "30"))
+except ValueError:
+    PHOTO_DUPLICATE_WINDOW_DAYS = 30
+
+# Storage retention defaults, in days, for groups without their own policy in groups_config:
+# photos are replaced by their display rendition, day folders are packed into one .tar.gz per
+# day, and files are deleted once past the horizon. 0 turns a stage off.
+try:
+    MEDIA_REENCODE_AFTER_DAYS = int(os.getenv("MEDIA_REENCODE_AFTER_DAYS", "30"))
+except ValueError:
+    MEDIA_REENCODE_AFTER_DAYS = 30
+try:
+    MEDIA_ARCHIVE_AFTER_DAYS = int(os.getenv("MEDIA_ARCHIVE_AFTER_DAYS", "90"))
+except ValueError:
+    MEDIA_ARCHIVE_AFTER_DAYS = 90
+try:
+    MEDIA_DELETE_AFTER_DAYS = int(os.getenv("MEDIA_DELETE_AFTER_DAYS", "0"))
+except ValueError:
+    MEDIA_DELETE_AFTER_DAYS = 0
+
+# How often per-group storage usage deltas are added to the storage_usage table (seconds)
+try:
+    STORAGE_USAGE_FLUSH_SECONDS = int(os.getenv("STORAGE_USAGE_FLUSH_SECONDS", "30"))
+except ValueError:
+    STORAGE_USAGE_FLUSH_SECONDS = 30
+
+# How submitted media is stored when a group has no storage_mode of its own: "eager" downloads
+# every file after scoring, "lazy" keeps only the Telegram file_id and fetches the file into the
+# LRU media cache (capped at MEDIA_CACHE_MAX_MB) the first time it is needed.
+MEDIA_STORAGE_MODE = os.getenv("MEDIA_STORAGE_MODE", "eager").lower()
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join(STORAGE_PATH, "cache"))
+try:
+    MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", "1024"))
+except ValueError:
+    MEDIA_CACHE_MAX_MB = 1024
+
+# Where pending deletes of short-lived bot messages are kept across restarts
+EPHEMERAL_STATE_FILE = os.getenv("EPHEMERAL_STATE_FILE", os.path.join(STORAGE_PATH, "state", "ephemeral_messages.json"))
+
 # New Member Restriction Settings (in minutes)
 try:
     NEW_MEMBER_RESTRICTION_MINUTES = int(
@@ -18,7 +18,7 @@ def init_db_pool():
     try:
         connection_pool = pooling.MySQLConnectionPool(
             pool_name="telegram_bot_pool", 
-            pool_size=5,
+            pool_size=config.DB_POOL_SIZE,
             pool_reset_session=True, 
             host=config.DB_HOST, 
             port=config.DB_PORT, 
@@ -1,14 +1,19 @@
-from .start_handler import (start_handler, points_handler, schedule_handler, help_handler, test_leaderboard_handler, health_check_handler)
+from .start_handler import (start_handler, points_handler, schedule_handler, help_handler, test_leaderboard_handler, health_check_handler,
+                            review_handler, submissions_handler)
 from .join_handler import bot_join_handler, member_join_handler
 from .message_handler import (text_message_handler, photo_message_handler, video_message_handler, 
                               document_message_handler, sticker_message_handler, animation_message_handler,
                               voice_message_handler, video_note_message_handler)
 from .callback_handler import callback_handler
+from .dedupe_handler import dedupe_handler
 from .jobs import setup_jobs
 
 
 def setup_handlers(application):
     """Setup all handlers for the bot."""
+    # Duplicate-delivery filter, ahead of every other handler group
+    application.add_handler(dedupe_handler, group=-1)
+
     # Command handlers
     application.add_handler(start_handler)
     application.add_handler(points_handler)
@@ -17,6 +22,8 @@ def setup_handlers(application):
     application.add_handler(help_handler)
     application.add_handler(test_leaderboard_handler)  # Admin-only test command
     application.add_handler(health_check_handler)
+    application.add_handler(review_handler)  # Admin-only re-post review
+    application.add_handler(submissions_handler)  # Admin-only view of recent photo submissions
 
     # Chat member handlers (for tracking joins/leaves)
     application.add_handler(bot_join_handler)
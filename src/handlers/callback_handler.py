@@ -1,17 +1,21 @@
 from telegram import Update
 from telegram.ext import CallbackQueryHandler, ContextTypes
 import logging
+import time
 from datetime import datetime
-from services import database_service as db
-from db import execute_query
-from services.file_storage import FileStorage
-import config
+from services import async_database_service as db
 from pytz import timezone, utc
-from bot_utils import safe_send_message, safe_edit_message_text, safe_callback_reply_text
+from bot_utils import safe_send_message, safe_edit_message_text, safe_callback_reply_text, Priority
+from services.ephemeral_messages import reaper
+from services.confirmation_store import confirmations
+from services.media_pipeline import media_pipeline
 
 logger = logging.getLogger(__name__)
 ist=timezone("Asia/Kolkata")
 
+# Expired button locks are swept once the dict grows past this many entries
+BUTTON_LOCK_PRUNE_SIZE = 1000
+
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle callback queries from inline keyboards."""
     query = update.callback_query
@@ -53,8 +57,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
     expected_user_id = int(parts[3])
 
     # Get pending confirmation data
-    pending_confirmations = context.bot_data.get("pending_confirmations", {})
-    confirmation_data = pending_confirmations.get(query.message.message_id)
+    confirmation_data = confirmations.get(query.message.chat_id, query.message.message_id)
 
     if not confirmation_data:
         await safe_edit_message_text(
@@ -67,10 +70,10 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Verify it's the right user
     if query.from_user.id != expected_user_id:
         response_msg = await safe_callback_reply_text(query, context, text = f"{first_name}, this confirmation is not for you!")
-        context.job_queue.run_once(lambda _: context.bot.delete_message(chat_id=response_msg.chat_id, message_id=response_msg.message_id),when=5)
+        reaper.schedule_message(response_msg, 5)
         return
 
-    context.bot_data["pending_confirmations"].pop(query.message.message_id, None)
+    confirmations.pop(query.message.chat_id, query.message.message_id)
     await query.answer()
 
     response = parts[1]  # 'yes' or 'no'
@@ -93,7 +96,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             photo_file_id = confirmation_data["photo_file_id"]
 
             # Get slot configuration to determine points
-            slot = db.get_active_slot(group_id)
+            slot = await db.get_active_slot(group_id)
             if not slot:
                 await safe_edit_message_text(
                     context, 
@@ -105,30 +108,23 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             points = slot["slot_points"]
 
             try:
-                # Download and save photo
-                file = await context.bot.get_file(photo_file_id)
-
-                timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
-                filename = f"{username}_{slot_name}_{timestamp}.jpg"
-
-                storage = FileStorage(config.STORAGE_PATH)
-                local_path = await storage.save_photo(group_id, expected_user_id, username, slot_name, file, filename)
-
-                # Award points
-                db.add_points(group_id, expected_user_id, points, event_id)
-                db.log_activity(group_id=group_id, user_id=expected_user_id, activity_type="photo", slot_name=slot_name,
-                                telegram_file_id=photo_file_id, local_file_path=local_path, points_earned=points, is_valid=True,
-                                username=username, first_name=first_name, last_name=last_name)
-
-                if event_id: db.mark_slot_completed(group_id, event_id, slot_id, expected_user_id, "completed", points)
+                # Award points; the photo is downloaded in the background
+                awarded = await db.award_slot(group_id, event_id, slot_id, expected_user_id, points, "photo", slot_name,
+                                              username=username, first_name=first_name, last_name=last_name,
+                                              telegram_file_id=photo_file_id)
 
                 await safe_edit_message_text(
                     context, 
                     chat_id=query.message.chat_id, 
                     message_id=query.message.message_id, 
-                    text=f"✅ {display_name} scored {points} points!")
+                    text=f"✅ {display_name} scored {points} points!" if awarded else f"✅ {first_name}, you've already completed this slot today!")
                 logger.info(f"User {expected_user_id} confirmed photo for slot {slot_name}, awarded {points} points")
 
+                if awarded:
+                    timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
+                    filename = f"{username}_{slot_name}_{timestamp}.jpg"
+                    await media_pipeline.submit(context.bot, group_id, expected_user_id, username, slot_name, photo_file_id, filename)
+
             except Exception as e:
                 logger.error(f"Error saving confirmed photo: {e}",exc_info=True)
                 await safe_edit_message_text(
@@ -144,7 +140,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             file_ext = confirmation_data.get("file_ext", "file")
 
             # Get slot configuration to determine points
-            slot = db.get_active_slot(group_id)
+            slot = await db.get_active_slot(group_id)
             if not slot:
                 await safe_edit_message_text(
                     context, 
@@ -158,25 +154,13 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             else: points = slot["slot_points"]
 
             try:
-                # Download and save media
-                file = await context.bot.get_file(file_id)
+                # Award points; the media is downloaded in the background
+                awarded = await db.award_slot(group_id, event_id, slot_id, expected_user_id, points, media_type, slot_name,
+                                              username=username, first_name=first_name, last_name=last_name, message_content=caption,
+                                              telegram_file_id=file_id)
 
-                timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
-                filename = f"{username}_{slot_name}_{timestamp}.{file_ext}"
-
-                storage = FileStorage(config.STORAGE_PATH)
-                local_path = await storage.save_media(group_id, expected_user_id, username, slot_name, file, filename, media_type)
-
-                # Award points
-                
-                db.add_points(group_id, expected_user_id, points, event_id)
-                if event_id and points > 0: db.mark_slot_completed(group_id, event_id, slot_id, expected_user_id, "completed", points)
-                
-                db.log_activity(group_id, expected_user_id, media_type, slot_name, message_content=caption, username=username, first_name=first_name,
-                                last_name=last_name, telegram_file_id=file_id, local_file_path=local_path, points_earned=points, is_valid=True)
-
-
-                points_msg = (f"scored {points} points!" if points > 0 else " no points.)")
+                if not awarded: points_msg = "has already completed this slot today!"
+                else: points_msg = (f"scored {points} points!" if points > 0 else " no points.)")
                 await safe_edit_message_text(
                     context, 
                     chat_id=query.message.chat_id, 
@@ -184,6 +168,12 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
                     text=f"✅ {display_name} {points_msg}")
                 logger.info(f"User {expected_user_id} confirmed {media_type} for slot {slot_name}, awarded {points} points")
 
+                if awarded:
+                    timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
+                    filename = f"{username}_{slot_name}_{timestamp}.{file_ext}"
+                    await media_pipeline.submit(context.bot, group_id, expected_user_id, username, slot_name, file_id, filename,
+                                                media_type)
+
             except Exception as e:
                 logger.error(f"Error saving confirmed {media_type}: {e}",exc_info=True)
                 await safe_edit_message_text(
@@ -197,7 +187,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             text = confirmation_data.get("text", "")
 
             # Get slot configuration to determine points
-            slot = db.get_active_slot(group_id)
+            slot = await db.get_active_slot(group_id)
             if not slot:
                 await safe_edit_message_text(
                     context, 
@@ -208,17 +198,14 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
 
             points = slot["slot_points"]
 
-            db.add_points(group_id, expected_user_id, points, event_id)
-            db.log_activity(group_id, expected_user_id, "text", slot_name, message_content=text, username=username, first_name=first_name,
-                            last_name=last_name, points_earned=points, is_valid=True)
-
-            if event_id: db.mark_slot_completed(group_id, event_id, slot_id, expected_user_id, "completed", points)
+            awarded = await db.award_slot(group_id, event_id, slot_id, expected_user_id, points, "text", slot_name,
+                                          username=username, first_name=first_name, last_name=last_name, message_content=text)
 
             await safe_edit_message_text(
                 context, 
                 chat_id=query.message.chat_id, 
                 message_id=query.message.message_id, 
-                text=f"✅ {display_name} scored {points} points!")
+                text=f"✅ {display_name} scored {points} points!" if awarded else f"✅ {first_name}, you've already completed this slot today!")
             logger.info(f"User {expected_user_id} confirmed text for slot {slot_name}, awarded {points} points")
 
     else:
@@ -227,7 +214,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             # If it's media, get the specific type like 'animation', 'video', etc.
             content_type = confirmation_data.get("media_type", "media")
 
-        db.log_activity(group_id=group_id, user_id=expected_user_id, slot_name=slot_name, username=username, first_name=first_name, last_name=last_name,
+        await db.log_activity(group_id=group_id, user_id=expected_user_id, slot_name=slot_name, username=username, first_name=first_name, last_name=last_name,
                         activity_type=content_type, message_content=confirmation_data.get("text", ""), points_earned=0, is_valid=False)
 
         await safe_edit_message_text(
@@ -246,14 +233,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
         except Exception as e:
             logger.warning(f"Could not delete original message: {e}",exc_info=True)
 
-    async def delete_message(context: ContextTypes.DEFAULT_TYPE):
-        """Awaits the message deletion coroutine."""
-        try:
-            await message.delete()
-        except Exception as e:
-            logger.warning(f"Could not delete confirmation message: {e}",exc_info=True)
-
-    context.job_queue.run_once(delete_message, when=3)
+    reaper.schedule_message(message, 3)
 
 
 async def handle_water_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -266,7 +246,7 @@ async def handle_water_button(update: Update, context: ContextTypes.DEFAULT_TYPE
     username=query.from_user.username
     last_name=query.from_user.last_name
 
-    member = db.get_member(group_id, user_id)
+    member = await db.get_member(group_id, user_id)
 
     if member and member.get("is_restricted", 0) == 1:
         restriction_until_utc = member.get("restriction_until")  # Fetch raw datetime from DB (likely naive UTC)
@@ -294,7 +274,7 @@ async def handle_water_button(update: Update, context: ContextTypes.DEFAULT_TYPE
             # 4. Compare aware datetimes
             if now_ist_aware > restriction_until_ist_aware:
                 query_text = "UPDATE group_members SET is_restricted = 0, restriction_until = NULL WHERE group_id = %s AND user_id = %s"
-                execute_query(query_text, (group_id, user_id))
+                await db.execute_query(query_text, (group_id, user_id))
                 logger.info(f"User {user_id}'s restriction has expired. Unrestricted in DB.")
             else:
                 await query.answer("You are currently restricted and cannot perform this action.", show_alert=True)
@@ -313,69 +293,67 @@ async def handle_water_button(update: Update, context: ContextTypes.DEFAULT_TYPE
     liters = int(parts[1])
     slot_id = int(parts[2])
 
-    # Add in-memory lock to prevent spam clicking
-    if "button_locks" not in context.bot_data: context.bot_data["button_locks"] = set()
+    # Add in-memory lock to prevent spam clicking: lock_key -> monotonic expiry
+    locks = context.bot_data.setdefault("button_locks", {})
 
     lock_key = f"{group_id}_{user_id}_{slot_id}_{datetime.now(ist).date()}"
+    now = time.monotonic()
 
-    if lock_key in context.bot_data["button_locks"]:
+    if locks.get(lock_key, 0) > now:
         await query.answer("⏳ Processing your previous click, please wait...", show_alert=True)
         return
 
-    # Acquire lock
-    context.bot_data["button_locks"].add(lock_key)
+    # Acquire lock (the long expiry only matters if processing never reaches the finally block)
+    if len(locks) > BUTTON_LOCK_PRUNE_SIZE:
+        for key in [key for key, expires_at in locks.items() if expires_at <= now]:
+            del locks[key]
+    locks[lock_key] = now + 60
 
     try:
         # Get slot info
-        active_slot = db.get_active_slot(group_id)
+        active_slot = await db.get_active_slot(group_id)
 
         if not active_slot or active_slot["slot_id"] != slot_id:
             await query.answer("This water slot is no longer active!", show_alert=True)
             return
 
         # Get event
-        event = db.get_active_event(group_id)
+        event = await db.get_active_event(group_id)
         event_id = event["event_id"] if event else None
 
-        # Check if already completed today
-        if event_id and db.check_slot_completed_today(event_id, slot_id, user_id):
+        points = active_slot["slot_points"]
+        slot_name = active_slot["slot_name"]
+
+        # Award points; a second completion for today is rejected inside the same transaction
+        awarded = await db.award_slot(group_id, event_id, slot_id, user_id, points, "button", slot_name, username=username,
+                                      first_name=first_name, last_name=last_name, message_content=f"{liters}L water")
+
+        if not awarded:
             await query.answer("Already completed!", show_alert=True)
             # Send visible message in chat
-            slot_name = active_slot["slot_name"]
             response_msg = await safe_send_message(
                 context=context, 
                 chat_id=group_id,
                 text=f"⚠️ {first_name}, you have already completed {slot_name} slot for today!",
                 reply_to_message_id=query.message.message_id,
+                priority=Priority.INTERACTIVE,
             )
             # Auto-delete after 5 seconds
-            context.job_queue.run_once(lambda ctx: response_msg.delete(), when=5)
+            reaper.schedule_message(response_msg, 5)
             return
 
-        points = active_slot["slot_points"]
-        slot_name = active_slot["slot_name"]
-
-        # Award points
-        db.add_points(group_id, user_id, points, event_id)
-        db.log_activity(group_id=group_id,  user_id=user_id,  activity_type="button",  slot_name=slot_name, 
-                        message_content=f"{liters}L water", username=username, first_name=first_name, last_name=last_name, 
-                        points_earned=points)
-        if event_id:
-            db.mark_slot_completed(group_id, event_id, slot_id, user_id, "completed", points)
-
         # Send confirmation to telegram
         await query.answer(f"✅ {liters}L logged! {points} points!", show_alert=True)
 
         # Send a separate message to show who completed (doesn't replace buttons)
-        response_msg = await safe_send_message(context=context, chat_id=group_id, text=f"💧 {first_name} drank {liters}L of water! {points} points!")
+        response_msg = await safe_send_message(context=context, chat_id=group_id, text=f"💧 {first_name} drank {liters}L of water! {points} points!",
+                                           priority=Priority.INTERACTIVE)
 
         logger.info(f"User {user_id} logged {liters}L water for slot {slot_name}")
 
     finally:
         # Release lock after 5 seconds to prevent accidental double-clicks
-        async def release_lock(ctx): context.bot_data["button_locks"].discard(lock_key)
-
-        context.job_queue.run_once(release_lock, when=5)
+        locks[lock_key] = time.monotonic() + 5
 
 
 callback_handler = CallbackQueryHandler(handle_callback)
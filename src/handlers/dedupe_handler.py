@@ -0,0 +1,31 @@
+import logging
+from collections import deque
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+import config
+
+logger = logging.getLogger(__name__)
+
+# Most recent update_ids seen, as a FIFO window plus a set for O(1) membership
+_recent_order = deque()
+_recent_ids = set()
+
+
+async def drop_duplicate_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Stops an update that was already processed. Telegram redelivers a webhook update when our
+    response is slow or lost, and the same update would otherwise be awarded/penalized twice.
+    """
+    update_id = update.update_id
+    if update_id in _recent_ids:
+        logger.info(f"Dropping duplicate update {update_id}")
+        raise ApplicationHandlerStop
+
+    _recent_ids.add(update_id)
+    _recent_order.append(update_id)
+    if len(_recent_order) > config.UPDATE_DEDUPE_WINDOW:
+        _recent_ids.discard(_recent_order.popleft())
+
+
+# Runs in group -1, before every other handler
+dedupe_handler = TypeHandler(Update, drop_duplicate_update)
@@ -4,115 +4,177 @@ import logging
 import os
 from datetime import datetime, time, timedelta
 from pytz import timezone
-from services import database_service as db
-from db import get_db_connection, execute_query
-from bot_utils import safe_send_message
+from services import async_database_service as db
+from services import slot_schedule
+from services.storage_retention import retention
+from services.storage_usage import usage
+from bot_utils import safe_send_message, run_for_groups, send_member_notices, mention, Priority
+import config
 
 logger = logging.getLogger(__name__)
 ist = timezone("Asia/Kolkata")
 
+# Slot times have minute granularity, so a boundary or reminder job that is up to a minute late
+# (event loop busy, clock jump) still runs once; one later than that is left to the periodic re-sync.
+SLOT_JOB_KWARGS = {"misfire_grace_time": 60, "coalesce": True}
+
+async def announce_slot(context: ContextTypes.DEFAULT_TYPE, group_id, active_slot):
+    """Post and pin the announcement for a slot that just became active, and remember it in runtime_state."""
+    slot_id = active_slot["slot_id"]
+    slot_name = active_slot["slot_name"]
+    slot_type = active_slot["slot_type"]
+    start_time = active_slot["start_time"]
+    end_time = active_slot["end_time"]
+
+    if hasattr(start_time, "total_seconds"): start_str = (datetime.min + start_time).strftime("%H:%M")
+    else:
+        start_str = (start_time.strftime("%H:%M") if hasattr(start_time, "strftime") else str(start_time))
+    if hasattr(end_time, "total_seconds"): end_str = (datetime.min + end_time).strftime("%H:%M")
+    else:
+        end_str = (end_time.strftime("%H:%M") if hasattr(end_time, "strftime") else str(end_time))
+
+    message = f"⏰ {slot_name} - Time: {start_str} to {end_str}\n\n"
+    message += active_slot.get("initial_message", f"{slot_name} has started!")
+
+    slot_msg = None # Initialize slot_msg to None
+    if slot_type == "button":
+        keyboard = [
+            [InlineKeyboardButton("1L 💧", callback_data=f"water_1_{slot_id}"),
+             InlineKeyboardButton("2L 💧💧", callback_data=f"water_2_{slot_id}"),
+             InlineKeyboardButton("3L 💧💧💧", callback_data=f"water_3_{slot_id}")],
+            [InlineKeyboardButton("4L 💧💧💧💧", callback_data=f"water_4_{slot_id}"),
+             InlineKeyboardButton("5L 💧💧💧💧💧", callback_data=f"water_5_{slot_id}")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        slot_msg = await safe_send_message(context=context ,chat_id=group_id, text=message, reply_markup=reply_markup)
+    else:
+        image_path = active_slot.get("image_file_path")
+        if image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as photo:
+                slot_msg = await context.bot.send_photo(chat_id=group_id, photo=photo, caption=message)
+        else:
+            slot_msg = await safe_send_message(context=context, chat_id=group_id, text=message)
+
+    # Unpin all pinned messages        
+    try:
+        await context.bot.unpin_all_chat_messages(group_id)
+        logger.info(f"Unpinned previous messages in group {group_id}")
+    except Exception as unpin_error:
+        logger.warning(f"Could not unpin previous messages: {unpin_error}")
+
+    # Pin the new slot announcement
+    try:
+        await context.bot.pin_chat_message(group_id, slot_msg.message_id)
+        logger.info(f"Pinned slot {slot_name} announcement in group {group_id}")
+    except Exception as pin_error:
+        logger.warning(f"Could not pin slot announcement: {pin_error}")
+
+    # Save the new state to the database
+    await db.set_runtime_state(group_id, "pinned_slot_id", str(slot_id))
+    await db.set_runtime_state(group_id, "pinned_slot_message_id", str(slot_msg.message_id) if slot_msg else None)
+    logger.info(f"Announced and saved state for slot {slot_name} in group {group_id}")
+
+
+async def close_slot(context: ContextTypes.DEFAULT_TYPE, group_id):
+    """Clean up after a slot ended: log missed submissions, remove the pinned announcement and clear the state."""
+    pinned_message_id_str = await db.get_runtime_state(group_id, "pinned_slot_message_id")
+    if not pinned_message_id_str:
+        return
+
+    # A slot just ended. Log 'missed' for non-participants.
+    ended_slot_id_str = await db.get_runtime_state(group_id, "pinned_slot_id")
+    active_event = await db.get_active_event(group_id)
+
+    if ended_slot_id_str and active_event:
+        try:
+            await db.log_missed_slots(group_id, active_event['event_id'], int(ended_slot_id_str))
+        except Exception as e:
+            logger.error(f"Failed to log missed slots: {e}", exc_info=True)
+
+    try:
+        # Unpin all messages first
+        await context.bot.unpin_all_chat_messages(group_id)
+        logger.info(f"Unpinned all messages in group {group_id} after slot end")
+
+        # Then delete the specific slot message
+        await context.bot.delete_message(chat_id=group_id, message_id=int(pinned_message_id_str))
+        logger.info(f"Deleted slot announcement message {pinned_message_id_str} in group {group_id}")
+    except Exception as e:
+        logger.warning(f"Could not unpin/delete slot message: {e}",exc_info=True)
+
+    # Clear the state from the database since there's no active slot
+    await db.set_runtime_state(group_id, "pinned_slot_id", None)
+    await db.set_runtime_state(group_id, "pinned_slot_message_id", None)
+
+
+async def sync_group_slot(context: ContextTypes.DEFAULT_TYPE, group_id):
+    """
+    Brings one group's pinned announcement in line with its active slot, then registers
+    one-shot jobs for the next slot boundary and for the active slot's final reminder.
+    """
+    active_slot = await db.get_active_slot(group_id)
+
+    if active_slot:
+        # Get the ID of the slot that is currently pinned from the database
+        pinned_slot_id_str = await db.get_runtime_state(group_id, "pinned_slot_id")
+
+        # Check if the currently active slot is different from the one we have pinned
+        if str(active_slot["slot_id"]) != pinned_slot_id_str:
+            await announce_slot(context, group_id, active_slot)
+    else:
+        await close_slot(context, group_id)
+
+    await schedule_slot_jobs(context.job_queue, group_id, active_slot)
+
+
+async def schedule_slot_jobs(job_queue, group_id, active_slot=None):
+    """Replace the group's pending boundary and reminder jobs with ones at the exact next instants."""
+    boundary_name = f"slot_boundary_{group_id}"
+    reminder_name = f"slot_reminder_{group_id}"
+    for job in job_queue.get_jobs_by_name(boundary_name) + job_queue.get_jobs_by_name(reminder_name):
+        job.schedule_removal()
+
+    next_boundary = await db.get_next_slot_boundary(group_id)
+    if next_boundary:
+        job_queue.run_once(slot_boundary_job, when=next_boundary, data={"group_id": group_id}, name=boundary_name,
+                           job_kwargs=SLOT_JOB_KWARGS)
+
+    if active_slot and next_boundary:
+        # The boundary is one second after the slot's inclusive end time
+        reminder_at = next_boundary - timedelta(seconds=1) - timedelta(minutes=10)
+        if reminder_at > datetime.now(ist):
+            job_queue.run_once(slot_reminder_job, when=reminder_at, name=reminder_name, job_kwargs=SLOT_JOB_KWARGS,
+                               data={"group_id": group_id, "slot_id": active_slot["slot_id"], "slot_name": active_slot["slot_name"]})
+
+
+async def reschedule_group_slots(context: ContextTypes.DEFAULT_TYPE, group_id):
+    """Reload a group's slot schedule after it changed and re-register its slot jobs."""
+    slot_schedule.invalidate(group_id)
+    await sync_group_slot(context, group_id)
+
+
+async def slot_boundary_job(context: ContextTypes.DEFAULT_TYPE):
+    """One-shot job fired exactly when a group's active slot changes."""
+    group_id = context.job.data["group_id"]
+    try:
+        await sync_group_slot(context, group_id)
+    except Exception as e:
+        logger.error(f"Error handling slot boundary for group {group_id}: {e}", exc_info=True)
+
+
 async def check_and_announce_slots(context: ContextTypes.DEFAULT_TYPE):
-    """Check for active slots and announce them to the user at regular intervals"""
+    """
+    Syncs every group's slot announcement and (re)registers its boundary jobs.
+    Runs at startup and then as an infrequent safety net for new groups and slot edits made outside the bot.
+    """
     try:
         query = "SELECT group_id FROM groups_config"
-        groups = execute_query(query, fetch=True)
+        groups = await db.execute_query(query, fetch=True)
 
-        for group in groups:
-            group_id = group["group_id"]
-            active_slot = db.get_active_slot(group_id)
+        async def process_group(group):
+            await sync_group_slot(context, group["group_id"])
 
-            # Get the ID of the slot that is currently pinned from the database
-            pinned_slot_id_str = db.get_runtime_state(group_id, "pinned_slot_id")
-
-            if active_slot:
-                slot_id = active_slot["slot_id"]
-                
-                # Check if the currently active slot is different from the one we have pinned
-                if str(slot_id) != pinned_slot_id_str:
-                    # This is a new slot, so we need to announce it.
-                    slot_name = active_slot["slot_name"]
-                    slot_type = active_slot["slot_type"]
-                    start_time = active_slot["start_time"]
-                    end_time = active_slot["end_time"]
-
-                    # --- All of your existing message formatting logic remains the same ---
-                    if hasattr(start_time, "total_seconds"): start_str = (datetime.min + start_time).strftime("%H:%M")
-                    else:
-                        start_str = (start_time.strftime("%H:%M") if hasattr(start_time, "strftime") else str(start_time))
-                    if hasattr(end_time, "total_seconds"): end_str = (datetime.min + end_time).strftime("%H:%M")
-                    else:
-                        end_str = (end_time.strftime("%H:%M") if hasattr(end_time, "strftime") else str(end_time))
-                    
-                    message = f"⏰ {slot_name} - Time: {start_str} to {end_str}\n\n"
-                    message += active_slot.get("initial_message", f"{slot_name} has started!")
-
-                    slot_msg = None # Initialize slot_msg to None
-                    if slot_type == "button":
-                        keyboard = [
-                            [InlineKeyboardButton("1L 💧", callback_data=f"water_1_{slot_id}"),
-                             InlineKeyboardButton("2L 💧💧", callback_data=f"water_2_{slot_id}"),
-                             InlineKeyboardButton("3L 💧💧💧", callback_data=f"water_3_{slot_id}")],
-                            [InlineKeyboardButton("4L 💧💧💧💧", callback_data=f"water_4_{slot_id}"),
-                             InlineKeyboardButton("5L 💧💧💧💧💧", callback_data=f"water_5_{slot_id}")]
-                        ]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        slot_msg = await safe_send_message(context=context ,chat_id=group_id, text=message, reply_markup=reply_markup)
-                    else:
-                        image_path = active_slot.get("image_file_path")
-                        if image_path and os.path.exists(image_path):
-                            with open(image_path, "rb") as photo:
-                                slot_msg = await context.bot.send_photo(chat_id=group_id, photo=photo, caption=message)
-                        else:
-                            slot_msg = await safe_send_message(context=context, chat_id=group_id, text=message)
-                    
-                    # Unpin all pinned messages        
-                    try:
-                        await context.bot.unpin_all_chat_messages(group_id)
-                        logger.info(f"Unpinned previous messages in group {group_id}")
-                    except Exception as unpin_error:
-                        logger.warning(f"Could not unpin previous messages: {unpin_error}")
-                    
-                    # Pin the new slot announcement
-                    try:
-                        await context.bot.pin_chat_message(group_id, slot_msg.message_id)
-                        logger.info(f"Pinned slot {slot_name} announcement in group {group_id}")
-                    except Exception as pin_error:
-                        logger.warning(f"Could not pin slot announcement: {pin_error}")
-
-                    # Save the new state to the database
-                    db.set_runtime_state(group_id, "pinned_slot_id", str(slot_id))
-                    db.set_runtime_state(group_id, "pinned_slot_message_id", str(slot_msg.message_id))
-                    logger.info(f"Announced and saved state for slot {slot_name} in group {group_id}")
-            
-            else:
-                # No active slot. Check if there is a pinned message that we need to clean up.
-                pinned_message_id_str = db.get_runtime_state(group_id, "pinned_slot_message_id")
-                if pinned_message_id_str:
-                    
-                    # A slot just ended. Log 'missed' for non-participants.
-                    ended_slot_id_str = db.get_runtime_state(group_id, "pinned_slot_id")
-                    active_event = db.get_active_event(group_id)
-                    
-                    if ended_slot_id_str and active_event:
-                        try:
-                            db.log_missed_slots(group_id, active_event['event_id'], int(ended_slot_id_str))
-                        except Exception as e:
-                            logger.error(f"Failed to log missed slots: {e}", exc_info=True)
-                            
-                    try:
-                        # Unpin all messages first
-                        await context.bot.unpin_all_chat_messages(group_id)
-                        logger.info(f"Unpinned all messages in group {group_id} after slot end")
-                        
-                        # Then delete the specific slot message
-                        await context.bot.delete_message(chat_id=group_id, message_id=int(pinned_message_id_str))
-                        logger.info(f"Deleted slot announcement message {pinned_message_id_str} in group {group_id}")
-                    except Exception as e:
-                        logger.warning(f"Could not unpin/delete slot message: {e}",exc_info=True)
-                    
-                    # Clear the state from the database since there's no active slot
-                    db.set_runtime_state(group_id, "pinned_slot_id", None)
-                    db.set_runtime_state(group_id, "pinned_slot_message_id", None)
+        await run_for_groups(groups, process_group, "check_and_announce_slots")
 
     except Exception as e:
         logger.error(f"Error in check_and_announce_slots: {e}",exc_info=True)
@@ -121,72 +183,61 @@ async def check_and_announce_slots(context: ContextTypes.DEFAULT_TYPE):
 async def check_inactive_users(context: ContextTypes.DEFAULT_TYPE):
     """Check for inactive users: warn at 3 days, kick temporarily at 4 days."""
     logger.info("Checking for inactive users...")
-    groups = []
     try:
-        query = "SELECT group_id FROM groups_config"
-        groups = execute_query(query, fetch=True)
+        # One sweep across all groups: members due a 3-day warning that they haven't had today,
+        # and members past 4 days. Warnings are recorded up front in one INSERT IGNORE.
+        to_warn = await db.get_members_due_inactivity_warning('3day', 3)
+        to_kick = await db.get_inactive_members(None, 4)
+        await db.log_inactivity_warnings_bulk(to_warn, '3day')
     except Exception as e:
-        logger.error(f"CRITICAL: Failed to fetch groups for inactivity check: {e}", exc_info=True)
+        logger.error(f"CRITICAL: Failed to run inactivity sweep: {e}", exc_info=True)
         return
 
-    for group in groups:
+    groups = {}
+    for action, members in (("warn", to_warn), ("kick", to_kick)):
+        for member in members:
+            group = groups.setdefault(member["group_id"], {"group_id": member["group_id"], "warn": [], "kick": []})
+            group[action].append(member)
+
+    async def process_group(group):
         group_id = group["group_id"]
-        try:
-            # Check for 3-day inactive (warning)
-            inactive_3day = db.get_inactive_members(group_id, 3)
-            for member in inactive_3day:
-                user_id = member["user_id"]
-                first_name = member.get("first_name", "User")
-                last_name = member.get("last_name","")
-                username = member.get("username","User")
-
-                # Check if already warned today
-                query = """
-                    SELECT * FROM inactivity_warnings 
-                    WHERE group_id = %s AND user_id = %s AND warning_date = CURDATE() AND warning_type = '3day'
-                """
-                existing= execute_query(query,(group_id,user_id), fetch=True)
-
-                if not existing:
-                    # Send warning
-                    await safe_send_message(
-                        context=context, 
-                        chat_id=group_id,
-                        text=f"⚠️ {first_name}, you've been inactive for 3 days!\nPlease participate in today's activities or you'll be removed tomorrow."
-                        )
-                    try:
-                        # Log warning
-                        db.log_inactivity_warning(group_id, user_id, '3day', member)
-                        logger.info(f"Warned 3-day inactive user {user_id} in group {group_id}")
-                    except Exception as e:
-                        logger.error(f"Error warning user {user_id} in group {group_id}: {e}", exc_info=True)
-
-            # Check for 4-day inactive (kick temporarily)
-            inactive_4day = db.get_inactive_members(group_id, 4)
-            for member in inactive_4day:
-                user_id = member["user_id"]
-                first_name = member.get("first_name", "User")
+        mode = await db.get_notice_mode(group_id)
+
+        # 3-day inactive (warning)
+        await send_member_notices(
+            context, group_id,
+            [(f"⚠️ {member.get('first_name') or 'User'}, you've been inactive for 3 days!\nPlease participate in today's activities or you'll be removed tomorrow.",
+              f"• {mention(member['user_id'], member.get('first_name'))}") for member in group["warn"]],
+            mode,
+            header="⚠️ Inactive for 3 days! Please participate in today's activities or you'll be removed tomorrow:",
+        )
+        if group["warn"]:
+            logger.info(f"Warned {len(group['warn'])} 3-day inactive users in group {group_id}")
+
+        # 4-day inactive (kick temporarily)
+        removed = []
+        for member in group["kick"]:
+            user_id = member["user_id"]
+            first_name = member.get("first_name") or "User"
 
-                try:
-                    # Deduct 20 knockout points for 4-day inactivity before kicking
-                    db.deduct_knockout_points(group_id, user_id, 20)
-                    await context.bot.ban_chat_member(group_id, user_id)
-                    # Remove from database
-                    db.remove_member(group_id, user_id, "kicked")
-                    await context.bot.unban_chat_member(group_id, user_id)
-                    # Send notification
-                    await safe_send_message(
-                        context=context,
-                        chat_id=group_id,
-                        text=f"🚫 {first_name} has been removed from the group due to 4 days of inactivity.\n"
-                    )
-
-                    logger.info(f"Kicked 4-day inactive user {user_id} from group {group_id}")
-                except Exception as e:
-                    logger.error(f"Error kicking user {user_id} from group {group_id}: {e}", exc_info=True)
+            try:
+                # Deduct 20 knockout points for 4-day inactivity before kicking
+                await db.deduct_knockout_points(group_id, user_id, 20)
+                await context.bot.ban_chat_member(group_id, user_id)
+                # Remove from database
+                await db.remove_member(group_id, user_id, "kicked")
+                await context.bot.unban_chat_member(group_id, user_id)
+                removed.append((f"🚫 {first_name} has been removed from the group due to 4 days of inactivity.\n",
+                                f"• {mention(user_id, first_name)}"))
+
+                logger.info(f"Kicked 4-day inactive user {user_id} from group {group_id}")
+            except Exception as e:
+                logger.error(f"Error kicking user {user_id} from group {group_id}: {e}", exc_info=True)
+
+        # Send notification
+        await send_member_notices(context, group_id, removed, mode, header="🚫 Removed from the group due to 4 days of inactivity:")
 
-        except Exception as group_e:
-            logger.error(f"Failed to process inactivity check for group {group_id}: {group_e}", exc_info=True)
+    await run_for_groups(list(groups.values()), process_group, "check_inactive_users")
 
 
 async def check_low_points(context: ContextTypes.DEFAULT_TYPE):
@@ -200,13 +251,13 @@ async def check_low_points(context: ContextTypes.DEFAULT_TYPE):
             FROM events e
             WHERE e.is_active = TRUE
         """
-        events=execute_query(query)
+        events=await db.execute_query(query, fetch=True)
 
-        for event in events:
+        async def process_group(event):
             group_id = event["group_id"]
             min_points = event["min_pass_points"]
 
-            if min_points <= 0: continue
+            if min_points <= 0: return
 
             # Get members who COMPLETED 7 days but are below minimum
             query = """
@@ -218,160 +269,108 @@ async def check_low_points(context: ContextTypes.DEFAULT_TYPE):
                 AND is_restricted = 0
             """
 
-            low_point_members=execute_query(query,(group_id,min_points),fetch=True)
+            low_point_members=await db.execute_query(query,(group_id,min_points),fetch=True)
 
+            removed = []
             for member in low_point_members:
                 user_id = member["user_id"]
-                first_name = member.get("first_name", "User")
-                username=member.get("username","User")
-                last_name=member.get("last_name","")
+                first_name = member.get("first_name") or "User"
                 total_points = member["total_points"]
 
                 try:
                     await context.bot.ban_chat_member(group_id, user_id)
 
                     # Remove from database
-                    db.remove_member(group_id, user_id, "kicked")
+                    await db.remove_member(group_id, user_id, "kicked")
                     
                     await context.bot.unban_chat_member(group_id,user_id)
 
-                    await safe_send_message(
-                        context=context, 
-                        chat_id=group_id,
-                        text=f"👋 {first_name}, thank you for your participation!\n"
+                    removed.append((
+                        f"👋 {first_name}, thank you for your participation!\n"
                         f"🎯 You completed 7 days and earned {total_points} points!\n\n"
                         f"Unfortunately, you didn't reach the minimum {min_points} points required.\n"
-                        f"💪 Keep trying!"
-                    )
+                        f"💪 Keep trying!",
+                        f"• {mention(user_id, first_name)}: {total_points} points",
+                    ))
 
                     logger.info(f"Kicked low-point user {user_id} from group {group_id} after 7 days with {total_points} points")
 
                 except Exception as e:
                     logger.error(f"Error kicking user {user_id}: {e}",exc_info=True)
 
+            await send_member_notices(
+                context, group_id, removed, await db.get_notice_mode(group_id),
+                header=f"👋 Thank you for your participation! These members completed 7 days but didn't reach the minimum {min_points} points required:",
+                footer="💪 Keep trying!",
+            )
+
+        await run_for_groups(events, process_group, "check_low_points")
+
     except Exception as e:
         logger.error(f"Error in check_low_points: {e}",exc_info=True)
         
 
-async def check_mid_slot_warnings(context: ContextTypes.DEFAULT_TYPE):
-    """Post warning messages at last 10 mins of slot duration."""
+async def slot_reminder_job(context: ContextTypes.DEFAULT_TYPE):
+    """One-shot job that posts the final reminder 10 minutes before a slot ends."""
+    data = context.job.data
+    group_id = data["group_id"]
+    slot_id = data["slot_id"]
+    slot_name = data["slot_name"]
     try:
-        query = "SELECT group_id FROM groups_config"
-        groups = execute_query(query, fetch=True)
-
-        for group in groups:
-            group_id = group["group_id"]
-            active_slot = db.get_active_slot(group_id)
-
-            if active_slot:
-                slot_id = active_slot["slot_id"]
-                slot_name = active_slot["slot_name"]
-                end_time = active_slot["end_time"]
-
-                if hasattr(end_time, "total_seconds"):
-                    end_time = (datetime.min + end_time).time()
-
-                now = datetime.now(ist).time()
-                end_datetime = datetime.combine(datetime.today(), end_time)
-                reminder_datetime = end_datetime - timedelta(minutes=10)
-                reminder_time = reminder_datetime.time()
-
-                if now.hour == reminder_time.hour and now.minute == reminder_time.minute:
-                    # Use a unique key for today's warning for this specific slot
-                    warning_key = f"mid_slot_warn_{slot_id}_{datetime.now(ist).date()}"
-                    
-                    # Check if warning has already been sent by checking the database
-                    if not db.get_runtime_state(group_id, warning_key):
-                        await safe_send_message(
-                            context=context, 
-                            chat_id=group_id,
-                            text=f"⏰ *{slot_name}* - Final Reminder!\n\n"
-                                 f"⚠️ Only 10 minutes remaining!\n"
-                                 f"📸 If you haven't posted yet, do it now!",
-                            parse_mode="Markdown",
-                        )
-
-                        db.set_runtime_state(group_id, warning_key, "sent")
-                        logger.info(f"Sent mid-slot warning for {slot_name} in group {group_id}")
+        active_slot = await db.get_active_slot(group_id)
+        if not active_slot or active_slot["slot_id"] != slot_id:
+            return
+
+        # Use a unique key for today's warning for this specific slot
+        warning_key = f"mid_slot_warn_{slot_id}_{datetime.now(ist).date()}"
+
+        # Check if warning has already been sent (e.g. before a restart) by checking the database
+        if not await db.get_runtime_state(group_id, warning_key):
+            await safe_send_message(
+                context=context, 
+                chat_id=group_id,
+                text=f"⏰ *{slot_name}* - Final Reminder!\n\n"
+                     f"⚠️ Only 10 minutes remaining!\n"
+                     f"📸 If you haven't posted yet, do it now!",
+                parse_mode="Markdown",
+            )
+
+            await db.set_runtime_state(group_id, warning_key, "sent")
+            logger.info(f"Sent mid-slot warning for {slot_name} in group {group_id}")
     except Exception as e:
-        logger.error(f"Error in check_mid_slot_warnings: {e}",exc_info=True)
+        logger.error(f"Error in slot_reminder_job: {e}",exc_info=True)
 
 
 async def check_user_day_cycles(context: ContextTypes.DEFAULT_TYPE):
-    """Check and update user day cycles, and reset after Day 7."""
+    """Advance every member's cycle day and reset cycles after Day 7, congratulating the reset members."""
     try:
         logger.info("Checking user day cycles...")
 
-        # Get all groups
-        query = "SELECT group_id FROM groups_config"
-        groups=execute_query(query, fetch=True)
-
-        for group in groups:
-            group_id = group["group_id"]
+        # One set-based pass over all groups; only members whose cycle was reset come back.
+        today = datetime.now(ist).date()
+        reset_members = await db.advance_member_day_cycles(today)
 
-            # Get all members in this group
-            query = """
-                SELECT user_id, username, first_name, last_name, user_day_number, cycle_start_date, 
-                       is_restricted, total_points
-                FROM group_members
-                WHERE group_id = %s
-            """
-            members=execute_query(query,(group_id,), fetch=True)
+        groups = {}
+        for member in reset_members:
+            groups.setdefault(member["group_id"], {"group_id": member["group_id"], "members": []})["members"].append(member)
 
-            for member in members:
-                user_id = member["user_id"]
-                first_name = member.get("first_name", "User")
-                username=member.get("username","User")
-                last_name=member.get("last_name","")
-                day_number = member["user_day_number"]
-                cycle_start = member["cycle_start_date"]
-                is_restricted = member["is_restricted"]
-                total_points = member["total_points"]
-
-                if not cycle_start:
-                    continue
-
-                # Calculate days since cycle start
-                today = datetime.now(ist).date()
-                days_elapsed = (today - cycle_start).days
-
-                # Update day number if it's a new day (for non-restricted users)
-                if not is_restricted and days_elapsed > 0:
-                    new_day = days_elapsed + 1
-
-                    if new_day == day_number: continue
-
-                    if new_day > 7:
-                        # Reset the 7-day cycle
-                        query = """
-                            UPDATE group_members 
-                            SET user_day_number = 1, 
-                                cycle_start_date = CURDATE(),
-                                total_points = 0,
-                                knockout_points = 0
-                            WHERE group_id = %s AND user_id = %s
-                        """
-                        execute_query(query,(group_id,user_id))
-
-                        try:
-                            await safe_send_message(
-                                context=context, 
-                                chat_id=group_id,
-                                text=f"🎊 {first_name}, congratulations!\n\n"
-                                f"You completed your 7-day wellness cycle with {total_points} points! 🏆\n\n"
-                                f"🔄 Starting a fresh Day 1 cycle.\n"
-                                f"Your points have been reset. Let's go again! 💪",
-                            )
-                            logger.info(f"Reset 7-day cycle for user {user_id} in group {group_id}")
-                        except Exception as e:
-                            logger.error(f"Error sending cycle reset message: {e}",exc_info=True)
-
-                    else:
-                        # Just advance the day
-                        query = "UPDATE group_members SET user_day_number = %s WHERE group_id = %s AND user_id = %s"
-                        execute_query(query,(new_day, group_id, user_id))
-
-                        logger.info(f"Advanced user {user_id} in group {group_id} to Day {new_day}")
+        async def process_group(group):
+            group_id = group["group_id"]
+            await send_member_notices(
+                context, group_id,
+                [(f"🎊 {member.get('first_name') or 'User'}, congratulations!\n\n"
+                  f"You completed your 7-day wellness cycle with {member['total_points']} points! 🏆\n\n"
+                  f"🔄 Starting a fresh Day 1 cycle.\n"
+                  f"Your points have been reset. Let's go again! 💪",
+                  f"• {mention(member['user_id'], member.get('first_name'))}: {member['total_points']} points")
+                 for member in group["members"]],
+                await db.get_notice_mode(group_id),
+                header="🎊 Congratulations! These members completed their 7-day wellness cycle 🏆",
+                footer="🔄 Their points have been reset and a fresh Day 1 cycle starts now. Let's go again! 💪",
+            )
+            logger.info(f"Reset 7-day cycle for {len(group['members'])} users in group {group_id}")
+
+        await run_for_groups(list(groups.values()), process_group, "check_user_day_cycles")
 
     except Exception as e:
         logger.error(f"Error in check_user_day_cycles: {e}",exc_info=True)
@@ -382,17 +381,17 @@ async def post_daily_leaderboard(context: ContextTypes.DEFAULT_TYPE):
     try:
         # Get all group configs
         query = "SELECT group_id FROM groups_config"
-        groups=execute_query(query, fetch=True)
+        groups=await db.execute_query(query, fetch=True)
 
-        for group in groups:
+        async def process_group(group):
             group_id = group["group_id"]
 
             # Get active event
-            event = db.get_active_event(group_id)
-            if not event: continue
+            event = await db.get_active_event(group_id)
+            if not event: return
 
             # Get leaderboard
-            top_members = db.get_leaderboard(group_id, 10)
+            top_members = await db.get_leaderboard(group_id, 10)
 
             if top_members:
                 message = "🏆 Leaderboard - Top 10\n\n"
@@ -414,15 +413,17 @@ async def post_daily_leaderboard(context: ContextTypes.DEFAULT_TYPE):
 
                 message += "\n📅 Great job everyone! See you tomorrow! 🌟"
 
-                await safe_send_message(context=context, chat_id=group_id, text=message)
+                leaderboard_msg = await safe_send_message(context=context, chat_id=group_id, text=message, priority=Priority.DIGEST)
                 logger.info(f"Posted daily leaderboard for group {group_id}")
                 
                 try:
-                    await context.bot.pin_chat_message(group_id, message.message_id)
+                    await context.bot.pin_chat_message(group_id, leaderboard_msg.message_id)
                     logger.info(f"Pinned Leaderboard announcement in group {group_id}")
                 except Exception as pin_error:
                     logger.warning(f"Could not pin Leaderboard announcement: {pin_error}", exc_info=True)
 
+        await run_for_groups(groups, process_group, "post_daily_leaderboard")
+
     except Exception as e:
         logger.error(f"Error in post_daily_leaderboard: {e}",exc_info=True)
 
@@ -433,13 +434,10 @@ async def check_daily_participation(context: ContextTypes.DEFAULT_TYPE):
         query="""
         SELECT group_id, event_id from events WHERE is_active=TRUE
         """
-        events=execute_query(query,fetch=True)
+        events=await db.execute_query(query,fetch=True)
         for event in events:
-            group_id=event['group_id']
-            event_id=event['event_id']
-            
-            db.penalize_zero_activity_members(group_id, event_id, 10)
-            logger.info("Penalized non-restricted inactive members for the day.")
+            # One anti-join UPDATE per event, independent of group size
+            await db.penalize_zero_activity_members(event['group_id'], event['event_id'], 10)
     except Exception as e:
         logger.error(f"Error in check_daily_participation job: {e}",exc_info=True)
 
@@ -448,35 +446,71 @@ async def sync_admin_status(context: ContextTypes.DEFAULT_TYPE):
     logger.info("Running hourly job to synchronize admin statuses...")
     try:
         query = "SELECT group_id FROM groups_config"
-        groups = execute_query(query, fetch=True)
+        groups = await db.execute_query(query, fetch=True)
 
-        for group in groups:
+        async def process_group(group):
             group_id = group["group_id"]
-            try:
-                # Get the list of admins directly from the Telegram API
-                administrators = await context.bot.get_chat_administrators(group_id)
-                # Extract just the user IDs from the list of ChatMember objects
-                admin_user_ids = [admin.user.id for admin in administrators]
+            # Get the list of admins directly from the Telegram API
+            administrators = await context.bot.get_chat_administrators(group_id)
+            # Extract just the user IDs from the list of ChatMember objects
+            admin_user_ids = [admin.user.id for admin in administrators]
 
-                # Update the database in a single, efficient transaction
-                db.update_admin_status(group_id, admin_user_ids)
+            # Update the database in a single, efficient transaction
+            await db.update_admin_status(group_id, admin_user_ids)
 
-            except Exception as e:
-                logger.error(f"Could not sync admins for group {group_id}: {e}", exc_info=True)
+        await run_for_groups(groups, process_group, "sync_admin_status")
 
     except Exception as e:
         logger.error(f"Critical error in the admin synchronization job: {e}", exc_info=True)
 
+async def apply_storage_retention(context: ContextTypes.DEFAULT_TYPE):
+    """Re-encode, archive and delete old media per group policy, then drop unused stored objects."""
+    logger.info("Applying storage retention...")
+    try:
+        groups = await db.get_storage_policies()
+        totals = {}
+
+        async def process_group(group):
+            counters = await retention.apply(group)
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+            if any(counters.values()):
+                logger.info(f"Storage retention for group {group['group_id']}: {counters}")
+
+        # Disk-bound work; a couple of groups at a time is enough
+        await run_for_groups(groups, process_group, "apply_storage_retention", concurrency=2)
+
+        removed, freed = await retention.compact()
+        logger.info(f"Storage retention done: {totals}, compaction removed {removed} files ({freed} bytes)")
+
+    except Exception as e:
+        logger.error(f"Error in apply_storage_retention job: {e}", exc_info=True)
+
+async def reconcile_storage_usage(context: ContextTypes.DEFAULT_TYPE):
+    """Rescan every group's media folders and repair drift in the incremental storage_usage counters."""
+    logger.info("Reconciling storage usage...")
+    try:
+        query = "SELECT group_id FROM groups_config"
+        groups = await db.execute_query(query, fetch=True)
+
+        async def process_group(group):
+            rows = await usage.reconcile(group["group_id"])
+            logger.info(f"Reconciled storage usage for group {group['group_id']}: {sum(row[3] for row in rows)} bytes "
+                        f"in {sum(row[2] for row in rows)} files")
+
+        await run_for_groups(groups, process_group, "reconcile_storage_usage", concurrency=2)
+
+    except Exception as e:
+        logger.error(f"Error in reconcile_storage_usage job: {e}", exc_info=True)
+
 def setup_jobs(application):
     """Setup periodic jobs."""
     job_queue = application.job_queue
     scheduler = application.job_queue.scheduler
 
-    # Check and announce slots every minute
-    job_queue.run_repeating(check_and_announce_slots, interval=10, first=0)
-
-    # Check mid-slot warnings every minute
-    job_queue.run_repeating(check_mid_slot_warnings, interval=60, first=30)
+    # Sync slot announcements and register exact boundary/reminder jobs at startup,
+    # then re-sync occasionally to pick up new groups and slot edits made outside the bot
+    job_queue.run_repeating(check_and_announce_slots, interval=config.SLOT_RESYNC_INTERVAL, first=0)
     
     # Runs 10s after startup, then hourly
     job_queue.run_repeating(sync_admin_status, interval=10, first=10)
@@ -495,5 +529,12 @@ def setup_jobs(application):
 
     # Checks daily for zero activity users after leaderboard gets posted
     scheduler.add_job(check_daily_participation, trigger='cron', hour=12, minute=25, timezone=ist, args=[application])
+
+    # Age out old media nightly at 03:30, when the groups are quiet
+    scheduler.add_job(apply_storage_retention, trigger='cron', hour=3, minute=30, timezone=ist, args=[application])
+
+    # Repair drift in the storage usage counters weekly, after that night's retention run
+    scheduler.add_job(reconcile_storage_usage, trigger='cron', day_of_week='sun', hour=4, minute=30, timezone=ist,
+                      args=[application])
     
     logger.info("Scheduled jobs setup completed")
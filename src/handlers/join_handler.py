@@ -6,8 +6,8 @@ from datetime import datetime, timedelta
 from pytz import timezone
 from bot_utils import safe_send_message
 from config import NEW_MEMBER_RESTRICTION_MINUTES
-from services import database_service as db
-from db import execute_query
+from services import async_database_service as db
+from handlers.jobs import reschedule_group_slots
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -31,9 +31,11 @@ async def track_chats(update, context):
                 bot_member = await context.bot.get_chat_member(group_id, context.bot.id)
 
                 if bot_member.status in ["administrator", "creator"]:
-                    success = db.create_group_config(group_id, admin_user_id)
+                    success = await db.create_group_config(group_id, admin_user_id)
 
                     if success:
+                        await reschedule_group_slots(context, group_id)
+
                         welcome_msg = await safe_send_message(
                             context=context, 
                             chat_id=group_id,
@@ -124,7 +126,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         logger.info(f"👤 Member {action}: {user_id} ({first_name} @{username}) from group {group_id}")
 
-        db.remove_member(group_id, user_id, action)
+        await db.remove_member(group_id, user_id, action)
         logger.info(f"Archived '{action}' member {user_id} in member_history.")
         return
 
@@ -136,7 +138,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return
 
-    group_config = db.get_group_config(group_id)
+    group_config = await db.get_group_config(group_id)
     if not group_config:
         logger.warning(f"Group {group_id} not configured - skipping member {user_id}", exc_info=True)
         return
@@ -146,7 +148,7 @@ async def track_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_member = await context.bot.get_chat_member(chat_id=group_id, user_id=user_id)
         is_admin = chat_member.status in ["administrator", "creator"]
 
-        member, is_new = db.add_member(group_id=group_id, user_id=user_id, username=username, first_name=first_name, last_name=last_name, is_admin=is_admin)
+        member, is_new = await db.add_member(group_id=group_id, user_id=user_id, username=username, first_name=first_name, last_name=last_name, is_admin=is_admin)
         if not member:
             logger.error(f"CRITICAL: Failed to add/update member {user_id} in DB. Aborting join flow.",exc_info=True)
             return
@@ -4,15 +4,14 @@ import logging
 from datetime import datetime, timedelta
 import re
 from pytz import timezone, utc
-from services import database_service as db
-from services.file_storage import FileStorage
-import config
+from services import async_database_service as db
 from handlers.start_handler import points, schedule
-from db import execute_query
-from bot_utils import safe_send_message
+from bot_utils import safe_send_message, outbound, Priority
+from services.ephemeral_messages import reaper
+from services.confirmation_store import confirmations
+from services.media_pipeline import media_pipeline
 
 logger = logging.getLogger(__name__)
-storage = FileStorage(config.STORAGE_PATH)
 ist=timezone("Asia/Kolkata")
 
 def sanitize_text(text):
@@ -44,21 +43,31 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         elif message.text == "Time Sheet 📅": await schedule(update, context)
         return
 
+    # The active slot comes from the in-memory schedule; everything else the decision needs
+    # (config, member, event, today's completion) is loaded in a single round trip.
+    active_slot = await db.get_active_slot(group_id)
+    message_context = await db.get_message_context(group_id, user_id, active_slot["slot_id"] if active_slot else None)
+
     # Check if group is configured
-    group_config = db.get_group_config(group_id)
+    group_config = message_context["group_config"]
     if not group_config:
         logger.warning(f"Group {group_id} not configured yet")
         return
 
     # Ensure member exists in database
-    member, is_new = db.add_member(group_id, user_id, username, first_name, restrict_new=False)
+    member = message_context["member"]
+    is_new = False
+    if member is None:
+        member, is_new = await db.add_member(group_id, user_id, username, first_name, last_name, restrict_new=False)
+    else:
+        if ((member.get("username") or "") != username or (member.get("first_name") or "") != first_name
+                or (member.get("last_name") or "") != last_name):
+            await db.update_member_profile(group_id, user_id, username, first_name, last_name)
 
-    # Update member activity
-    db.update_member_activity(group_id, user_id)
+        # Update member activity
+        await db.update_member_activity(group_id, user_id)
 
     # Check if user is admin first - admins are NEVER restricted and EXEMPT from all penalties
-    member = db.get_member(group_id, user_id)
-    
     if member and member.get("is_restricted") and member.get("restriction_until"):
         restriction_until_utc = member.get("restriction_until")  # Fetch raw datetime from DB (likely naive UTC)
 
@@ -88,18 +97,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 end_date = start_date + timedelta(days=7)
                 # Restriction has expired, update the database
                 query = "UPDATE group_members SET is_restricted = 0, restriction_until = NULL, cycle_start_date = %s, cycle_end_date = %s WHERE group_id = %s AND user_id = %s"
-                execute_query(query, (start_date, end_date, group_id, user_id))
+                await db.execute_query(query, (start_date, end_date, group_id, user_id))
                 # Refresh member data
-                member = db.get_member(group_id, user_id)
+                member = await db.get_member(group_id, user_id)
                 logger.info(f"Lifted expired restriction for user {user_id} in group {group_id}.")
             else:
                 logger.info(f"User {user_id} was manually unrestricted by an admin. Syncing database.")
                 start_date = now_ist_aware.date()
                 end_date = start_date + timedelta(days=7)
                 query = "UPDATE group_members SET is_restricted = 0, restriction_until = NULL, cycle_start_date = %s, cycle_end_date = %s WHERE group_id = %s AND user_id = %s"
-                execute_query(query, (start_date, end_date, group_id, user_id))
+                await db.execute_query(query, (start_date, end_date, group_id, user_id))
                 # Refresh member data so the rest of the function works
-                member = db.get_member(group_id, user_id)
+                member = await db.get_member(group_id, user_id)
 
     # Also check if user is currently a Telegram admin/creator
     is_telegram_admin = member and member.get("is_admin", 0) == 1
@@ -142,7 +151,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
             # Update database
             query = "UPDATE group_members SET is_restricted = 0, restriction_until = NULL WHERE group_id = %s AND user_id = %s"
-            execute_query(query, (group_id, user_id))
+            await db.execute_query(query, (group_id, user_id))
 
             logger.info(f"Admin {user_id} was restricted but has now been unrestricted in group {group_id}")
         except Exception as e:
@@ -150,38 +159,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     # Check for banned words FIRST - ALWAYS ban on 2 warnings regardless of points (EXCEPT ADMINS)
     if message.text and not is_admin:
-        custom_banned = db.get_banned_words(group_id)
-
-        if not custom_banned: logger.warning(f"No banned words found for group {group_id}. Check database!")
-
-        message_text_lower = message.text.lower()
-
-        # Check if ANY banned word appears in the message with word boundaries
-        matched_word = None
-        for banned_word in custom_banned:
-            # Use word boundaries for single words, substring for phrases
-            if " " in banned_word:
-                # Multi-word phrases: substring match
-                if banned_word.lower() in message_text_lower:
-                    matched_word = banned_word
-                    logger.warning(f"BANNED PHRASE MATCH: '{banned_word}' found in '{message.text[:50]}'")
-                    break
-            else:
-                pattern = r"\b" + re.escape(banned_word.lower()) + r"\b"
-                if re.search(pattern, message_text_lower):
-                    matched_word = banned_word
-                    logger.warning(f"BANNED WORD MATCH: '{banned_word}' found in '{message.text[:50]}'")
-                    break
+        banned_matcher = await db.get_banned_word_matcher(group_id)
+
+        if not banned_matcher: logger.warning(f"No banned words found for group {group_id}. Check database!")
+
+        # One pass over the message: phrases match as substrings, single words on word boundaries
+        matched_word = banned_matcher.find(message.text)
+        if matched_word:
+            match_kind = "PHRASE" if " " in matched_word else "WORD"
+            logger.warning(f"BANNED {match_kind} MATCH: '{matched_word}' found in '{message.text[:50]}'")
 
         if matched_word:
             try:
                 await message.delete()
-                db.add_banned_words_warning(group_id, user_id)
+                await db.add_banned_words_warning(group_id, user_id)
 
                 # Deduct 10 knockout points for banned word
-                db.deduct_knockout_points(group_id, user_id, 10)
+                await db.deduct_knockout_points(group_id, user_id, 10)
 
-                member = db.get_member(group_id, user_id)
+                member = await db.get_member(group_id, user_id)
                 warnings = member["banned_word_count"] if member else 1
                 total_points = member["total_points"] if member else 0
 
@@ -190,9 +186,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     chat_id=group_id,
                     text=f"⚠️ {first_name}, please avoid using inappropriate language!\n"
                     f"Warning {warnings}/2. Using banned word: '{matched_word}'\n",
+                    priority=Priority.INTERACTIVE,
                 )
 
-                context.job_queue.run_once(lambda _: warning_msg.delete(), when=5)
+                reaper.schedule_message(warning_msg, 5)
 
                 if warnings >= 2:
                     try:
@@ -200,7 +197,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
                         await context.bot.ban_chat_member(group_id, user_id, until_date=until_date)
 
-                        db.remove_member(group_id, user_id, "kicked")
+                        await db.remove_member(group_id, user_id, "kicked")
                         logger.warning(f"User {user_id} record has been DELETED from the database.")
                         
                         await context.bot.unban_chat_member(group_id, user_id)
@@ -233,27 +230,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             except Exception as e:
                 logger.error(f"Error handling banned word: {e}",exc_info=True)
 
-    # Get active slot
-    active_slot = db.get_active_slot(group_id)
-
     if not active_slot:
         # No active slot - delete message, warn, and deduct knockout points
         try:
             await message.delete()
-            db.add_general_warning(group_id, user_id)
+            await db.add_general_warning(group_id, user_id)
 
             # Deduct 5 knockout points for posting outside slot
-            db.deduct_knockout_points(group_id, user_id, 5)
+            await db.deduct_knockout_points(group_id, user_id, 5)
 
             warning_msg = await safe_send_message(
                 context=context, 
                 chat_id=group_id,
                 text=f"⏰ {first_name}, no active slot right now!\n"
                 f"Please only post during designated time slots.\n",
+                priority=Priority.INTERACTIVE,
             )
 
             # Delete warning after 10 seconds
-            context.job_queue.run_once(lambda _: warning_msg.delete(), when=10)
+            reaper.schedule_message(warning_msg, 10)
             logger.info(f"Message outside slot from user {user_id} - knockout points deducted")
             return
 
@@ -262,16 +257,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return
 
     # Handle message based on slot type and content
-    slot_id = active_slot["slot_id"]
     slot_name = active_slot["slot_name"]
     slot_type = active_slot["slot_type"]
 
-    # Get active event
-    event = db.get_active_event(group_id)
+    # Active event and today's completion were loaded with the message context
+    event = message_context["active_event"]
     event_id = event["event_id"] if event else None
 
     # Check if already completed today
-    if event_id and db.check_slot_completed_today(event_id, slot_id, user_id):
+    if event_id and message_context["slot_completed"]:
         try:
             # If it's a duplicate, delete the message and inform the user.
             await message.delete()
@@ -279,12 +273,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 context=context,
                 chat_id=group_id,
                 text=f"✅ {first_name}, you've already completed this slot today!",
+                priority=Priority.INTERACTIVE,
             )
-            
-            async def delete_info_msg(context):
-                if info_msg:
-                    await info_msg.delete()
-            context.job_queue.run_once(delete_info_msg,when=5)
+            reaper.schedule_message(info_msg, 5)
             return
         except Exception as e:
             logger.error(f"Error handling duplicate submission: {e}", exc_info=True)
@@ -298,9 +289,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 chat_id=group_id,
                 text=f"⏰ {first_name}, please use the buttons for the {slot_name} slot!\n"
                      f"Messages are not accepted right now.",
+                priority=Priority.INTERACTIVE,
             )
             # Delete warning after 10 seconds
-            context.job_queue.run_once(lambda _: warning_msg.delete(), when=10)
+            reaper.schedule_message(warning_msg, 10)
             logger.info(f"Deleted invalid message from user {user_id} during button slot {slot_name}")
             return  # Stop all further processing
         except Exception as e:
@@ -337,19 +329,21 @@ async def handle_text_response(update: Update, context: ContextTypes.DEFAULT_TYP
     slot_id = slot["slot_id"]
     slot_name = slot["slot_name"]
 
-    keywords = db.get_slot_keywords(slot_id)
-    text_lower = text.lower()
-    keyword_match = any(keyword.lower() in text_lower for keyword in keywords)
+    keywords = await db.get_slot_keyword_matcher(slot_id)
+    keyword_match = keywords.matches(text)
 
     if keyword_match:
         points = slot["slot_points"]
-        
-        db.add_points(group_id, user_id, points, event_id)
-        db.log_activity(group_id=group_id, user_id=user_id, activity_type="text", slot_name=slot_name,
-                        username=username, first_name=first_name, last_name=last_name, message_content=text,
-                        points_earned=points)
 
-        await message.reply_text(f'✅ {display_name} scored {points} points!')
+        awarded = await db.award_slot(group_id=group_id, event_id=event_id, slot_id=slot_id, user_id=user_id, points=points,
+                                      activity_type="text", slot_name=slot_name, username=username, first_name=first_name,
+                                      last_name=last_name, message_content=text)
+
+        if not awarded:
+            await outbound.submit(group_id, lambda: message.reply_text(f"✅ {first_name}, you've already completed this slot today!"), Priority.INTERACTIVE)
+            return
+
+        await outbound.submit(group_id, lambda: message.reply_text(f'✅ {display_name} scored {points} points!'), Priority.INTERACTIVE)
         logger.info(f"User {user_id} completed slot {slot_name} with text")
 
     else:
@@ -359,22 +353,13 @@ async def handle_text_response(update: Update, context: ContextTypes.DEFAULT_TYP
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        confirmation_msg = await message.reply_text(slot["response_clarify"], reply_markup=reply_markup)
-
-        if "pending_confirmations" not in context.bot_data:
-            context.bot_data["pending_confirmations"] = {}
+        confirmation_msg = await outbound.submit(group_id, lambda: message.reply_text(slot["response_clarify"], reply_markup=reply_markup), Priority.INTERACTIVE)
 
-        context.bot_data["pending_confirmations"][confirmation_msg.message_id] = {
+        confirmations.add(group_id, confirmation_msg.message_id, {
             "user_id": user_id, "username": username, "first_name": first_name, "last_name": last_name,
             "slot_id": slot_id, "slot_name": slot_name, "event_id": event_id, "group_id": group_id,
             "original_message_id": message.message_id, "text": text, "points": slot["slot_points"], "type": "text"
-        }
-
-        context.job_queue.run_once(
-            auto_reject_confirmation,
-            when=config.CONFIRMATION_TIMEOUT,
-            data={"confirmation_msg_id": confirmation_msg.message_id},
-        )
+        })
 
 async def handle_photo_response(update: Update, context: ContextTypes.DEFAULT_TYPE, slot: dict, event_id: int):
     """Handle photo message for a slot."""
@@ -395,45 +380,33 @@ async def handle_photo_response(update: Update, context: ContextTypes.DEFAULT_TY
 
     # Check if photo has a caption with keyword match
     caption = message.caption if message.caption else ""
-    keywords = db.get_slot_keywords(slot_id)
-
-    caption_lower = caption.lower()
-    keyword_match = (
-        any(keyword.lower() in caption_lower for keyword in keywords)
-        if keywords and caption
-        else False
-    )
+    keywords = await db.get_slot_keyword_matcher(slot_id)
+    keyword_match = keywords.matches(caption)
 
     if keyword_match or not keywords:
         # Direct match OR no keywords defined (all photos accepted) - award points
         try:
-            # Download and save photo
-            file = await context.bot.get_file(file_id)
-
-            # Create formatted filename: {username}_{slotname}_{YYYY_MM_DD_HH_MM_SS_am/pm}.jpg
-            timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
-            filename = f"{username}_{slot_name}_{timestamp}.jpg"
-
-            # Save file with new structure
-            local_path = await storage.save_photo(group_id, user_id, username, slot_name, file, filename)
-
-            # Award points
+            # Award points first; the photo is downloaded in the background and its path recorded when it lands
             points = slot["slot_points"]
-            db.add_points(group_id=group_id, user_id=user_id, points=points, event_id=event_id)
-            db.log_activity(group_id=group_id, user_id=user_id, slot_name=slot_name, username=username,
-                            first_name=first_name, last_name=last_name, activity_type="photo", 
-                            telegram_file_id=file_id, local_file_path=local_path, points_earned=points,
-                            )
+            awarded = await db.award_slot(group_id=group_id, event_id=event_id, slot_id=slot_id, user_id=user_id, points=points,
+                                          activity_type="photo", slot_name=slot_name, username=username, first_name=first_name,
+                                          last_name=last_name, telegram_file_id=file_id)
 
-            if event_id:
-                db.mark_slot_completed(group_id=group_id, event_id=event_id, slot_id=slot_id, user_id=user_id, status="completed", points=points)
+            if not awarded:
+                await outbound.submit(group_id, lambda: message.reply_text(f"✅ {first_name}, you've already completed this slot today!"), Priority.INTERACTIVE)
+                return
 
-            await message.reply_text(f'✅ {display_name} scored {points} points!')
+            await outbound.submit(group_id, lambda: message.reply_text(f'✅ {display_name} scored {points} points!'), Priority.INTERACTIVE)
             logger.info(f"User {user_id} completed slot {slot_name} with photo")
 
+            # Create formatted filename: {username}_{slotname}_{YYYY_MM_DD_HH_MM_SS_am/pm}.jpg
+            timestamp = datetime.now(ist).strftime("%Y_%m_%d_%I_%M_%S_%p").lower()
+            filename = f"{username}_{slot_name}_{timestamp}.jpg"
+            await media_pipeline.submit(context.bot, group_id, user_id, username, slot_name, file_id, filename)
+
         except Exception as e:
             logger.error(f"Error handling photo: {e}",exc_info=True)
-            await message.reply_text("Sorry, there was an error processing your photo. Please try again.")
+            await outbound.submit(group_id, lambda: message.reply_text("Sorry, there was an error processing your photo. Please try again."), Priority.INTERACTIVE)
 
     else:
         # Keywords exist but no match - ask for confirmation
@@ -443,25 +416,15 @@ async def handle_photo_response(update: Update, context: ContextTypes.DEFAULT_TY
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        confirmation_msg = await message.reply_text(slot["response_clarify"], reply_markup=reply_markup)
+        confirmation_msg = await outbound.submit(group_id, lambda: message.reply_text(slot["response_clarify"], reply_markup=reply_markup), Priority.INTERACTIVE)
 
-        # Store confirmation data in context
-        if "pending_confirmations" not in context.bot_data:
-            context.bot_data["pending_confirmations"] = {}
-
-        context.bot_data["pending_confirmations"][confirmation_msg.message_id] = {
+        # Store confirmation data until it is answered or times out
+        confirmations.add(group_id, confirmation_msg.message_id, {
             "user_id": user_id, "first_name": first_name, "last_name": last_name, "slot_id": slot_id,
             "slot_name": slot_name, "event_id": event_id, "group_id": group_id, "original_message_id": message.message_id,
             "photo_file_id": file_id, "username": username, "caption": caption, "points": slot["slot_points"],
             "type": "photo",
-        }
-
-        # Auto-select "No" after timeout
-        context.job_queue.run_once(
-            auto_reject_confirmation,
-            when=config.CONFIRMATION_TIMEOUT,
-            data={"confirmation_msg_id": confirmation_msg.message_id},
-        )
+        })
 
 
 async def handle_other_media_response(
@@ -523,62 +486,43 @@ async def handle_other_media_response(
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     # points_msg = f" ({points} points)" if points > 0 else " (no points)"
-    confirmation_msg = await message.reply_text(f"{first_name}, Is this your {slot_name} ?", reply_markup=reply_markup)
-
-    # Store confirmation data in context
-    if "pending_confirmations" not in context.bot_data:
-        context.bot_data["pending_confirmations"] = {}
+    confirmation_msg = await outbound.submit(group_id, lambda: message.reply_text(f"{first_name}, Is this your {slot_name} ?", reply_markup=reply_markup), Priority.INTERACTIVE)
 
-    context.bot_data["pending_confirmations"][confirmation_msg.message_id] = {
+    # Store confirmation data until it is answered or times out
+    confirmations.add(group_id, confirmation_msg.message_id, {
         "user_id": user_id, "first_name": first_name, "last_name": last_name, "slot_id": slot_id,
         "slot_name": slot_name, "event_id": event_id, "group_id": group_id, "original_message_id": message.message_id,
         "file_id": file_id, "username": username, "caption": message.caption if message.caption else "",
         "points": points, "type": "media", "media_type": media_type, "file_ext": file_ext,
-    }
-
-    # Auto-select "No" after timeout
-    context.job_queue.run_once(
-        auto_reject_confirmation,
-        when=config.CONFIRMATION_TIMEOUT,
-        data={"confirmation_msg_id": confirmation_msg.message_id},
-    )
-
-
-async def auto_reject_confirmation(context: ContextTypes.DEFAULT_TYPE):
-    """Auto-rejects confirmation for a user after timeout."""
-    job = context.job
-    confirmation_msg_id = job.data["confirmation_msg_id"]
-
-    if "pending_confirmations" in context.bot_data:
-        if confirmation_msg_id in context.bot_data["pending_confirmations"]:
-            data = context.bot_data["pending_confirmations"][confirmation_msg_id]
-
-            if data:
-                try:
-                    # Deletes the user's original message that was rejected
-                    original_message_id = data.get("original_message_id")
-                    if original_message_id:
-                        await context.bot.delete_message(chat_id=data["group_id"], message_id=original_message_id)
-                        logger.info(f"Deleted timed-out message {original_message_id}")
-
-                    await context.bot.edit_message_text(
-                        chat_id=data["group_id"],
-                        message_id=confirmation_msg_id,
-                        text="⏱️ Timeout didn't get a confirmation!",
-                    )
-
-                    # Deletes the "Timeout" message itself after 3 seconds
-                    context.job_queue.run_once(
-                        lambda ctx: context.bot.delete_message(data["group_id"], confirmation_msg_id),when=5)
-
-                    # Logs that the activity was invalid
-                    db.log_activity(group_id=data["group_id"], user_id=data["user_id"], username=data["username"],
-                                    first_name=data["first_name"], last_name=data["last_name"], 
-                                    slot_name=data["slot_name"], activity_type=data.get("type", "text"),
-                                    message_content=data.get("text", ""), points_earned=0, is_valid=False)
-
-                except Exception as e:
-                    logger.error(f"Error in auto-reject: {e}",exc_info=True)
+    })
+
+
+async def auto_reject_confirmation(bot, chat_id, confirmation_msg_id, data):
+    """Auto-rejects a confirmation the user did not answer in time (called by the confirmation store)."""
+    try:
+        # Deletes the user's original message that was rejected
+        original_message_id = data.get("original_message_id")
+        if original_message_id:
+            await bot.delete_message(chat_id=chat_id, message_id=original_message_id)
+            logger.info(f"Deleted timed-out message {original_message_id}")
+
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=confirmation_msg_id,
+            text="⏱️ Timeout didn't get a confirmation!",
+        )
+
+        # Deletes the "Timeout" message itself after 5 seconds
+        reaper.schedule_delete(chat_id, confirmation_msg_id, 5)
+
+        # Logs that the activity was invalid
+        await db.log_activity(group_id=chat_id, user_id=data["user_id"], username=data["username"],
+                        first_name=data["first_name"], last_name=data["last_name"], 
+                        slot_name=data["slot_name"], activity_type=data.get("type", "text"),
+                        message_content=data.get("text", ""), points_earned=0, is_valid=False)
+
+    except Exception as e:
+        logger.error(f"Error in auto-reject: {e}",exc_info=True)
 
 
 # Create message handlers
@@ -1,9 +1,12 @@
-from telegram import Update, ReplyKeyboardMarkup
+from telegram import Update, ReplyKeyboardMarkup, InputMediaPhoto
 from telegram.ext import CommandHandler, ContextTypes
 import logging
 from datetime import datetime
-from services import database_service as db
-from bot_utils import safe_send_message, safe_reply_text
+from services import async_database_service as db
+from handlers.jobs import reschedule_group_slots
+from bot_utils import safe_send_message, safe_reply_text, outbound, Priority
+from services.media_pipeline import media_pipeline
+from services.media_cache import media_cache
 import config
 from pathlib import Path
 import os
@@ -47,7 +50,7 @@ async def start(update, context):
             one_time_keyboard=False,
         )
 
-        group_config = db.get_group_config(chat.id)
+        group_config = await db.get_group_config(chat.id)
 
         if group_config:
 
@@ -86,11 +89,12 @@ async def start(update, context):
                 bot_member = None
 
             if bot_member and bot_member.status in ["administrator", "creator"]:
-                success = db.create_group_config(group_id, admin_user_id)
+                success = await db.create_group_config(group_id, admin_user_id)
 
                 if success:
+                    await reschedule_group_slots(context, group_id)
                     
-                    db.add_member(group_id=chat.id, user_id=user.id, username=user.username, first_name=user.first_name, 
+                    await db.add_member(group_id=chat.id, user_id=user.id, username=user.username, first_name=user.first_name, 
                                   last_name=user.last_name, is_admin=True, restrict_new=False)
                     
                     welcome_text = (
@@ -137,9 +141,9 @@ async def points(update, context):
     user_id = user.id
 
     # Ensure member exists
-    db.add_member(group_id, user_id, user.username, user.first_name, restrict_new=False)
+    await db.add_member(group_id, user_id, user.username, user.first_name, restrict_new=False)
 
-    member = db.get_member(group_id, user_id)
+    member = await db.get_member(group_id, user_id)
 
     if member:
         earned_points = member.get("total_points", 0)
@@ -162,7 +166,7 @@ async def schedule(update, context):
         return
 
     group_id = chat.id
-    all_slots = db.get_all_slots(group_id)
+    all_slots = await db.get_all_slots(group_id)
 
     if all_slots:
         message = "📅 **Today's Schedule**\n\n"
@@ -224,13 +228,13 @@ async def test_leaderboard(update, context):
     group_id = chat.id
 
     # Get active event
-    event = db.get_active_event(group_id)
+    event = await db.get_active_event(group_id)
     if not event:
         await safe_reply_text(update, context, text = "❌ No active event found!")
         return
 
     # Get leaderboard
-    top_members = db.get_leaderboard(group_id, 10)
+    top_members = await db.get_leaderboard(group_id, 10)
 
     if top_members:
         message = "🏆 **End of Day Leaderboard - Top 10**\n\n"
@@ -261,19 +265,104 @@ async def test_leaderboard(update, context):
     else:
         await safe_reply_text(update, context, text = "📊 No participants yet!")
 
+async def _group_admin_only(update, context):
+    """Replies and returns False unless the command was sent in a group by one of its admins."""
+    chat = update.effective_chat
+    if chat.type == "private":
+        await safe_reply_text(update, context, text = "Use this command in a group!")
+        return False
+    try:
+        member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+        if member.status not in ["creator", "administrator"]:
+            await safe_reply_text(update, context, text = "❌ Only admins can use this command!")
+            return False
+    except Exception as e:
+        logger.error(f"Error checking admin status: {e}",exc_info=True)
+        return False
+    return True
+
+
+def _submission_caption(row, prefix=""):
+    name = row.get("first_name") or row.get("username") or row["user_id"]
+    return f"{prefix}{name} - {row['slot_name']} - {row['activity_timestamp']:%d %b %I:%M %p}"
+
+
+async def review_duplicates(update, context):
+    """Shows the latest photos flagged as re-posts next to the earlier photo they match (admin only)."""
+    chat = update.effective_chat
+    if not await _group_admin_only(update, context):
+        return
+
+    flagged = await db.get_suspected_duplicates(chat.id)
+    if not flagged:
+        await safe_reply_text(update, context, text = "✅ No suspected re-posts to review!")
+        return
+
+    for row in flagged:
+        try:
+            # Stored copy when it is on disk, otherwise fetched into the media cache (lazy-mode groups, archived days)
+            submitted = await media_cache.resolve(row)
+            original = await media_cache.resolve({"local_file_path": row["original_file_path"],
+                                                  "telegram_file_id": row["duplicate_of_file_id"]})
+            if not submitted:
+                continue
+            caption = _submission_caption(row, "🔁 ")
+            if original:
+                media = [InputMediaPhoto(Path(submitted), caption=caption), InputMediaPhoto(Path(original), caption="Earlier photo")]
+                await outbound.submit(chat.id, lambda: context.bot.send_media_group(chat.id, media), Priority.INTERACTIVE)
+            else:
+                await outbound.submit(chat.id, lambda: context.bot.send_photo(chat.id, Path(submitted), caption=caption),
+                                      Priority.INTERACTIVE)
+        except Exception as e:
+            logger.error(f"Error sending flagged photo {row['telegram_file_id']} for review: {e}", exc_info=True)
+
+    logger.info(f"Re-post review of {len(flagged)} photos requested by admin {update.effective_user.id} in group {chat.id}")
+
+
+async def recent_submissions(update, context):
+    """Sends the group's latest photo submissions as one album (admin only), whatever its storage mode."""
+    chat = update.effective_chat
+    if not await _group_admin_only(update, context):
+        return
+
+    photos = []
+    for row in await db.get_recent_submissions(chat.id, 10):  # an album holds at most 10 photos
+        try:
+            # Stored copy for eager groups, the media cache (fetched on first access) for lazy ones
+            path = await media_cache.resolve(row)
+        except Exception as e:
+            logger.error(f"Error resolving photo {row['telegram_file_id']}: {e}", exc_info=True)
+            continue
+        if path:
+            photos.append((Path(path), _submission_caption(row)))
+
+    if not photos:
+        await safe_reply_text(update, context, text = "📷 No photo submissions yet!")
+        return
+    try:
+        if len(photos) == 1:
+            path, caption = photos[0]
+            await outbound.submit(chat.id, lambda: context.bot.send_photo(chat.id, path, caption=caption), Priority.INTERACTIVE)
+        else:
+            media = [InputMediaPhoto(path, caption=caption) for path, caption in photos]
+            await outbound.submit(chat.id, lambda: context.bot.send_media_group(chat.id, media), Priority.INTERACTIVE)
+    except Exception as e:
+        logger.error(f"Error sending recent submissions in group {chat.id}: {e}", exc_info=True)
+    logger.info(f"{len(photos)} recent submissions requested by admin {update.effective_user.id} in group {chat.id}")
+
 # checks bot's health
 async def health_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Performs a health check of the bot's critical services (admin-only)."""
     user_id = update.effective_user.id
     group_id = update.effective_chat.id
 
-    group_config = db.get_group_config(group_id)
+    group_config = await db.get_group_config(group_id)
     if not (group_config and group_config.get("admin_user_id") == user_id):
         return
 
     db_status = "✅ OK"
     try:
-        db.execute_query("SELECT 1", fetch=True)
+        await db.execute_query("SELECT 1", fetch=True)
     except Exception as e:
         db_status = f"❌ FAILED: {e}"
 
@@ -288,14 +377,25 @@ async def health_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         api_status = f"❌ FAILED: {e}"
 
+    write_behind_stats = db.write_behind.stats()
+    outbound_stats = outbound.stats()
+    media_stats = media_pipeline.stats()
+
     health_report = (
         f"**🤖 Bot Health Report**\n\n"
         f"**Database Connection:** {db_status}\n"
         f"**File Storage:** {storage_status}\n"
         f"**Telegram API:** {api_status}\n"
+        f"**Write Queue:** {write_behind_stats['pending_touches'] + write_behind_stats['pending_rows']} pending, "
+        f"{write_behind_stats['errors']} errors\n"
+        f"**Outbound Queue:** {sum(outbound_stats[p.name.lower()] for p in Priority)} pending, "
+        f"{outbound_stats['retry_after']} rate limits hit\n"
+        f"**Media Downloads:** {media_stats['queued']} queued, {media_stats['failed']} failed, "
+        f"{media_stats['avg_latency_ms']} ms avg / {media_stats['p95_latency_ms']} ms p95\n"
     )
 
-    await update.message.reply_text(health_report, parse_mode='Markdown')
+    await outbound.submit(update.effective_chat.id, lambda: update.message.reply_text(health_report, parse_mode='Markdown'),
+                          Priority.INTERACTIVE)
 
 
 start_handler = CommandHandler("start", start)
@@ -304,3 +404,5 @@ schedule_handler = CommandHandler("schedule", schedule)
 help_handler = CommandHandler("help", help_command)
 test_leaderboard_handler = CommandHandler("testleaderboard", test_leaderboard)
 health_check_handler = CommandHandler("health", health_check)
+review_handler = CommandHandler("review", review_duplicates)
+submissions_handler = CommandHandler("submissions", recent_submissions)
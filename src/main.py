@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 from telegram import Update
@@ -5,6 +6,16 @@ from telegram.ext import Application
 import config
 from handlers import setup_handlers
 from db import init_db_pool
+from services import async_database_service
+from bot_utils import outbound
+from services.ephemeral_messages import reaper
+from services.confirmation_store import confirmations
+from services.update_processor import KeyedUpdateProcessor, InFlightUpdateQueue
+from services.media_pipeline import media_pipeline
+from services.image_processing import image_processor
+from services.storage_usage import usage
+from services.media_cache import media_cache
+from handlers.message_handler import auto_reject_confirmation
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.DEBUG
@@ -16,6 +27,41 @@ logging.getLogger("handlers.join_handler").setLevel(logging.DEBUG)
 
 logger = logging.getLogger(__name__)
 
+ALLOWED_UPDATES = ["message", "chat_member", "callback_query"]
+
+
+async def post_init(application):
+    """Start background services that need the running event loop."""
+    await async_database_service.write_behind.start()
+    await outbound.start()
+    await reaper.start(application.bot)
+    await usage.start()
+    image_processor.start()
+    media_cache.start(application.bot)  # restored downloads of lazy groups' photos fetch through it
+    await media_pipeline.start(application.bot)
+    await confirmations.start(
+        lambda chat_id, message_id, data: auto_reject_confirmation(application.bot, chat_id, message_id, data))
+
+
+async def post_stop(application):
+    """Stop background services that talk to Telegram while the bot's HTTP client is still open."""
+    # Confirmations first: their timeout edits still go through the outbound dispatcher
+    await confirmations.stop()
+    await media_pipeline.stop()
+    await image_processor.stop()
+    await reaper.stop()
+    await outbound.stop()
+
+
+async def post_shutdown(application):
+    """Flush pending writes and release the data layer once the bot has shut down."""
+    await usage.stop()
+    await async_database_service.write_behind.stop()
+    # Waiting for in-flight queries blocks, so do it off the event loop
+    await asyncio.to_thread(async_database_service.shutdown)
+    logger.info("Database executor shut down")
+
+
 def main():
     """Start the bot."""
     try:
@@ -31,7 +77,14 @@ def main():
         logger.info("Database connection pool initialized")
         
         # Create the Application with post_init
-        application = Application.builder().token(config.BOT_TOKEN).build()
+        builder = (Application.builder().token(config.BOT_TOKEN).post_init(post_init).post_stop(post_stop)
+                   .post_shutdown(post_shutdown)
+                   .update_queue(InFlightUpdateQueue(config.UPDATE_QUEUE_SIZE, config.UPDATE_MAX_IN_FLIGHT))
+                   .concurrent_updates(KeyedUpdateProcessor(config.UPDATE_CONCURRENCY)))
+        if config.TELEGRAM_API_BASE_URL:
+            base_url = config.TELEGRAM_API_BASE_URL.rstrip("/")
+            builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+        application = builder.build()
 
         # Setup handlers
         setup_handlers(application)
@@ -40,7 +93,21 @@ def main():
         logger.info("Bot is starting... Press Ctrl+C to stop")
         
         # Run the bot until the user presses Ctrl-C
-        application.run_polling(allowed_updates=["message", "chat_member", "callback_query"])
+        if config.BOT_MODE == "webhook":
+            if not config.WEBHOOK_URL:
+                logger.error("BOT_MODE=webhook requires WEBHOOK_URL!")
+                sys.exit(1)
+            application.run_webhook(
+                listen=config.WEBHOOK_LISTEN,
+                port=config.WEBHOOK_PORT,
+                url_path=config.WEBHOOK_PATH,
+                webhook_url=config.WEBHOOK_URL,
+                secret_token=config.WEBHOOK_SECRET_TOKEN,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=ALLOWED_UPDATES,
+            )
+        else:
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
     except KeyboardInterrupt:
         logger.info("Bot stopped by user. Shutdown will now run.")
@@ -0,0 +1,142 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import config
+import db as _db
+from services import database_service as _service
+from services import slot_schedule, banned_words, slot_keywords as keyword_cache
+from services.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# Bounded executor for blocking MySQL calls. It is sized to the connection pool so
+# every worker can always check out a connection, and the event loop never waits
+# on a network round trip (or on the retry sleep in get_db_connection).
+_executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking database function on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _awaitable(func):
+    """Wrap a blocking database function into a coroutine function with the same signature."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_sync(func, *args, **kwargs)
+    return wrapper
+
+
+# Coalesces last-active updates and batches activity-log inserts (started from main.post_init)
+write_behind = WriteBehindQueue(run_sync, _service.touch_members_bulk, _service.log_activities_bulk,
+                                flush_interval_ms=config.WRITE_BEHIND_FLUSH_MS, max_rows=config.WRITE_BEHIND_MAX_ROWS)
+
+
+def shutdown():
+    """Stop accepting new work and wait for in-flight queries to finish (blocks; call it off the event loop)."""
+    _executor.shutdown(wait=True)
+
+
+# Raw query access (mirrors db.execute_query)
+execute_query = _awaitable(_db.execute_query)
+
+# Mirrors services.database_service
+get_group_config = _awaitable(_service.get_group_config)
+get_notice_mode = _awaitable(_service.get_notice_mode)
+get_storage_mode = _awaitable(_service.get_storage_mode)
+get_first_slot_time = _awaitable(_service.get_first_slot_time)
+get_restriction_until_time = _awaitable(_service.get_restriction_until_time)
+create_group_config = _awaitable(_service.create_group_config)
+create_default_event_and_slots = _awaitable(_service.create_default_event_and_slots)
+get_returning_member_info = _awaitable(_service.get_returning_member_info)
+add_member = _awaitable(_service.add_member)
+get_member = _awaitable(_service.get_member)
+update_member_profile = _awaitable(_service.update_member_profile)
+get_message_context = _awaitable(_service.get_message_context)
+add_banned_words_warning = _awaitable(_service.add_banned_words_warning)
+add_general_warning = _awaitable(_service.add_general_warning)
+deduct_knockout_points = _awaitable(_service.deduct_knockout_points)
+get_inactive_members = _awaitable(_service.get_inactive_members)
+log_inactivity_warning = _awaitable(_service.log_inactivity_warning)
+get_members_due_inactivity_warning = _awaitable(_service.get_members_due_inactivity_warning)
+log_inactivity_warnings_bulk = _awaitable(_service.log_inactivity_warnings_bulk)
+remove_member = _awaitable(_service.remove_member)
+get_active_event = _awaitable(_service.get_active_event)
+get_all_slots = _awaitable(_service.get_all_slots)
+get_slot_keywords = _awaitable(_service.get_slot_keywords)
+add_points = _awaitable(_service.add_points)
+get_low_point_members = _awaitable(_service.get_low_point_members)
+advance_member_day_cycles = _awaitable(_service.advance_member_day_cycles)
+mark_slot_completed = _awaitable(_service.mark_slot_completed)
+award_slot = _awaitable(_service.award_slot)
+set_activity_file_path = _awaitable(_service.set_activity_file_path)
+get_recent_photo_hashes = _awaitable(_service.get_recent_photo_hashes)
+add_photo_hash = _awaitable(_service.add_photo_hash)
+flag_suspected_duplicate = _awaitable(_service.flag_suspected_duplicate)
+get_suspected_duplicates = _awaitable(_service.get_suspected_duplicates)
+get_recent_submissions = _awaitable(_service.get_recent_submissions)
+get_storage_policies = _awaitable(_service.get_storage_policies)
+replace_activity_file_path = _awaitable(_service.replace_activity_file_path)
+rewrite_activity_path_prefix = _awaitable(_service.rewrite_activity_path_prefix)
+add_storage_usage_bulk = _awaitable(_service.add_storage_usage_bulk)
+replace_storage_usage = _awaitable(_service.replace_storage_usage)
+get_storage_usage = _awaitable(_service.get_storage_usage)
+check_slot_completed_today = _awaitable(_service.check_slot_completed_today)
+get_banned_words = _awaitable(_service.get_banned_words)
+get_leaderboard = _awaitable(_service.get_leaderboard)
+penalize_zero_activity_members = _awaitable(_service.penalize_zero_activity_members)
+set_runtime_state = _awaitable(_service.set_runtime_state)
+get_runtime_state = _awaitable(_service.get_runtime_state)
+update_admin_status = _awaitable(_service.update_admin_status)
+log_missed_slots = _awaitable(_service.log_missed_slots)
+
+
+async def get_slot_schedule(group_id):
+    """Return the group's cached slot index, only touching the database when it must be (re)loaded."""
+    schedule = slot_schedule.get_cached(group_id, config.SLOT_SCHEDULE_TTL)
+    if schedule is None:
+        schedule = await run_sync(_service.get_slot_schedule, group_id)
+    return schedule
+
+
+async def get_active_slot(group_id):
+    return (await get_slot_schedule(group_id)).active_slot()
+
+
+async def get_next_slot_boundary(group_id):
+    return (await get_slot_schedule(group_id)).next_boundary()
+
+
+async def get_banned_word_matcher(group_id):
+    """Return the group's compiled banned-word matcher, only querying when it must be rebuilt."""
+    matcher = banned_words.get_cached(group_id, config.BANNED_WORDS_TTL)
+    if matcher is None:
+        matcher = await run_sync(_service.get_banned_word_matcher, group_id)
+    return matcher
+
+
+async def get_slot_keyword_matcher(slot_id):
+    """Return the slot's compiled keyword matcher, only querying when it must be rebuilt."""
+    matcher = keyword_cache.get_cached(slot_id, config.SLOT_SCHEDULE_TTL)
+    if matcher is None:
+        matcher = await run_sync(_service.get_slot_keyword_matcher, slot_id)
+    return matcher
+
+
+async def update_member_activity(group_id, user_id):
+    """Record member activity. Queued and coalesced when the write-behind queue is running."""
+    if write_behind.running:
+        write_behind.touch_member(group_id, user_id)
+    else:
+        await run_sync(_service.update_member_activity, group_id, user_id)
+
+
+async def log_activity(group_id, user_id, activity_type, slot_name, **kwargs):
+    """Append to user_activity_log. Batched into multi-row INSERTs when the write-behind queue is running."""
+    if write_behind.running:
+        write_behind.log_activity(dict(group_id=group_id, user_id=user_id, activity_type=activity_type, slot_name=slot_name, **kwargs))
+    else:
+        await run_sync(_service.log_activity, group_id, user_id, activity_type, slot_name, **kwargs)
@@ -0,0 +1,63 @@
+import re
+import time as _time
+
+
+class BannedWordMatcher:
+    """
+    One compiled pattern for a group's whole banned-word list.
+
+    Keeps the original rules: an entry containing a space is a phrase and matches as a
+    plain substring, any other entry must match as a whole word (`\\b...\\b`). Every
+    alternative carries its own anchors, so combining them into a single alternation
+    does not change what matches, only that the message is scanned once.
+    """
+
+    def __init__(self, words):
+        self._originals = {}
+        for word in words:
+            if word and word.lower() not in self._originals:
+                self._originals[word.lower()] = word
+
+        alternatives = []
+        # Longer entries first so "fucking" is reported over "fuck" at the same position.
+        for lowered in sorted(self._originals, key=len, reverse=True):
+            escaped = re.escape(lowered)
+            alternatives.append(escaped if " " in lowered else r"\b" + escaped + r"\b")
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def __len__(self):
+        return len(self._originals)
+
+    def find(self, text):
+        """Return the banned word (as stored) that occurs first in `text`, or None."""
+        if not self._pattern or not text:
+            return None
+        match = self._pattern.search(text.lower())
+        return self._originals[match.group(0)] if match else None
+
+
+# Per-group cache: group_id -> (BannedWordMatcher, built_at monotonic seconds)
+_matchers = {}
+
+
+def get_cached(group_id, max_age):
+    """Return the cached matcher for a group if it is younger than `max_age` seconds."""
+    entry = _matchers.get(group_id)
+    if entry and _time.monotonic() - entry[1] < max_age:
+        return entry[0]
+    return None
+
+
+def store(group_id, words):
+    """Compile and cache the matcher for a group from its banned-word list."""
+    matcher = BannedWordMatcher(words)
+    _matchers[group_id] = (matcher, _time.monotonic())
+    return matcher
+
+
+def invalidate(group_id=None):
+    """Drop the cached matcher for one group, or for every group (e.g. after a global word change)."""
+    if group_id is None:
+        _matchers.clear()
+    else:
+        _matchers.pop(group_id, None)
@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import logging
+import time
+import config
+from services import state_file
+
+logger = logging.getLogger(__name__)
+
+
+class ConfirmationStore:
+    """
+    Pending Yes/No slot confirmations, keyed by (chat_id, confirmation message_id).
+
+    Lookups are a dict access. All timeouts share one min-heap of (expires_at, key) drained by a
+    single background task, which hands each expired entry to the `on_expire` callback given to
+    `start`. Stale heap entries (already answered) are skipped lazily when they reach the top.
+    When `max_size` entries are pending, the one closest to expiring is expired early to make
+    room. With a `state_path`, pending entries are saved periodically and on shutdown and reloaded
+    on start; anything that timed out while the bot was down expires right away.
+    """
+
+    def __init__(self, ttl, max_size, state_path=None, save_interval=30):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self._entries = {}  # (chat_id, message_id) -> (expires_at epoch seconds, data)
+        self._heap = []     # (expires_at, chat_id, message_id)
+        self._on_expire = None
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.counters = {"added": 0, "resolved": 0, "expired": 0, "evicted": 0, "high_water": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def stats(self):
+        return {"pending": len(self._entries), **self.counters}
+
+    def add(self, chat_id, message_id, data):
+        """Register a pending confirmation that times out after `ttl` seconds."""
+        while len(self._entries) >= self.max_size and self._heap:
+            self._expire(*heapq.heappop(self._heap), evicted=True)
+
+        expires_at = time.time() + self.ttl
+        self._entries[(chat_id, message_id)] = (expires_at, data)
+        heapq.heappush(self._heap, (expires_at, chat_id, message_id))
+        self._dirty = True
+        self.counters["added"] += 1
+        self.counters["high_water"] = max(self.counters["high_water"], len(self._entries))
+        if self._wakeup and self._heap[0][1:] == (chat_id, message_id):
+            self._wakeup.set()
+
+    def get(self, chat_id, message_id):
+        entry = self._entries.get((chat_id, message_id))
+        return entry[1] if entry else None
+
+    def pop(self, chat_id, message_id):
+        """Remove and return a confirmation once it has been answered (None if it is gone)."""
+        entry = self._entries.pop((chat_id, message_id), None)
+        if entry is None:
+            return None
+        self._dirty = True
+        self.counters["resolved"] += 1
+        return entry[1]
+
+    def _expire(self, expires_at, chat_id, message_id, evicted=False):
+        entry = self._entries.get((chat_id, message_id))
+        if entry is None or entry[0] != expires_at:
+            return  # answered (or re-added) since this heap entry was pushed
+        del self._entries[(chat_id, message_id)]
+        self._dirty = True
+        self.counters["evicted" if evicted else "expired"] += 1
+        if self._on_expire:
+            task = asyncio.create_task(self._run_on_expire(chat_id, message_id, entry[1]))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_on_expire(self, chat_id, message_id, data):
+        try:
+            await self._on_expire(chat_id, message_id, data)
+        except Exception as e:
+            logger.error(f"Error expiring confirmation {message_id} in chat {chat_id}: {e}", exc_info=True)
+
+    async def start(self, on_expire):
+        """Load persisted confirmations and start expiring them through `on_expire(chat_id, message_id, data)`."""
+        self._on_expire = on_expire
+        if self.state_path:
+            for chat_id, message_id, expires_at, data in state_file.load(self.state_path, []):
+                self._entries[(chat_id, message_id)] = (expires_at, data)
+                heapq.heappush(self._heap, (expires_at, chat_id, message_id))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Confirmation store started with %s pending confirmations", len(self._entries))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self.state_path:
+            state_file.save(self.state_path, self._snapshot())
+        logger.info("Confirmation store stopped: %s", self.stats())
+
+    def _snapshot(self):
+        return [[chat_id, message_id, expires_at, data] for (chat_id, message_id), (expires_at, data) in self._entries.items()]
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                self._expire(*heapq.heappop(self._heap))
+
+            if self.state_path and self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+                self._dirty = False
+                self._saved_at = time.monotonic()
+                await asyncio.to_thread(state_file.save, self.state_path, self._snapshot())
+
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else self.save_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(timeout, self.save_interval))
+            except asyncio.TimeoutError:
+                pass
+
+
+# Shared instance (started from main.post_init with the auto-reject callback)
+confirmations = ConfirmationStore(config.CONFIRMATION_TIMEOUT, config.CONFIRMATION_MAX_PENDING, config.CONFIRMATION_STATE_FILE or None)
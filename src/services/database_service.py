@@ -1,8 +1,9 @@
 import logging
 from datetime import datetime, timedelta
 from pytz import timezone
-from config import NEW_MEMBER_RESTRICTION_MINUTES
+from config import NEW_MEMBER_RESTRICTION_MINUTES, SLOT_SCHEDULE_TTL, BANNED_WORDS_TTL, NOTICE_MODE, MEDIA_STORAGE_MODE
 from db import execute_query, get_db_connection
+from services import slot_schedule, banned_words, slot_keywords as keyword_cache
 import mysql.connector
 
 ist=timezone("Asia/Kolkata")
@@ -15,6 +16,20 @@ def get_group_config(group_id):
     return result[0] if result else None
 
 
+def get_notice_mode(group_id):
+    """Return how jobs announce per-member notices in a group: 'digest' or 'individual' (NOTICE_MODE unless the group overrides it)."""
+    query = "SELECT notice_mode FROM groups_config WHERE group_id = %s"
+    result = execute_query(query, (group_id,), fetch=True)
+    return (result[0]["notice_mode"] if result else None) or NOTICE_MODE
+
+
+def get_storage_mode(group_id):
+    """Return how a group's submitted media is stored: 'eager' or 'lazy' (MEDIA_STORAGE_MODE unless the group overrides it)."""
+    query = "SELECT storage_mode FROM groups_config WHERE group_id = %s"
+    result = execute_query(query, (group_id,), fetch=True)
+    return (result[0]["storage_mode"] if result else None) or MEDIA_STORAGE_MODE
+
+
 # fetches very first slot's starting time
 def get_first_slot_time(group_id):
     """Get the start time of the first slot of the day."""
@@ -209,9 +224,7 @@ def create_default_event_and_slots(group_id):
             "Breakfast": ["breakfast", "morning meal"],
             "Water Intake": ["100ml", "200ml", "300ml", "400ml", "500ml", "600ml", "700ml", "800ml", "900ml", "1l", "2l", "3l", "4l", "5l"],
             "Lunch": ["lunch", "afternoon meal"],
-            "Water Intake": ["100ml", "200ml", "300ml", "400ml", "500ml", "600ml", "700ml", "800ml", "900ml", "1l", "2l", "3l", "4l", "5l"],
             "Evening Snacks": ["snacks", "evening snack"],
-            "Water Intake": ["100ml", "200ml", "300ml", "400ml", "500ml", "600ml", "700ml", "800ml", "900ml", "1l", "2l", "3l", "4l", "5l"],
             "Dinner": ["dinner", "night meal"],
         }
 
@@ -235,6 +248,8 @@ def create_default_event_and_slots(group_id):
                     INSERT INTO slot_keywords (slot_id, keyword) VALUES (%s, %s)
                     """
                     execute_query(query, (slot_id, keyword))
+            keyword_cache.invalidate(slot_id)
+        slot_schedule.invalidate(group_id)
         logger.info(
             f"Created {len(slots)} default slots with multilingual keywords for group {group_id}"
         )
@@ -400,12 +415,87 @@ def update_member_activity(group_id, user_id):
     execute_query(query, (group_id, user_id))
 
 
+def touch_members_bulk(touches):
+    """
+    Updates last_active_timestamp for many members with one statement.
+    `touches` is a list of (group_id, user_id, seconds_ago) tuples.
+    """
+    if not touches:
+        return
+    rows = " UNION ALL ".join(["SELECT %s AS group_id, %s AS user_id, %s AS seconds_ago"] * len(touches))
+    query = f"""
+        UPDATE group_members gm
+        JOIN ({rows}) t ON gm.group_id = t.group_id AND gm.user_id = t.user_id
+        SET gm.last_active_timestamp = GREATEST(gm.last_active_timestamp, DATE_SUB(NOW(), INTERVAL t.seconds_ago SECOND))
+    """
+    params = tuple(value for touch in touches for value in touch)
+    execute_query(query, params)
+
+
 def get_member(group_id, user_id):
     query = "SELECT * FROM group_members WHERE group_id = %s AND user_id = %s"
     result = execute_query(query, (group_id, user_id), fetch=True)
     return result[0] if result else None
 
 
+def update_member_profile(group_id, user_id, username, first_name, last_name):
+    query = "UPDATE group_members SET username = %s, first_name = %s, last_name = %s WHERE group_id = %s AND user_id = %s"
+    execute_query(query, (username, first_name, last_name, group_id, user_id))
+
+
+def get_message_context(group_id, user_id, slot_id=None):
+    """
+    Loads everything handle_message needs to decide on a group message in one round trip:
+    the group config, the member row, the active event and (when a slot is active)
+    whether the member already completed that slot today.
+    """
+    statements = [
+        ("SELECT * FROM groups_config WHERE group_id = %s", (group_id,)),
+        ("SELECT * FROM group_members WHERE group_id = %s AND user_id = %s", (group_id, user_id)),
+        ("""
+            SELECT * FROM events
+            WHERE group_id = %s AND is_active = TRUE
+            AND CURDATE() BETWEEN start_date AND end_date
+            LIMIT 1
+        """, (group_id,)),
+    ]
+    if slot_id is not None:
+        statements.append(("""
+            SELECT COUNT(*) AS count FROM daily_slot_tracker
+            WHERE slot_id = %s AND user_id = %s AND log_date = CURDATE()
+            AND event_id = (
+                SELECT event_id FROM events
+                WHERE group_id = %s AND is_active = TRUE
+                AND CURDATE() BETWEEN start_date AND end_date
+                LIMIT 1
+            )
+        """, (slot_id, user_id, group_id)))
+
+    query = ";".join(statement for statement, _ in statements)
+    params = tuple(param for _, statement_params in statements for param in statement_params)
+
+    results = []
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor(dictionary=True) as cursor:
+            for result in cursor.execute(query, params, multi=True):
+                if result.with_rows:
+                    results.append(result.fetchall())
+    finally:
+        if conn:
+            conn.close()
+
+    group_config, member, event = (rows[0] if rows else None for rows in results[:3])
+    completed = results[3][0]["count"] > 0 if len(results) > 3 and results[3] else False
+    return {
+        "group_config": group_config,
+        "member": member,
+        "active_event": event,
+        "slot_completed": completed,
+    }
+
+
 # updates banned word counts per user
 def add_banned_words_warning(group_id, user_id):
     query = "UPDATE group_members SET banned_word_count = banned_word_count + 1 WHERE group_id = %s AND user_id = %s"
@@ -438,13 +528,32 @@ def deduct_knockout_points(group_id, user_id, points):
 
 
 def get_inactive_members(group_id, days=3):
+    """Members inactive for more than `days` days in one group, or across all groups when `group_id` is None."""
     query = """
-            SELECT user_id, username, first_name, last_active_timestamp
+            SELECT group_id, user_id, username, first_name, last_name, last_active_timestamp
             FROM group_members
-            WHERE group_id = %s 
-            AND last_active_timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
+            WHERE last_active_timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
         """
-    return execute_query(query, (group_id, days), fetch=True)
+    if group_id is None:
+        return execute_query(query, (days,), fetch=True)
+    return execute_query(query + " AND group_id = %s", (days, group_id), fetch=True)
+
+
+def get_members_due_inactivity_warning(warning_type="3day", days=3):
+    """
+    All members, across every group, inactive for more than `days` days who have not
+    received a `warning_type` warning today. The LEFT JOIN uses the unique key of inactivity_warnings.
+    """
+    query = """
+            SELECT gm.group_id, gm.user_id, gm.username, gm.first_name, gm.last_name, gm.last_active_timestamp
+            FROM group_members gm
+            LEFT JOIN inactivity_warnings iw
+                ON iw.group_id = gm.group_id AND iw.user_id = gm.user_id
+                AND iw.warning_date = CURDATE() AND iw.warning_type = %s
+            WHERE gm.last_active_timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
+            AND iw.warning_id IS NULL
+        """
+    return execute_query(query, (warning_type, days), fetch=True)
 
 
 def log_inactivity_warning(group_id, user_id, warning_type, member_details):
@@ -464,6 +573,22 @@ def log_inactivity_warning(group_id, user_id, warning_type, member_details):
         ),
     )
 
+
+def log_inactivity_warnings_bulk(members, warning_type):
+    """Records today's `warning_type` warning for many members with one multi-row INSERT IGNORE."""
+    if not members:
+        return
+    values = ", ".join(["(%s, %s, %s, %s, %s, CURDATE(), %s)"] * len(members))
+    query = f"""
+        INSERT IGNORE INTO inactivity_warnings (group_id, user_id, username, first_name, last_name, warning_date, warning_type)
+        VALUES {values}
+    """
+    params = []
+    for member in members:
+        params.extend((member["group_id"], member["user_id"], member.get("username"), member.get("first_name"),
+                       member.get("last_name"), warning_type))
+    execute_query(query, tuple(params))
+
 # Stores a complete snapshot of a member to member_history and then deletes them from group_members
 def remove_member(group_id, user_id, action="kicked"):
     try:
@@ -512,19 +637,22 @@ def get_active_event(group_id):
     return result[0] if result else None
 
 
+def get_slot_schedule(group_id):
+    """Return the in-memory slot index for a group, loading it from group_slots when missing or stale."""
+    schedule = slot_schedule.get_cached(group_id, SLOT_SCHEDULE_TTL)
+    if schedule is None:
+        schedule = slot_schedule.store(group_id, get_all_slots(group_id))
+    return schedule
+
+
 def get_active_slot(group_id):
-    query = """
-            SELECT * FROM group_slots
-            WHERE group_id = %s
-            AND (
-                (start_time <= end_time AND CURTIME() BETWEEN start_time AND end_time)
-                OR
-                (start_time > end_time AND (CURTIME() >= start_time OR CURTIME() <= end_time))
-            )
-            LIMIT 1
-        """
-    result = execute_query(query, (group_id,), fetch=True)
-    return result[0] if result else None
+    """Return the slot active right now (IST) for a group, answered from the cached slot index."""
+    return get_slot_schedule(group_id).active_slot()
+
+
+def get_next_slot_boundary(group_id):
+    """Return the IST datetime at which the group's active slot next changes, or None without slots."""
+    return get_slot_schedule(group_id).next_boundary()
 
 
 def get_all_slots(group_id):
@@ -538,6 +666,14 @@ def get_slot_keywords(slot_id):
     return [r["keyword"] for r in results] if results else []
 
 
+def get_slot_keyword_matcher(slot_id):
+    """Return the compiled keyword matcher for a slot. Keywords are part of the slot schedule, so they share its TTL."""
+    matcher = keyword_cache.get_cached(slot_id, SLOT_SCHEDULE_TTL)
+    if matcher is None:
+        matcher = keyword_cache.store(slot_id, get_slot_keywords(slot_id))
+    return matcher
+
+
 def log_activity(group_id, user_id, activity_type, slot_name, username=None, first_name=None, last_name=None, message_content=None,
                  telegram_file_id=None, local_file_path=None, points_earned=0, is_valid=True):
     query = """
@@ -550,6 +686,162 @@ def log_activity(group_id, user_id, activity_type, slot_name, username=None, fir
                           local_file_path, points_earned, is_valid))
 
 
+def log_activities_bulk(entries):
+    """
+    Inserts many activity-log rows with a single multi-row INSERT.
+    `entries` is a list of (row, seconds_ago) where row holds log_activity's keyword arguments.
+    """
+    if not entries:
+        return
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, DATE_SUB(NOW(), INTERVAL %s SECOND))"] * len(entries))
+    query = f"""
+            INSERT INTO user_activity_log 
+            (group_id, user_id, activity_type, slot_name, username, first_name, last_name, message_content, 
+             telegram_file_id, local_file_path, points_earned, is_valid, activity_timestamp)
+            VALUES {values}
+        """
+    params = []
+    for row, seconds_ago in entries:
+        params.extend((row["group_id"], row["user_id"], row["activity_type"], row["slot_name"], row.get("username"),
+                       row.get("first_name"), row.get("last_name"), row.get("message_content"), row.get("telegram_file_id"),
+                       row.get("local_file_path"), row.get("points_earned", 0), row.get("is_valid", True), seconds_ago))
+    execute_query(query, tuple(params))
+
+
+def set_activity_file_path(group_id, user_id, telegram_file_id, local_file_path, display_file_path=None,
+                           thumbnail_file_path=None):
+    """Records where a submission's media (and its photo renditions, if any) landed once its background download has finished."""
+    query = """
+            UPDATE user_activity_log SET local_file_path = %s, display_file_path = %s, thumbnail_file_path = %s
+            WHERE group_id = %s AND user_id = %s AND telegram_file_id = %s AND local_file_path IS NULL
+        """
+    execute_query(query, (local_file_path, display_file_path, thumbnail_file_path, group_id, user_id, telegram_file_id))
+
+
+def get_recent_photo_hashes(group_id, days):
+    """Perceptual hashes of a group's photos from the last `days` days, with created_at as a Unix timestamp."""
+    query = """
+            SELECT user_id, telegram_file_id, dhash, UNIX_TIMESTAMP(created_at) AS created_at
+            FROM photo_hashes
+            WHERE group_id = %s AND created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+        """
+    return execute_query(query, (group_id, days), fetch=True)
+
+
+def add_photo_hash(group_id, user_id, telegram_file_id, dhash):
+    query = "INSERT INTO photo_hashes (group_id, user_id, telegram_file_id, dhash) VALUES (%s, %s, %s, %s)"
+    execute_query(query, (group_id, user_id, telegram_file_id, dhash))
+
+
+def flag_suspected_duplicate(group_id, user_id, telegram_file_id, duplicate_of_file_id):
+    """Marks a photo submission as a suspected re-post of an earlier photo."""
+    query = """
+            UPDATE user_activity_log SET suspected_duplicate = TRUE, duplicate_of_file_id = %s
+            WHERE group_id = %s AND user_id = %s AND telegram_file_id = %s
+        """
+    execute_query(query, (duplicate_of_file_id, group_id, user_id, telegram_file_id))
+
+
+def get_suspected_duplicates(group_id, limit=5):
+    """
+    A group's most recent photo submissions flagged as re-posts, newest first, each with the stored
+    path of the earlier photo it matched (original_file_path, None if that was never stored).
+    """
+    query = """
+            SELECT a.user_id, a.username, a.first_name, a.slot_name, a.telegram_file_id, a.local_file_path,
+                   a.duplicate_of_file_id, a.activity_timestamp,
+                   (SELECT o.local_file_path FROM user_activity_log o
+                    WHERE o.group_id = a.group_id AND o.telegram_file_id = a.duplicate_of_file_id
+                    AND o.local_file_path IS NOT NULL
+                    ORDER BY o.log_id LIMIT 1) AS original_file_path
+            FROM user_activity_log a
+            WHERE a.group_id = %s AND a.suspected_duplicate = TRUE
+            ORDER BY a.activity_timestamp DESC
+            LIMIT %s
+        """
+    return execute_query(query, (group_id, limit), fetch=True)
+
+
+def get_recent_submissions(group_id, limit=10):
+    """A group's most recent photo submissions, newest first."""
+    query = """
+            SELECT user_id, username, first_name, slot_name, telegram_file_id, local_file_path, activity_timestamp
+            FROM user_activity_log
+            WHERE group_id = %s AND activity_type = 'photo' AND telegram_file_id IS NOT NULL
+            ORDER BY activity_timestamp DESC
+            LIMIT %s
+        """
+    return execute_query(query, (group_id, limit), fetch=True)
+
+
+def get_storage_policies():
+    """Every group's retention settings; NULL columns fall back to the MEDIA_*_AFTER_DAYS defaults."""
+    query = "SELECT group_id, reencode_after_days, archive_after_days, delete_after_days FROM groups_config"
+    return execute_query(query, fetch=True)
+
+
+def replace_activity_file_path(group_id, old_path, new_path):
+    """Points a group's activity-log rows from one stored file to another."""
+    query = "UPDATE user_activity_log SET local_file_path = %s WHERE group_id = %s AND local_file_path = %s"
+    execute_query(query, (new_path, group_id, old_path))
+
+
+def rewrite_activity_path_prefix(group_id, old_prefix, new_prefix):
+    """
+    Rewrites the start of every stored media path (original and renditions) in a group that begins
+    with `old_prefix`. A `new_prefix` of None clears those paths, for files that have been deleted.
+    """
+    columns = ("local_file_path", "display_file_path", "thumbnail_file_path")
+    length = len(old_prefix)
+    assignments = ", ".join(f"{column} = IF(LEFT({column}, %s) = %s, CONCAT(%s, SUBSTRING({column}, %s)), {column})"
+                            for column in columns)
+    conditions = " OR ".join(f"LEFT({column}, %s) = %s" for column in columns)
+    query = f"UPDATE user_activity_log SET {assignments} WHERE group_id = %s AND ({conditions})"
+    params = [value for _ in columns for value in (length, old_prefix, new_prefix, length + 1)]
+    params.append(group_id)
+    params.extend(value for _ in columns for value in (length, old_prefix))
+    execute_query(query, tuple(params))
+
+
+def add_storage_usage_bulk(rows):
+    """Adds (group_id, media_type, day, files, bytes) deltas to storage_usage with one multi-row upsert."""
+    if not rows:
+        return
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    query = f"""
+            INSERT INTO storage_usage (group_id, media_type, day, file_count, byte_count)
+            VALUES {values}
+            ON DUPLICATE KEY UPDATE file_count = file_count + VALUES(file_count), byte_count = byte_count + VALUES(byte_count)
+        """
+    execute_query(query, tuple(value for row in rows for value in row))
+
+
+def replace_storage_usage(group_id, rows, before):
+    """
+    Overwrites a group's storage_usage rows dated before `before` with freshly scanned
+    (media_type, day, files, bytes) totals, in a single transaction.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM storage_usage WHERE group_id = %s AND day < %s", (group_id, before))
+            if rows:
+                values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+                cursor.execute(f"INSERT INTO storage_usage (group_id, media_type, day, file_count, byte_count) VALUES {values}",
+                               tuple(value for row in rows for value in (group_id, *row)))
+            conn.commit()
+
+
+def get_storage_usage(group_id):
+    """A group's files and bytes on disk per media type."""
+    query = """
+            SELECT media_type, SUM(file_count) AS file_count, SUM(byte_count) AS byte_count
+            FROM storage_usage
+            WHERE group_id = %s
+            GROUP BY media_type
+        """
+    return execute_query(query, (group_id,), fetch=True)
+
+
 def add_points(group_id, user_id, points, event_id=None):
     """Adds points to a user's total score."""
     try:
@@ -570,6 +862,55 @@ def get_low_point_members(group_id, min_points):
     return execute_query(query, (group_id, min_points), fetch=True)
 
 
+def advance_member_day_cycles(today):
+    """
+    Moves every non-restricted member across all groups to their current cycle day in one transaction.
+    Members past Day 7 start a fresh cycle on `today` with their points cleared. All others get
+    user_day_number = days since cycle_start_date + 1.
+    Returns only the reset members (with the points they finished on) so the caller can congratulate them.
+    """
+    # Plain ranges on cycle_start_date (no DATEDIFF around the column) so idx_cycle_start bounds the rows
+    # scanned and locked to members whose cycle actually moves today.
+    finished = "is_restricted = 0 AND cycle_start_date <= DATE_SUB(%s, INTERVAL 7 DAY)"
+    running = "is_restricted = 0 AND cycle_start_date BETWEEN DATE_SUB(%s, INTERVAL 6 DAY) AND DATE_SUB(%s, INTERVAL 1 DAY)"
+    query = f"""
+        SELECT group_id, user_id, username, first_name, last_name, total_points
+        FROM group_members
+        WHERE {finished}
+        FOR UPDATE;
+        UPDATE group_members
+        SET user_day_number = 1, cycle_start_date = %s, total_points = 0, knockout_points = 0
+        WHERE {finished};
+        UPDATE group_members
+        SET user_day_number = DATEDIFF(%s, cycle_start_date) + 1
+        WHERE {running}
+        AND user_day_number <> DATEDIFF(%s, cycle_start_date) + 1
+    """
+    params = (today, today, today, today, today, today, today)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        reset_members, row_counts = [], []
+        with conn.cursor(dictionary=True) as cursor:
+            for result in cursor.execute(query, params, multi=True):
+                if result.with_rows:
+                    reset_members = result.fetchall()
+                else:
+                    row_counts.append(result.rowcount)
+        conn.commit()
+        logger.info(f"Day cycles: reset {len(reset_members)} members, advanced {row_counts[-1] if row_counts else 0}")
+        return reset_members
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error advancing member day cycles: {e}", exc_info=True)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
 def mark_slot_completed(group_id, event_id, slot_id, user_id, status="completed", points=0):
     """
     Attempts to mark a slot as completed.
@@ -597,6 +938,61 @@ def mark_slot_completed(group_id, event_id, slot_id, user_id, status="completed"
             return cursor.rowcount == 1
 
 
+def award_slot(group_id, event_id, slot_id, user_id, points, activity_type, slot_name, username=None, first_name=None,
+               last_name=None, message_content=None, telegram_file_id=None, local_file_path=None):
+    """
+    Awards a slot submission as one transaction sent in a single batch:
+    records the completion in daily_slot_tracker, adds the points only if that row is new,
+    and appends the submission to user_activity_log (with 0 points for a duplicate).
+    Without an active event there is no tracker row and the points are always awarded.
+    Returns True if points were awarded, False for a duplicate submission.
+    """
+    statements = []
+    if event_id:
+        statements.append(("""
+            INSERT INTO daily_slot_tracker (event_id, slot_id, user_id, username, first_name, last_name, log_date, status, points_scored)
+            VALUES (%s, %s, %s, %s, %s, %s, CURDATE(), 'completed', %s)
+            ON DUPLICATE KEY UPDATE duplicate_submissions = duplicate_submissions + 1
+        """, (event_id, slot_id, user_id, username, first_name, last_name, points)))
+        statements.append(("SET @awarded = (ROW_COUNT() = 1)", ()))
+    else:
+        statements.append(("SET @awarded = TRUE", ()))
+    statements.append((
+        "UPDATE group_members SET total_points = total_points + %s WHERE group_id = %s AND user_id = %s AND @awarded",
+        (points, group_id, user_id)))
+    statements.append(("""
+        INSERT INTO user_activity_log
+        (group_id, user_id, activity_type, slot_name, username, first_name, last_name, message_content,
+         telegram_file_id, local_file_path, points_earned, is_valid)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, IF(@awarded, %s, 0), TRUE)
+    """, (group_id, user_id, activity_type, slot_name, username, first_name, last_name, message_content,
+          telegram_file_id, local_file_path, points)))
+    statements.append(("SELECT @awarded AS awarded", ()))
+
+    query = ";".join(statement for statement, _ in statements)
+    params = tuple(param for _, statement_params in statements for param in statement_params)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        awarded = False
+        with conn.cursor(dictionary=True) as cursor:
+            for result in cursor.execute(query, params, multi=True):
+                if result.with_rows:
+                    rows = result.fetchall()
+                    awarded = bool(rows and rows[0]["awarded"])
+        conn.commit()
+        return awarded
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error awarding slot {slot_id} to user {user_id} in group {group_id}: {e}", exc_info=True)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
 def check_slot_completed_today(event_id, slot_id, user_id):
     """DEPRECATED: This check is now handled atomically inside mark_slot_completed."""
     query = """
@@ -614,6 +1010,14 @@ def get_banned_words(group_id):
     return [r["word"] for r in results] if results else []
 
 
+def get_banned_word_matcher(group_id):
+    """Return the compiled banned-word matcher for a group, rebuilding it when missing or stale."""
+    matcher = banned_words.get_cached(group_id, BANNED_WORDS_TTL)
+    if matcher is None:
+        matcher = banned_words.store(group_id, get_banned_words(group_id))
+    return matcher
+
+
 def get_leaderboard(group_id, limit=10):
     """
     Fetches the top members for the leaderboard, only including those
@@ -630,42 +1034,52 @@ def get_leaderboard(group_id, limit=10):
     return execute_query(query, (group_id, limit), fetch=True)
 
 
-def penalize_zero_activity_members(group_id, event_id, points_to_deduct):
-    """Finds members with no slot completions for today and deducts knockout points."""
-    try:
-        query_1 = """
-            SELECT DISTINCT user_id 
-            FROM daily_slot_tracker 
-            WHERE event_id = %s AND log_date = CURDATE() AND status = 'completed'
-        """
-        active_members_result = execute_query(query_1, (event_id,), fetch=True)
-        active_user_ids = {row["user_id"] for row in active_members_result}
+def penalize_zero_activity_members(group_id, event_id, points_to_deduct, return_ids=False):
+    """
+    Deducts knockout points from every non-restricted member without a completed slot today,
+    using one anti-join UPDATE against daily_slot_tracker.
+    Returns the number of penalized members or, with `return_ids`, their user IDs
+    (selected under lock in the same transaction).
+    """
+    # Non-restricted members of the group without a completed slot today
+    inactive = """
+        gm.group_id = %s AND gm.is_restricted = 0
+        AND NOT EXISTS (
+            SELECT 1 FROM daily_slot_tracker dst
+            WHERE dst.event_id = %s AND dst.user_id = gm.user_id
+            AND dst.log_date = CURDATE() AND dst.status = 'completed'
+        )
+    """
+    select = f"SELECT gm.user_id FROM group_members gm WHERE {inactive} FOR UPDATE"
+    update = f"""
+        UPDATE group_members gm
+        SET gm.knockout_points = gm.knockout_points + %s,
+            gm.total_points = GREATEST(0, gm.total_points - %s)
+        WHERE {inactive}
+    """
+    update_params = (points_to_deduct, points_to_deduct, group_id, event_id)
 
-        # Get all non-restricted members in the group.
-        query_2 = """
-            SELECT user_id, first_name 
-            FROM group_members 
-            WHERE group_id = %s AND is_restricted = 0
-        """
-        all_members = execute_query(query_2, (group_id,), fetch=True)
-
-        inactive_members = []
-        for member in all_members:
-            if member["user_id"] not in active_user_ids:
-                inactive_members.append(member)
-
-        # Apply a penalty to each inactive member.
-        for member in inactive_members:
-            user_id = member["user_id"]
-            first_name = member.get("first_name", f"User_{user_id}")
-            deduct_knockout_points(group_id, user_id, points_to_deduct)
-            logger.info(
-                f"Penalized {first_name} ({user_id}) with {points_to_deduct} knockout points for zero activity today."
-            )
-        return inactive_members
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor(dictionary=True) as cursor:
+            user_ids = None
+            if return_ids:
+                cursor.execute(select, (group_id, event_id))
+                user_ids = [row["user_id"] for row in cursor.fetchall()]
+            cursor.execute(update, update_params)
+            penalized = cursor.rowcount
+        conn.commit()
+        logger.info(f"Penalized {penalized} members in group {group_id} with {points_to_deduct} knockout points for zero activity today.")
+        return user_ids if return_ids else penalized
     except Exception as e:
+        if conn:
+            conn.rollback()
         logger.error(f"Error in penalize_zero_activity_members: {e}", exc_info=True)
-        return []
+        return [] if return_ids else 0
+    finally:
+        if conn:
+            conn.close()
 
 
 def set_runtime_state(group_id, key, value):
@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import logging
+import time
+import config
+from bot_utils import outbound, Priority
+from services import state_file
+
+logger = logging.getLogger(__name__)
+
+# Telegram accepts at most 100 IDs per deleteMessages call and refuses to delete
+# messages older than 48 hours, so older pending deletes are dropped on load.
+MAX_BATCH = 100
+MAX_MESSAGE_AGE = 48 * 60 * 60
+
+
+class EphemeralMessageReaper:
+    """
+    Deletes short-lived bot messages (warnings, "already completed" notices, timeouts) once their TTL passes.
+
+    Every pending delete sits in one min-heap ordered by due time (wall clock, so it survives
+    a restart). A single background task sleeps until the earliest one is due, then deletes
+    everything due in that chat with bulk deleteMessages calls at CLEANUP priority.
+    Pending deletes are written to `state_path` periodically and on shutdown.
+    """
+
+    def __init__(self, state_path, save_interval=30):
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self._heap = []  # (due_at epoch seconds, chat_id, message_id)
+        self._bot = None
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.counters = {"deleted": 0, "failed": 0}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def stats(self):
+        return {"pending": len(self._heap), **self.counters}
+
+    def schedule_delete(self, chat_id, message_id, ttl):
+        """Delete `message_id` in `chat_id` after `ttl` seconds."""
+        entry = (time.time() + ttl, chat_id, message_id)
+        heapq.heappush(self._heap, entry)
+        self._dirty = True
+        if self._wakeup and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def schedule_message(self, message, ttl):
+        """Delete a sent Message after `ttl` seconds. Accepts None (a failed send) and does nothing."""
+        if message is not None:
+            self.schedule_delete(message.chat_id, message.message_id, ttl)
+
+    async def start(self, bot):
+        self._bot = bot
+        cutoff = time.time() - MAX_MESSAGE_AGE
+        for due_at, chat_id, message_id in state_file.load(self.state_path, []):
+            if due_at > cutoff:
+                heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Ephemeral message reaper started with %s pending deletes", len(self._heap))
+
+    async def stop(self):
+        """Stop the reaper and persist whatever is still pending for the next start."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        state_file.save(self.state_path, self._heap)
+        logger.info("Ephemeral message reaper stopped: %s", self.stats())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due = {}
+            while self._heap and self._heap[0][0] <= now:
+                _, chat_id, message_id = heapq.heappop(self._heap)
+                due.setdefault(chat_id, []).append(message_id)
+                self._dirty = True
+
+            for chat_id, message_ids in due.items():
+                for i in range(0, len(message_ids), MAX_BATCH):
+                    task = asyncio.create_task(self._delete(chat_id, message_ids[i:i + MAX_BATCH]))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+
+            if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+                self._dirty = False
+                self._saved_at = time.monotonic()
+                await asyncio.to_thread(state_file.save, self.state_path, list(self._heap))
+
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else self.save_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(timeout, self.save_interval))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _delete(self, chat_id, message_ids):
+        try:
+            await outbound.submit(chat_id, lambda: self._bot.delete_messages(chat_id, message_ids), Priority.CLEANUP)
+            self.counters["deleted"] += len(message_ids)
+        except Exception as e:
+            # Usually the messages are already gone; nothing worth retrying.
+            self.counters["failed"] += len(message_ids)
+            logger.warning(f"Could not delete {len(message_ids)} messages in chat {chat_id}: {e}")
+
+
+# Shared instance (started from main.post_init)
+reaper = EphemeralMessageReaper(config.EPHEMERAL_STATE_FILE)
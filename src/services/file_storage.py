@@ -1,53 +1,149 @@
 from pathlib import Path
+import asyncio
+import hashlib
 import logging
+import os
+import shutil
+import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _same_content(a, b):
+    return os.path.getsize(a) == os.path.getsize(b) and _sha256(a) == _sha256(b)
+
+
 class FileStorage:
-    """Manages file storage for groups."""
-    
-    def __init__(self, base_path: str = "storage"):
+    """
+    Manages file storage for groups. Files are stored as
+    `groups/gid_X/<type>/<date>/<slot>/<user_id>_<filename>`, so two members whose submissions
+    get the same filename never overwrite each other.
+
+    With `content_addressed`, each distinct file is stored once under `objects/<aa>/<sha256><ext>`,
+    and the group path becomes a hardlink to it (a copy where the filesystem cannot hardlink). `objects/ids/<file_unique_id><ext>` links
+    remember which Telegram files are already stored, so re-posted or forwarded media is not even
+    downloaded again. Identical bytes that arrive under a different file_unique_id are still
+    deduplicated by their hash after the download.
+    """
+
+    def __init__(self, base_path: str = "storage", content_addressed: bool = False, usage=None):
         self.base_path = Path(base_path)
         self.base_path.mkdir(exist_ok=True)
-    
+        self.content_addressed = content_addressed
+        self.usage = usage  # storage_usage.StorageUsage, told about every file saved
+        self.objects_path = self.base_path / "objects"
+        self.counters = {"downloads": 0, "id_hits": 0, "hash_hits": 0}
+        self._inflight = {}  # file_unique_id -> lock, so concurrent saves of one file download it once
+
     async def save_photo(self, group_id, user_id, username, slot_name, file, filename):
         """Save a photo from Telegram to local storage."""
         try:
             today_date = datetime.now().strftime("%Y_%m_%d")
-            
+
             photos_path = (self.base_path / "groups" / f"gid_{group_id}" / "photos" / today_date / slot_name)
             photos_path.mkdir(parents=True, exist_ok=True)
-            
-            file_path = photos_path / filename
-            
-            # Download file from Telegram
-            await file.download_to_drive(str(file_path))
-            
+
+            file_path = photos_path / f"{user_id}_{filename}"
+
+            # Download file from Telegram (or link the stored copy)
+            await self._store(file, file_path)
+
             logger.info(f"Saved photo for user {user_id} in group {group_id}: {filename}")
             return str(file_path)
-        
+
         except Exception as e:
             logger.error(f"Error saving photo: {e}",exc_info=True)
             raise
-    
+
     async def save_media(self, group_id, user_id, username, slot_name, file, filename, media_type):
         """Save any media type (video, document, voice, etc.) from Telegram to local storage."""
         try:
             today_date = datetime.now().strftime("%Y_%m_%d")
-            
+
             # Create folder based on media type
             media_path = (self.base_path / "groups" / f"gid_{group_id}" / media_type / today_date / slot_name)
             media_path.mkdir(parents=True, exist_ok=True)
-            
-            file_path = media_path / filename
-            
-            # Download file from Telegram
-            await file.download_to_drive(str(file_path))
-            
+
+            file_path = media_path / f"{user_id}_{filename}"
+
+            # Download file from Telegram (or link the stored copy)
+            await self._store(file, file_path)
+
             logger.info(f"Saved {media_type} for user {user_id} in group {group_id}: {filename}")
             return str(file_path)
-        
+
         except Exception as e:
             logger.error(f"Error saving {media_type}: {e}",exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    async def _store(self, file, file_path: Path):
+        existed = file_path.exists()
+        await self._save(file, file_path)
+        if self.usage and not existed:
+            self.usage.add_file(file_path)
+
+    async def _save(self, file, file_path: Path):
+        if not self.content_addressed:
+            await file.download_to_drive(str(file_path))
+            self.counters["downloads"] += 1
+            return
+
+        unique_id = getattr(file, "file_unique_id", None)
+        if not unique_id:
+            await self._store_object(file, file_path, None)
+            return
+
+        lock = self._inflight.setdefault(unique_id, asyncio.Lock())
+        try:
+            async with lock:
+                await self._store_object(file, file_path, self.objects_path / "ids" / f"{unique_id}{file_path.suffix}")
+        finally:
+            if not lock.locked() and self._inflight.get(unique_id) is lock:
+                del self._inflight[unique_id]
+
+    async def _store_object(self, file, file_path: Path, id_path):
+        if id_path and id_path.exists():
+            self._link(id_path, file_path)
+            self.counters["id_hits"] += 1
+            return
+
+        ext = file_path.suffix
+        tmp_path = self.objects_path / "tmp" / f"{uuid.uuid4().hex}{ext}"
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            await file.download_to_drive(str(tmp_path))
+            self.counters["downloads"] += 1
+            digest = await asyncio.to_thread(_sha256, tmp_path)
+            object_path = self.objects_path / digest[:2] / f"{digest}{ext}"
+            if object_path.exists():
+                self.counters["hash_hits"] += 1
+            else:
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, object_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        if id_path:
+            id_path.parent.mkdir(parents=True, exist_ok=True)
+            self._link(object_path, id_path)
+        self._link(object_path, file_path)
+
+    @staticmethod
+    def _link(source: Path, target: Path):
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            # Saving the same file again is fine; anything else would leave this row pointing at another file
+            if not (os.path.samefile(source, target) or _same_content(source, target)):
+                raise FileExistsError(f"{target} already exists with different contents")
+        except OSError:
+            shutil.copy2(source, target)
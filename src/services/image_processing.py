@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from PIL import Image, ImageOps
+import config
+from services.storage_usage import usage
+
+logger = logging.getLogger(__name__)
+
+_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg"), "jpg": ("JPEG", ".jpg")}
+
+
+def dhash(image, size=8):
+    """
+    64-bit difference hash: one bit per horizontally adjacent pixel pair of a (size+1) x size
+    greyscale thumbnail. Re-encoded, rescaled or lightly edited copies of a photo land within a few bits.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return bits
+
+
+def render(source, targets, quality, image_format):
+    """
+    Runs in a worker process: write one downscaled copy of `source` per (path, longest_edge) in
+    `targets` and return the photo's dhash.
+
+    Orientation from EXIF is applied to the pixels first, then all metadata except the colour
+    profile is dropped, so renditions carry no camera, GPS or timestamp data.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        icc_profile = original.info.get("icc_profile")
+    keep_alpha = image_format == "WEBP" and "A" in image.getbands()
+    image = image.convert("RGBA" if keep_alpha else "RGB")
+    image.info = {}
+
+    for path, longest_edge in targets:
+        rendition = image.copy()
+        rendition.thumbnail((longest_edge, longest_edge), Image.Resampling.LANCZOS)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        rendition.save(path, image_format, quality=quality, icc_profile=icc_profile)
+    return dhash(image)
+
+
+def hash_file(source):
+    """Runs in a worker process: the dhash of `source` as `render` computes it, without writing anything."""
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        return dhash(image.convert("RGB"))
+
+
+class ImageProcessor:
+    """
+    Makes a display-size rendition and a thumbnail of each stored photo, and its perceptual hash,
+    on a process pool.
+
+    Renditions sit next to the original, under `display/` and `thumbs/` in the same slot folder,
+    with the original's name and the configured format's extension. Encoding is CPU-bound, so it
+    runs in `workers` separate processes and the event loop only awaits the result.
+    """
+
+    def __init__(self, workers=2, display_size=1600, thumbnail_size=320, quality=80, image_format="webp"):
+        self.workers = workers
+        self.display_size = display_size
+        self.thumbnail_size = thumbnail_size
+        self.quality = quality
+        self.image_format, self.extension = _FORMATS.get(image_format, _FORMATS["webp"])
+        self._pool = None
+        self.counters = {"processed": 0, "failed": 0}
+
+    @property
+    def running(self):
+        return self._pool is not None
+
+    def stats(self):
+        return dict(self.counters)
+
+    def rendition_paths(self, local_path):
+        """(display_path, thumbnail_path) for a stored original."""
+        original = Path(local_path)
+        name = original.stem + self.extension
+        return str(original.parent / "display" / name), str(original.parent / "thumbs" / name)
+
+    def start(self):
+        if self.workers <= 0:
+            logger.info("Image renditions are disabled")
+            return
+        self._pool = self._new_pool()
+        logger.info("Image processor started with %s workers", self.workers)
+
+    def _new_pool(self):
+        # "spawn" keeps the workers from inheriting the bot's threads and sockets through fork().
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self):
+        if self._pool:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+        logger.info("Image processor stopped: %s", self.stats())
+
+    async def process(self, local_path):
+        """
+        Render `local_path` and return (display_path, thumbnail_path, dhash), or (None, None, None) when
+        renditions are disabled or the image could not be processed. Existing renditions are reused.
+        """
+        if not self.running:
+            return None, None, None
+        display_path, thumbnail_path = self.rendition_paths(local_path)
+        targets = [(path, size) for path, size in ((display_path, self.display_size), (thumbnail_path, self.thumbnail_size))
+                   if not Path(path).exists()]
+        try:
+            loop = asyncio.get_running_loop()
+            image_hash = await loop.run_in_executor(self._pool, render, local_path, targets, self.quality, self.image_format)
+            for path, _ in targets:
+                usage.add_file(path)
+        except BrokenProcessPool as e:
+            self._replace_broken_pool(local_path, e)
+            return None, None, None
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error(f"Error creating renditions for {local_path}: {e}", exc_info=True)
+            return None, None, None
+        self.counters["processed"] += 1
+        return display_path, thumbnail_path, image_hash
+
+    async def hash(self, local_path):
+        """dhash of `local_path` without making renditions, or None when the pool is off or the image is unreadable."""
+        if not self.running:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, hash_file, local_path)
+        except BrokenProcessPool as e:
+            self._replace_broken_pool(local_path, e)
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error(f"Error hashing {local_path}: {e}", exc_info=True)
+        return None
+
+    def _replace_broken_pool(self, local_path, error):
+        # A worker died (e.g. out of memory on a huge image); later photos get a fresh pool.
+        self.counters["failed"] += 1
+        logger.error(f"Image worker died while processing {local_path}, restarting the pool: {error}")
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+
+
+# Shared instance (started from main.post_init)
+image_processor = ImageProcessor(config.IMAGE_WORKERS, config.IMAGE_DISPLAY_SIZE, config.IMAGE_THUMBNAIL_SIZE,
+                                 config.IMAGE_QUALITY, config.IMAGE_FORMAT)
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """
+    Size-capped LRU disk cache of Telegram media, keyed on telegram_file_id.
+
+    Groups in "lazy" storage mode keep only the file_id of each submission. The first time the
+    media is needed (`get` / `resolve`, e.g. by the admin /submissions and /review commands, or
+    to hash a photo for re-post detection), it is downloaded from Telegram into `cache_path`;
+    later reads are served from disk. Once the cache holds more than `max_bytes`, the least
+    recently used files are deleted. The LRU order is rebuilt from file modification times on
+    start, and a hit bumps the file's mtime, so recency survives restarts.
+    """
+
+    def __init__(self, cache_path, max_bytes):
+        self.cache_path = Path(cache_path)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (path, size), least recently used first
+        self._size = 0
+        self._inflight = {}  # key -> lock, so concurrent misses on one file download it once
+        self._bot = None
+        self.counters = {"hits": 0, "misses": 0, "evicted": 0, "errors": 0}
+
+    def stats(self):
+        return {"files": len(self._entries), "bytes": self._size, **self.counters}
+
+    @staticmethod
+    def _key(telegram_file_id):
+        return hashlib.sha256(telegram_file_id.encode()).hexdigest()[:32]
+
+    def start(self, bot):
+        self._bot = bot
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.cache_path.iterdir():
+            if path.suffix == ".part":
+                path.unlink(missing_ok=True)  # interrupted download
+            elif path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path.stem] = (path, size)
+            self._size += size
+        logger.info("Media cache started with %s files (%s bytes)", len(self._entries), self._size)
+
+    async def get(self, telegram_file_id):
+        """Local path of the media for `telegram_file_id`, downloading it on first access."""
+        key = self._key(telegram_file_id)
+        entry = self._hit(key)
+        if entry:
+            return str(entry)
+
+        lock = self._inflight.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                entry = self._hit(key)
+                if entry:
+                    return str(entry)
+                self.counters["misses"] += 1
+                return str(await self._fetch(key, telegram_file_id))
+        finally:
+            if not lock.locked() and self._inflight.get(key) is lock:
+                del self._inflight[key]
+
+    async def resolve(self, activity):
+        """
+        Local path for a user_activity_log row: its stored file when it was downloaded eagerly and is
+        still on disk, otherwise the cached copy fetched by telegram_file_id. None if it has no media.
+        """
+        local_path = activity.get("local_file_path")
+        if local_path and os.path.isfile(local_path):
+            return local_path
+        if not activity.get("telegram_file_id"):
+            return None
+        return await self.get(activity["telegram_file_id"])
+
+    def _hit(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path, _ = entry
+        if not path.exists():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        os.utime(path)
+        self.counters["hits"] += 1
+        return path
+
+    async def _fetch(self, key, telegram_file_id):
+        try:
+            file = await self._bot.get_file(telegram_file_id)
+            path = self.cache_path / f"{key}{Path(file.file_path or '').suffix}"
+            part_path = path.with_name(path.name + ".part")
+            await file.download_to_drive(str(part_path))
+            os.replace(part_path, path)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Error fetching media {telegram_file_id} into the cache: {e}", exc_info=True)
+            raise
+
+        size = path.stat().st_size
+        self._entries[key] = (path, size)
+        self._size += size
+        self._evict(keep=key)
+        return path
+
+    def _drop(self, key):
+        path, size = self._entries.pop(key)
+        self._size -= size
+        path.unlink(missing_ok=True)
+
+    def _evict(self, keep):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._drop(key)
+            self.counters["evicted"] += 1
+
+
+# Shared instance (started from main.post_init)
+media_cache = MediaCache(config.MEDIA_CACHE_PATH, config.MEDIA_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import config
+from services import async_database_service as db
+from services import state_file
+from services.file_storage import FileStorage
+from services.image_processing import image_processor
+from services.media_cache import media_cache
+from services.photo_hashes import photo_index
+from services.storage_usage import usage
+
+logger = logging.getLogger(__name__)
+
+
+class MediaDownloadPipeline:
+    """
+    Downloads submitted media in the background, after the submission has been scored.
+
+    A job carries the Telegram file_id plus where the file belongs (group, user, slot, filename).
+    A fixed pool of workers takes jobs off a bounded queue. Each worker resolves the file, saves it
+    through FileStorage, has the image processor (if given) render and hash photos, and then fills in
+    the file paths on the matching user_activity_log row. Photo hashes then go to the photo index (if
+    given) to flag re-posts. A failed download is retried with exponential backoff up to
+    `max_attempts` times. Jobs still queued at shutdown are saved to `state_path` and picked up again
+    on the next start.
+
+    When the pipeline is not running, or the queue is full, `submit` downloads inline instead.
+    Submissions from groups whose `storage_mode` is "lazy" are not stored; their media is fetched
+    through the media cache (if given) when it is first needed. Lazy photos still get a job when
+    the photo index is on: the worker fetches them into the cache only to hash them, so re-posts
+    are flagged in lazy groups too. The cache's size limit bounds what that keeps on disk.
+    """
+
+    def __init__(self, storage, set_file_path, workers=3, max_queue=1000, max_attempts=4, retry_delay=2,
+                 state_path=None, image_processor=None, photo_index=None, storage_mode=None, media_cache=None):
+        self.storage = storage
+        self.set_file_path = set_file_path  # async (group_id, user_id, file_id, local_path, display_path, thumbnail_path)
+        self.image_processor = image_processor
+        self.photo_index = photo_index
+        self.storage_mode = storage_mode  # async (group_id) -> "eager" | "lazy"
+        self.media_cache = media_cache
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.state_path = state_path
+        self._bot = None
+        self._queue = None
+        self._workers = []
+        self._retries = set()
+        self._pending_retries = []  # jobs interrupted by shutdown, saved with the queue
+        self._latencies = deque(maxlen=200)  # seconds from submission to file on disk
+        self.counters = {"downloaded": 0, "retried": 0, "failed": 0, "inline": 0, "lazy": 0}
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self):
+        """Queue depth, lifetime counters and download latency (ms) over the recent downloads."""
+        latencies = sorted(self._latencies)
+        return {
+            "queued": self.queue_depth,
+            "retrying": len(self._retries),
+            **self.counters,
+            "avg_latency_ms": int(sum(latencies) / len(latencies) * 1000) if latencies else 0,
+            "p95_latency_ms": int(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000) if latencies else 0,
+            "storage": dict(self.storage.counters),
+        }
+
+    async def submit(self, bot, group_id, user_id, username, slot_name, file_id, filename, media_type="photo"):
+        """
+        Queue a download. `media_type` "photo" goes to the photos tree, anything else to its own folder.
+        `bot` is only used when the file has to be downloaded inline.
+        """
+        lazy = bool(self.storage_mode) and await self._is_lazy(group_id)
+        if lazy:
+            self.counters["lazy"] += 1
+            if not self._hashes_lazy(media_type):
+                return
+        job = {"group_id": group_id, "user_id": user_id, "username": username, "slot_name": slot_name, "file_id": file_id,
+               "filename": filename, "media_type": media_type, "submitted_at": time.time(), "attempt": 0, "lazy": lazy}
+        if self.running:
+            try:
+                self._queue.put_nowait(job)
+                return
+            except asyncio.QueueFull:
+                logger.warning(f"Media queue full ({self.max_queue}), downloading {file_id} inline")
+        self.counters["inline"] += 1
+        await self._download(job, bot)
+
+    def _hashes_lazy(self, media_type):
+        return (media_type == "photo" and self.media_cache is not None and self.image_processor is not None
+                and self.photo_index is not None and self.photo_index.enabled)
+
+    async def _is_lazy(self, group_id):
+        try:
+            return await self.storage_mode(group_id) == "lazy"
+        except Exception as e:
+            logger.error(f"Error reading storage mode of group {group_id}, downloading eagerly: {e}", exc_info=True)
+            return False
+
+    async def start(self, bot):
+        self._bot = bot
+        saved = state_file.load(self.state_path, []) if self.state_path else []
+        # The saved backlog can be longer than max_queue (retries are persisted too), so make room for all of it
+        self._queue = asyncio.Queue(maxsize=max(self.max_queue, len(saved)))
+        for job in saved:
+            self._queue.put_nowait(job)
+        if self.state_path:
+            state_file.save(self.state_path, [])
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Media pipeline started with %s workers and %s queued downloads", self.workers, self.queue_depth)
+
+    async def stop(self):
+        """Stop the workers and persist every download that has not finished."""
+        for task in self._workers + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers = []
+        pending = []
+        while self._queue and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        pending.extend(self._pending_retries)
+        if self.state_path:
+            state_file.save(self.state_path, pending)
+        logger.info("Media pipeline stopped with %s downloads pending: %s", len(pending), self.stats())
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._download(job, self._bot)
+            finally:
+                self._queue.task_done()
+
+    async def _download(self, job, bot):
+        job["attempt"] += 1
+        try:
+            if job.get("lazy"):
+                await self._hash_lazy(job)
+                return
+            file = await bot.get_file(job["file_id"])
+            if job["media_type"] == "photo":
+                local_path = await self.storage.save_photo(job["group_id"], job["user_id"], job["username"],
+                                                           job["slot_name"], file, job["filename"])
+            else:
+                local_path = await self.storage.save_media(job["group_id"], job["user_id"], job["username"],
+                                                           job["slot_name"], file, job["filename"], job["media_type"])
+            display_path = thumbnail_path = image_hash = None
+            if job["media_type"] == "photo" and self.image_processor:
+                display_path, thumbnail_path, image_hash = await self.image_processor.process(local_path)
+            await self.set_file_path(job["group_id"], job["user_id"], job["file_id"], local_path, display_path, thumbnail_path)
+            if image_hash is not None and self.photo_index:
+                await self.photo_index.check(job["group_id"], job["user_id"], job["file_id"], image_hash)
+        except asyncio.CancelledError:
+            job["attempt"] -= 1
+            self._pending_retries.append(job)
+            raise
+        except Exception as e:
+            if job["attempt"] >= self.max_attempts or not self.running:
+                self.counters["failed"] += 1
+                logger.error(f"Giving up on media {job['file_id']} for user {job['user_id']} after {job['attempt']} attempts: {e}",
+                             exc_info=True)
+                return
+            self.counters["retried"] += 1
+            delay = self.retry_delay * 2 ** (job["attempt"] - 1)
+            logger.warning(f"Download of {job['file_id']} failed (attempt {job['attempt']}), retrying in {delay}s: {e}")
+            task = asyncio.create_task(self._retry_later(job, delay))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+            return
+
+        self.counters["downloaded"] += 1
+        self._latencies.append(time.time() - job["submitted_at"])
+
+    async def _hash_lazy(self, job):
+        """Re-post check for a lazy group's photo: fetch it into the media cache and hash that copy."""
+        image_hash = await self.image_processor.hash(await self.media_cache.get(job["file_id"]))
+        if image_hash is not None:
+            await self.photo_index.check(job["group_id"], job["user_id"], job["file_id"], image_hash)
+
+    async def _retry_later(self, job, delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self._pending_retries.append(job)
+            raise
+        await self._queue.put(job)
+
+
+# Shared instance (started from main.post_init)
+media_pipeline = MediaDownloadPipeline(FileStorage(config.STORAGE_PATH, config.CONTENT_ADDRESSED_STORAGE, usage), db.set_activity_file_path,
+                                       workers=config.MEDIA_DOWNLOAD_WORKERS, max_queue=config.MEDIA_QUEUE_SIZE,
+                                       max_attempts=config.MEDIA_DOWNLOAD_ATTEMPTS, state_path=config.MEDIA_STATE_FILE or None,
+                                       image_processor=image_processor, photo_index=photo_index,
+                                       storage_mode=db.get_storage_mode, media_cache=media_cache)
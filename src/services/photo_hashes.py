@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+import config
+from services import async_database_service as db
+
+logger = logging.getLogger(__name__)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Each node keeps its children keyed by their distance to it, so a search for everything within
+    `max_distance` of a hash only descends into children whose key lies within `max_distance` of
+    the query's distance to the node (triangle inequality), instead of comparing every hash.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child node}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """[(distance, item)] for every item whose hash is within `max_distance` of `value`."""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class PhotoHashIndex:
+    """
+    Flags photos that look like a re-post of a recent submission in the same group.
+
+    Each group's dhashes from the last `window_days` are loaded from photo_hashes into a BK-tree
+    the first time the group is checked, and the tree is rebuilt from the table once a day so old
+    hashes fall out of it. Each group has its own lock around loading and updating its tree, so a
+    slow load only delays photos from that group. A new photo within `max_distance` bits of an
+    earlier one marks its user_activity_log row as a suspected duplicate of the closest match;
+    every checked photo is then added to the tree and the table.
+    """
+
+    def __init__(self, max_distance=6, window_days=30, rebuild_interval=24 * 60 * 60):
+        self.max_distance = max_distance
+        self.window_days = window_days
+        self.rebuild_interval = rebuild_interval
+        self._trees = {}  # group_id -> (built_at monotonic, BKTree)
+        self._locks = {}  # group_id -> lock, so loading one group's hashes never holds up another group
+        self.counters = {"checked": 0, "flagged": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.window_days > 0
+
+    def stats(self):
+        return {"groups": len(self._trees), "hashes": sum(tree.size for _, tree in self._trees.values()), **self.counters}
+
+    async def _tree(self, group_id):
+        built_at, tree = self._trees.get(group_id, (None, None))
+        if tree is None or time.monotonic() - built_at >= self.rebuild_interval:
+            tree = BKTree()
+            for row in await db.get_recent_photo_hashes(group_id, self.window_days):
+                tree.add(row["dhash"], (row["user_id"], row["telegram_file_id"], row["created_at"]))
+            self._trees[group_id] = (time.monotonic(), tree)
+        return tree
+
+    async def check(self, group_id, user_id, telegram_file_id, image_hash):
+        """Record `image_hash` for a stored photo; returns the file_id it duplicates, or None."""
+        if not self.enabled or image_hash is None:
+            return None
+        try:
+            async with self._locks.setdefault(group_id, asyncio.Lock()):
+                tree = await self._tree(group_id)
+                cutoff = time.time() - self.window_days * 24 * 60 * 60
+                matches = [(distance, item) for distance, item in tree.search(image_hash, self.max_distance)
+                           if item[2] >= cutoff]
+                tree.add(image_hash, (user_id, telegram_file_id, time.time()))
+            self.counters["checked"] += 1
+            await db.add_photo_hash(group_id, user_id, telegram_file_id, image_hash)
+            if not matches:
+                return None
+
+            distance, (original_user_id, original_file_id, _) = min(matches, key=lambda match: match[0])
+            self.counters["flagged"] += 1
+            logger.info(f"Photo {telegram_file_id} from user {user_id} in group {group_id} is {distance} bits from "
+                        f"{original_file_id} (user {original_user_id}), flagging as a suspected duplicate")
+            await db.flag_suspected_duplicate(group_id, user_id, telegram_file_id, original_file_id)
+            return original_file_id
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Error checking photo {telegram_file_id} for duplicates: {e}", exc_info=True)
+            return None
+
+
+# Shared instance (used by the media pipeline)
+photo_index = PhotoHashIndex(config.PHOTO_DUPLICATE_DISTANCE, config.PHOTO_DUPLICATE_WINDOW_DAYS)
@@ -0,0 +1,52 @@
+import re
+import time as _time
+
+
+class KeywordMatcher:
+    """
+    Compiled keyword set for one slot.
+
+    Keywords are lowercased and deduplicated once, and a text matches when any keyword
+    occurs in it as a substring (the same rule as `keyword.lower() in text.lower()`),
+    checked with a single scan of the text.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({keyword.lower() for keyword in keywords if keyword}, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(keyword) for keyword in self.keywords)) if self.keywords else None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def matches(self, text):
+        """Return True if any keyword occurs in `text`."""
+        if not self._pattern or not text:
+            return False
+        return self._pattern.search(text.lower()) is not None
+
+
+# Per-slot cache: slot_id -> (KeywordMatcher, built_at monotonic seconds)
+_matchers = {}
+
+
+def get_cached(slot_id, max_age):
+    """Return the cached matcher for a slot if it is younger than `max_age` seconds."""
+    entry = _matchers.get(slot_id)
+    if entry and _time.monotonic() - entry[1] < max_age:
+        return entry[0]
+    return None
+
+
+def store(slot_id, keywords):
+    """Compile and cache the matcher for a slot from its `slot_keywords` rows."""
+    matcher = KeywordMatcher(keywords)
+    _matchers[slot_id] = (matcher, _time.monotonic())
+    return matcher
+
+
+def invalidate(slot_id=None):
+    """Drop the cached matcher for one slot, or for every slot."""
+    if slot_id is None:
+        _matchers.clear()
+    else:
+        _matchers.pop(slot_id, None)
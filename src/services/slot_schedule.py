@@ -0,0 +1,117 @@
+import bisect
+import logging
+import time as _time
+from datetime import datetime, time, timedelta
+from pytz import timezone
+
+logger = logging.getLogger(__name__)
+ist = timezone("Asia/Kolkata")
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _to_seconds(value):
+    """Convert a TIME column (timedelta, time or 'HH:MM:SS' string) into seconds since midnight."""
+    if hasattr(value, "total_seconds"):
+        return int(value.total_seconds()) % DAY_SECONDS
+    if isinstance(value, time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    hours, minutes, seconds = (int(part) for part in str(value).split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class SlotSchedule:
+    """
+    Immutable index over one group's slots.
+
+    The day is cut into sorted, non-overlapping segments at every slot boundary and each
+    segment remembers which slot (if any) covers it. Lookups are a single bisect.
+    Slots keep the SQL semantics of `CURTIME() BETWEEN start_time AND end_time`: both
+    ends are inclusive, and a slot whose start is after its end wraps past midnight.
+    When slots overlap, the one that starts first wins.
+    """
+
+    def __init__(self, slots):
+        self.slots = list(slots)
+
+        intervals = []  # (start_second, end_second_exclusive, slot)
+        for slot in sorted(self.slots, key=lambda s: _to_seconds(s["start_time"])):
+            start = _to_seconds(slot["start_time"])
+            end = _to_seconds(slot["end_time"]) + 1
+            if start < end:
+                intervals.append((start, end, slot))
+            else:
+                intervals.append((start, DAY_SECONDS, slot))
+                intervals.append((0, end, slot))
+
+        bounds = {0}
+        for start, end, _ in intervals:
+            bounds.add(start)
+            bounds.add(end % DAY_SECONDS)
+
+        # Resolve the covering slot per segment, then merge neighbours covered by the same slot
+        # so every remaining boundary (except possibly midnight) is a real slot change.
+        self._segments = []
+        merged_bounds = []
+        for boundary in sorted(bounds):
+            covering = next((slot for start, end, slot in intervals if start <= boundary < end), None)
+            if merged_bounds and self._segments[-1] is covering:
+                continue
+            merged_bounds.append(boundary)
+            self._segments.append(covering)
+        self._bounds = merged_bounds
+
+    @staticmethod
+    def _seconds_of(now):
+        return now.hour * 3600 + now.minute * 60 + now.second
+
+    def active_slot(self, now=None):
+        """Return the slot covering `now` (IST), or None."""
+        now = now or datetime.now(ist)
+        index = bisect.bisect_right(self._bounds, self._seconds_of(now)) - 1
+        return self._segments[index]
+
+    def next_boundary(self, now=None):
+        """
+        Return the IST datetime of the next instant at which the active slot changes,
+        or None if the group has no slots.
+        """
+        if not self.slots:
+            return None
+        now = now or datetime.now(ist)
+        index = bisect.bisect_right(self._bounds, self._seconds_of(now))
+        if index == len(self._bounds):
+            # Wrap to tomorrow. Midnight is only a boundary if the slot changes there.
+            index = 0 if self._segments[0] is not self._segments[-1] or len(self._bounds) == 1 else 1
+            boundary = self._bounds[index] + DAY_SECONDS
+        else:
+            boundary = self._bounds[index]
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight + timedelta(seconds=boundary)
+
+
+# Per-group cache: group_id -> (SlotSchedule, loaded_at monotonic seconds)
+_schedules = {}
+
+
+def get_cached(group_id, max_age):
+    """Return the cached schedule for a group if it is younger than `max_age` seconds."""
+    entry = _schedules.get(group_id)
+    if entry and _time.monotonic() - entry[1] < max_age:
+        return entry[0]
+    return None
+
+
+def store(group_id, slots):
+    """Build and cache the schedule for a group from its `group_slots` rows."""
+    schedule = SlotSchedule(slots)
+    _schedules[group_id] = (schedule, _time.monotonic())
+    return schedule
+
+
+def invalidate(group_id=None):
+    """Drop the cached schedule for one group, or for every group."""
+    if group_id is None:
+        _schedules.clear()
+    else:
+        _schedules.pop(group_id, None)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import shutil
+import tarfile
+import time
+from datetime import date
+from pathlib import Path
+import config
+from services import async_database_service as db
+from services.image_processing import image_processor
+from services.storage_usage import usage, day_of, tree_totals, ARCHIVE_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Stored paths of archived files are "<day archive>#<path inside the archive>".
+ARCHIVE_SEPARATOR = "#"
+PHOTO_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _archive_day(day_dir, archive_path):
+    """Pack `day_dir` into `archive_path` one file at a time (tarfile streams each file in chunks)."""
+    tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        for root, dirs, files in os.walk(day_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = Path(root) / name
+                tar.add(path, arcname=str(path.relative_to(day_dir)), recursive=False)
+    os.replace(tmp_path, archive_path)
+
+
+def _remove(path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def compact_objects(objects_path, tmp_max_age=24 * 60 * 60):
+    """
+    Deletes content-addressed objects that no group folder links to any more, together with their
+    objects/ids links, and download leftovers in objects/tmp. Returns (files removed, bytes freed).
+
+    An object is still in use while its link count is higher than the number of ids/ links that
+    point at it. Where FileStorage had to copy instead of hardlink, group files are independent
+    copies, so removing the object only costs future deduplication.
+    """
+    objects_path = Path(objects_path)
+    if not objects_path.is_dir():
+        return 0, 0
+    removed = freed = 0
+    id_links = {}  # inode -> [ids/ paths]
+    ids_path = objects_path / "ids"
+    if ids_path.is_dir():
+        with os.scandir(ids_path) as entries:
+            for entry in entries:
+                id_links.setdefault(entry.stat().st_ino, []).append(Path(entry.path))
+
+    with os.scandir(objects_path) as shards:
+        for shard in shards:
+            if shard.name in ("ids", "tmp") or not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    links = id_links.pop(stat.st_ino, [])
+                    if stat.st_nlink - len(links) > 1:
+                        continue
+                    for path in [Path(entry.path), *links]:
+                        path.unlink(missing_ok=True)
+                        removed += 1
+                    freed += stat.st_size
+
+    # ids/ links left whose object is gone (or that were copies) are referenced by nothing else
+    for links in id_links.values():
+        for path in links:
+            if path.stat().st_nlink == 1:
+                path.unlink(missing_ok=True)
+                removed += 1
+
+    tmp_path = objects_path / "tmp"
+    if tmp_path.is_dir():
+        cutoff = time.time() - tmp_max_age
+        for path in tmp_path.iterdir():
+            stat = path.stat()
+            if stat.st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+                freed += stat.st_size
+    return removed, freed
+
+
+class StorageRetention:
+    """
+    Ages media out of `storage/groups/gid_X/<media_type>/<YYYY_MM_DD>/` according to each group's policy.
+
+    A day folder moves through up to three stages by age:
+      - re-encode (photos/ only): each photo is replaced by its display rendition (downscaled WebP/JPEG without EXIF,
+        made by the image processor if it is missing) and local_file_path is pointed at it;
+      - archive: the folder is packed into `<YYYY_MM_DD>.tar.gz` next to it and stored paths become
+        `<archive>#<path inside the archive>`;
+      - delete: the folder or archive is removed and its stored paths are cleared.
+    The database is always updated before files are removed, so a run interrupted halfway leaves
+    paths pointing at files that still exist, and the next run finishes the job. Files are walked and
+    archived one at a time, so memory use does not grow with the size of a day.
+    """
+
+    def __init__(self, storage_path, reencode_after_days, archive_after_days, delete_after_days):
+        self.base_path = Path(storage_path)
+        self.defaults = {"reencode_after_days": reencode_after_days, "archive_after_days": archive_after_days,
+                         "delete_after_days": delete_after_days}
+
+    def _policy(self, group):
+        return {key: default if group.get(key) is None else group[key] for key, default in self.defaults.items()}
+
+    async def apply(self, group, today=None):
+        """Run the retention stages for one group (a row from db.get_storage_policies); returns counters."""
+        group_id = group["group_id"]
+        policy = self._policy(group)
+        today = today or date.today()
+        counters = {"reencoded": 0, "archived": 0, "deleted": 0, "bytes_freed": 0}
+        group_path = self.base_path / "groups" / f"gid_{group_id}"
+        if not group_path.is_dir():
+            return counters
+
+        for media_path in sorted(path for path in group_path.iterdir() if path.is_dir()):
+            for entry in sorted(media_path.iterdir()):
+                day = day_of(entry.name)
+                if day is None:
+                    continue
+                age = (today - day).days
+                archived = entry.name.endswith(ARCHIVE_SUFFIX)
+
+                if policy["delete_after_days"] and age >= policy["delete_after_days"]:
+                    await self._delete(group_id, entry, archived, counters)
+                    continue
+                if archived or not entry.is_dir():
+                    continue
+                if policy["reencode_after_days"] and age >= policy["reencode_after_days"] and media_path.name == "photos":
+                    await self._reencode(group_id, entry, counters)
+                if policy["archive_after_days"] and age >= policy["archive_after_days"]:
+                    await self._archive(group_id, entry, counters)
+        return counters
+
+    async def _reencode(self, group_id, day_dir, counters):
+        if not image_processor.running:
+            return
+        photos = await asyncio.to_thread(lambda: [path for slot in day_dir.iterdir() if slot.is_dir()
+                                                  for path in slot.iterdir()
+                                                  if path.is_file() and path.suffix.lower() in PHOTO_SUFFIXES])
+        for photo in photos:
+            display_path, _, _ = await image_processor.process(str(photo))
+            if not display_path:
+                continue
+            stat = photo.stat()
+            await db.replace_activity_file_path(group_id, str(photo), display_path)
+            photo.unlink(missing_ok=True)
+            usage.remove_file(photo, stat.st_size)
+            counters["reencoded"] += 1
+            if stat.st_nlink == 1:  # otherwise the bytes go once compaction drops the unused object
+                counters["bytes_freed"] += max(stat.st_size - Path(display_path).stat().st_size, 0)
+
+    async def _archive(self, group_id, day_dir, counters):
+        archive_path = day_dir.with_name(day_dir.name + ARCHIVE_SUFFIX)
+        files, size = await asyncio.to_thread(tree_totals, day_dir)
+        if not archive_path.exists():
+            await asyncio.to_thread(_archive_day, day_dir, archive_path)
+            usage.add_file(archive_path)
+        await db.rewrite_activity_path_prefix(group_id, str(day_dir) + os.sep, str(archive_path) + ARCHIVE_SEPARATOR)
+        await asyncio.to_thread(_remove, day_dir)
+        usage.record(group_id, day_dir.parent.name, day_of(day_dir.name), -files, -size)
+        counters["archived"] += 1
+        counters["bytes_freed"] += max(size - archive_path.stat().st_size, 0)
+
+    async def _delete(self, group_id, entry, archived, counters):
+        prefix = str(entry) + (ARCHIVE_SEPARATOR if archived else os.sep)
+        files, size = await asyncio.to_thread(tree_totals, entry)
+        await db.rewrite_activity_path_prefix(group_id, prefix, None)
+        await asyncio.to_thread(_remove, entry)
+        usage.record(group_id, entry.parent.name, day_of(entry.name), -files, -size)
+        counters["deleted"] += 1
+        counters["bytes_freed"] += size
+
+    async def compact(self):
+        """Remove content-addressed objects no longer linked from any group folder; returns (files, bytes)."""
+        return await asyncio.to_thread(compact_objects, self.base_path / "objects")
+
+
+# Shared instance (run daily by handlers.jobs.apply_storage_retention)
+retention = StorageRetention(config.STORAGE_PATH, config.MEDIA_REENCODE_AFTER_DAYS, config.MEDIA_ARCHIVE_AFTER_DAYS,
+                             config.MEDIA_DELETE_AFTER_DAYS)
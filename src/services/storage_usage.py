@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, date
+from pathlib import Path
+import config
+from services import async_database_service as db
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".tar.gz"
+
+
+def day_of(name):
+    """The date of a `%Y_%m_%d` day folder or `%Y_%m_%d.tar.gz` day archive, or None for anything else."""
+    try:
+        return datetime.strptime(name.removesuffix(ARCHIVE_SUFFIX), "%Y_%m_%d").date()
+    except ValueError:
+        return None
+
+
+def tree_totals(path):
+    """(files, bytes) under a day folder, or (1, size) for a single file such as a day archive."""
+    path = Path(path)
+    if path.is_file():
+        return 1, path.stat().st_size
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.stat(os.path.join(root, name)).st_size
+    return files, size
+
+
+def scan_group(group_path, before):
+    """[(media_type, day, files, bytes)] for every day folder or archive of a group dated before `before`."""
+    rows = []
+    group_path = Path(group_path)
+    if not group_path.is_dir():
+        return rows
+    for media_path in group_path.iterdir():
+        if not media_path.is_dir():
+            continue
+        totals = {}
+        for entry in media_path.iterdir():
+            day = day_of(entry.name)
+            if day is None or day >= before:
+                continue
+            files, size = tree_totals(entry)
+            previous = totals.get(day, (0, 0))
+            totals[day] = (previous[0] + files, previous[1] + size)
+        rows.extend((media_path.name, day, files, size) for day, (files, size) in totals.items())
+    return rows
+
+
+class StorageUsage:
+    """
+    Per-group disk usage by media type and day, kept in the storage_usage table without walking the tree.
+
+    Every file written under `groups/gid_X/<media_type>/<day>/` (originals by FileStorage, renditions
+    by the image processor) and every file the retention job removes or packs is recorded here as a
+    (files, bytes) delta. Deltas are summed in memory and added to storage_usage every
+    `flush_interval` seconds. Sizes are the files' own sizes, so media deduplicated through the
+    object store still counts fully for each group that holds it. `reconcile` rescans one group's
+    past days and overwrites their rows, repairing any drift (lost deltas on a crash, manual edits).
+    """
+
+    def __init__(self, storage_path, flush_interval=30):
+        self.groups_path = Path(storage_path) / "groups"
+        self.flush_interval = flush_interval
+        self._deltas = {}  # (group_id, media_type, day) -> [files, bytes]
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.counters = {"flushes": 0, "rows_flushed": 0, "errors": 0, "reconciled": 0}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def stats(self):
+        return {"pending": len(self._deltas), **self.counters}
+
+    def record(self, group_id, media_type, day, files, size):
+        delta = self._deltas.setdefault((group_id, media_type, day), [0, 0])
+        delta[0] += files
+        delta[1] += size
+
+    def _key(self, path):
+        try:
+            group_dir, media_type, day_name = Path(path).relative_to(self.groups_path).parts[:3]
+        except ValueError:
+            return None
+        day = day_of(day_name)
+        if not group_dir.startswith("gid_") or day is None:
+            return None
+        return int(group_dir[len("gid_"):]), media_type, day
+
+    def add_file(self, path, size=None):
+        """Record a file written under the groups tree (its size is read from disk unless given)."""
+        key = self._key(path)
+        if key:
+            self.record(*key, 1, os.stat(path).st_size if size is None else size)
+
+    def remove_file(self, path, size):
+        """Record a file about to be, or just, removed from the groups tree."""
+        key = self._key(path)
+        if key:
+            self.record(*key, -1, -size)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info("Storage usage tracking started (flush every %s s)", self.flush_interval)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info("Storage usage tracking stopped: %s", self.stats())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Add all pending deltas to storage_usage now."""
+        async with self._flush_lock:
+            deltas, self._deltas = self._deltas, {}
+            rows = [(group_id, media_type, day, files, size)
+                    for (group_id, media_type, day), (files, size) in deltas.items() if files or size]
+            if not rows:
+                return
+            try:
+                await db.add_storage_usage_bulk(rows)
+                self.counters["flushes"] += 1
+                self.counters["rows_flushed"] += len(rows)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Storage usage flush of {len(rows)} rows failed: {e}", exc_info=True)
+                for group_id, media_type, day, files, size in rows:
+                    self.record(group_id, media_type, day, files, size)
+
+    async def reconcile(self, group_id, today=None):
+        """
+        Rescan a group's folders and overwrite its storage_usage rows for every day before `today`.
+        Today's folder is still being written to, so its row stays incremental.
+        """
+        today = today or date.today()
+        await self.flush()
+        rows = await asyncio.to_thread(scan_group, self.groups_path / f"gid_{group_id}", today)
+        await db.replace_storage_usage(group_id, rows, today)
+        self.counters["reconciled"] += 1
+        return rows
+
+
+# Shared instance (started from main.post_init)
+usage = StorageUsage(config.STORAGE_PATH, config.STORAGE_USAGE_FLUSH_SECONDS)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightUpdateQueue(asyncio.Queue):
+    """
+    Application.update_queue that lets at most `max_in_flight` updates out at a time.
+
+    With concurrent updates, PTB's update fetcher takes every queued update straight away and starts
+    one task per update, so a plain bounded queue never fills and each burst becomes a pile of
+    pending tasks. Here `get` first waits for a free in-flight slot, and the slot is given back by
+    the `task_done` PTB calls once the update has been handled. While all slots are busy, updates stay
+    in the queue; once `maxsize` are waiting, `put` blocks, the webhook request is not answered, and
+    Telegram backs off.
+    """
+
+    def __init__(self, maxsize, max_in_flight):
+        super().__init__(maxsize)
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def get(self):
+        await self._slots.acquire()
+        try:
+            item = await super().get()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_flight += 1
+        return item
+
+    def task_done(self):
+        super().task_done()
+        # PTB also calls task_done for updates it drops with get_nowait at shutdown; those hold no slot.
+        if self._in_flight:
+            self._in_flight -= 1
+            self._slots.release()
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates concurrently (up to `max_concurrent_updates`) while keeping the updates of one
+    member in one chat strictly in arrival order.
+
+    Each (chat_id, user_id) key has a FIFO lock that an update holds while it is handled, so a member's
+    second photo waits for the first one's duplicate/restriction checks. Updates of other members and
+    other groups run in parallel. The key lock is taken before a concurrency slot, so a member flooding
+    the bot queues behind their own lock without occupying the slots everyone else needs. How many
+    updates may be waiting here at all is bounded by the InFlightUpdateQueue they come from.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # key -> [asyncio.Lock, number of updates holding or waiting for it]
+
+    @staticmethod
+    def update_key(update):
+        """The ordering key of an update, or None for updates without a chat or user."""
+        if not isinstance(update, Update):
+            return None
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def process_update(self, update, coroutine):
+        key = self.update_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._locks:
+            logger.info(f"Update processor shutting down with {len(self._locks)} members still queued")
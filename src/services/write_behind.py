@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Buffers high-frequency, low-value writes and flushes them in bulk.
+
+    - last-active touches are coalesced per (group_id, user_id); only the newest survives
+    - activity-log rows are appended and written with one multi-row INSERT
+
+    A background task flushes every `flush_interval_ms`, or earlier once `max_rows`
+    activity rows are pending. Each write keeps the time it was queued, so a flush
+    stores when the activity happened rather than when it was written.
+    """
+
+    def __init__(self, run_sync, touch_members, log_activities, flush_interval_ms=1000, max_rows=200, max_pending=10000):
+        self._run_sync = run_sync
+        self._touch_members = touch_members
+        self._log_activities = log_activities
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+
+        self._touches = {}
+        self._rows = []
+        self._wakeup = None
+        self._stopping = None
+        self._task = None
+        self._flush_lock = None
+        self.counters = {"flushes": 0, "touches_flushed": 0, "rows_flushed": 0, "errors": 0, "dropped": 0}
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self):
+        return len(self._touches) + len(self._rows)
+
+    def stats(self):
+        """Current queue depth and lifetime counters."""
+        return {"pending_touches": len(self._touches), "pending_rows": len(self._rows), **self.counters}
+
+    def touch_member(self, group_id, user_id):
+        self._touches[(group_id, user_id)] = time.monotonic()
+
+    def log_activity(self, row):
+        self._rows.append((row, time.monotonic()))
+        if len(self._rows) >= self.max_rows:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Write-behind queue started (flush every %s ms or %s rows)", int(self.flush_interval * 1000), self.max_rows)
+
+    async def stop(self):
+        """Stop the background task and write out everything still queued."""
+        if self._task:
+            # Let the loop finish a flush it is in the middle of; cancelling it there would lose the swapped-out batch
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Write-behind queue stopped: %s", self.stats())
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}", exc_info=True)
+
+    async def flush(self):
+        """Write all queued touches and activity rows now."""
+        if not self._touches and not self._rows:
+            return
+        async with self._flush_lock:
+            touches, self._touches = self._touches, {}
+            rows, self._rows = self._rows, []
+            now = time.monotonic()
+
+            if touches:
+                try:
+                    await self._run_sync(self._touch_members,
+                                         [(group_id, user_id, int(now - queued_at)) for (group_id, user_id), queued_at in touches.items()])
+                    self.counters["touches_flushed"] += len(touches)
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    logger.error(f"Write-behind flush of {len(touches)} member touches failed: {e}", exc_info=True)
+                    # Keep the newer touch if the member was touched again meanwhile
+                    for key, queued_at in touches.items():
+                        self._touches.setdefault(key, queued_at)
+
+            if rows:
+                try:
+                    await self._run_sync(self._log_activities, [(row, int(now - queued_at)) for row, queued_at in rows])
+                    self.counters["rows_flushed"] += len(rows)
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    logger.error(f"Write-behind flush of {len(rows)} activity rows failed: {e}", exc_info=True)
+                    self._rows = rows + self._rows
+
+            if len(self._rows) > self.max_pending:
+                dropped = len(self._rows) - self.max_pending
+                self._rows = self._rows[dropped:]
+                self.counters["dropped"] += dropped
+                logger.warning(f"Write-behind queue over capacity, dropped {dropped} oldest activity rows")
+
+            self.counters["flushes"] += 1
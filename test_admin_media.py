@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Tests that the admin media commands read photos through the media cache"""
+
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+# handlers/__init__ re-exports a CommandHandler named start_handler, so load the module itself
+start_handler = importlib.import_module("handlers.start_handler")
+from services.media_cache import MediaCache
+
+
+class FakeFile:
+    file_path = "photos/file_0.jpg"
+
+    async def download_to_drive(self, path):
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+
+
+class FakeBot:
+    def __init__(self):
+        self.fetched, self.sent = [], []
+
+    async def get_chat_member(self, chat_id, user_id):
+        return SimpleNamespace(status="administrator")
+
+    async def get_file(self, file_id):
+        self.fetched.append(file_id)
+        return FakeFile()
+
+    async def send_media_group(self, chat_id, media):
+        self.sent.append([item.caption for item in media])
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        self.sent.append([caption])
+
+
+def run_command(command, monkeypatch, directory, queries):
+    bot = FakeBot()
+    cache = MediaCache(os.path.join(directory, "cache"), max_bytes=1000)
+    cache.start(bot)
+    monkeypatch.setattr(start_handler, "media_cache", cache)
+    for name, rows in queries.items():
+        async def query(group_id, limit=None, rows=rows):
+            return rows
+        monkeypatch.setattr(start_handler.db, name, query)
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=-1, type="supergroup"), effective_user=SimpleNamespace(id=5))
+    asyncio.run(command(update, SimpleNamespace(bot=bot)))
+    return bot
+
+
+def row(file_id, local_file_path=None, **extra):
+    return {"user_id": 1, "username": "", "first_name": "Asha", "slot_name": "Walk", "telegram_file_id": file_id,
+            "local_file_path": local_file_path, "activity_timestamp": datetime(2024, 1, 1, 7, 30), **extra}
+
+
+def test_submissions_fetch_lazy_media_by_file_id(monkeypatch):
+    with tempfile.TemporaryDirectory() as directory:
+        stored = os.path.join(directory, "stored.jpg")
+        open(stored, "wb").close()
+        bot = run_command(start_handler.recent_submissions, monkeypatch, directory,
+                          {"get_recent_submissions": [row("lazy-photo"), row("eager-photo", stored)]})
+    assert bot.fetched == ["lazy-photo"]
+    assert bot.sent == [["Asha - Walk - 01 Jan 07:30 AM"] * 2]
+
+
+def test_review_uses_the_original_rows_stored_file(monkeypatch):
+    with tempfile.TemporaryDirectory() as directory:
+        original = os.path.join(directory, "original.jpg")
+        open(original, "wb").close()
+        flagged = row("repost", duplicate_of_file_id="first", original_file_path=original)
+        bot = run_command(start_handler.review_duplicates, monkeypatch, directory, {"get_suspected_duplicates": [flagged]})
+    assert bot.fetched == ["repost"]
+    assert bot.sent == [["🔁 Asha - Walk - 01 Jan 07:30 AM", "Earlier photo"]]
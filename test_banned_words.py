@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Tests for the per-group compiled banned-word matcher"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services import banned_words
+from services.banned_words import BannedWordMatcher
+
+
+def test_single_words_match_on_word_boundaries():
+    matcher = BannedWordMatcher(["spam", "scam"])
+    assert matcher.find("this is spam") == "spam"
+    assert matcher.find("Spam, again!") == "spam"
+    assert matcher.find("spammer") is None
+    assert matcher.find("antiscam") is None
+
+
+def test_phrases_match_as_substrings():
+    matcher = BannedWordMatcher(["buy now"])
+    assert matcher.find("please BUY NOWish") == "buy now"
+    assert matcher.find("buy it now") is None
+
+
+def test_entries_are_escaped():
+    matcher = BannedWordMatcher(["a.b", "x|y"])
+    assert matcher.find("a.b") == "a.b"
+    assert matcher.find("axb") is None
+    assert matcher.find("x") is None
+    assert matcher.find("x|y") == "x|y"
+
+
+def test_reports_stored_spelling_and_longest_entry():
+    matcher = BannedWordMatcher(["Damn", "damn", "damnit", ""])
+    assert len(matcher) == 2
+    assert matcher.find("DAMN") == "Damn"
+    assert matcher.find("damnit all") == "damnit"
+
+
+def test_empty_list_and_text():
+    assert BannedWordMatcher([]).find("anything") is None
+    assert BannedWordMatcher(["spam"]).find("") is None
+    assert BannedWordMatcher(["spam"]).find(None) is None
+
+
+def test_cache():
+    banned_words.invalidate()
+    matcher = banned_words.store(-1, ["spam"])
+    assert banned_words.get_cached(-1, 60) is matcher
+    assert banned_words.get_cached(-1, 0) is None  # older than max_age
+    banned_words.invalidate(-1)
+    assert banned_words.get_cached(-1, 60) is None
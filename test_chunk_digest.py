@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Tests for splitting digest notices into Telegram-sized messages"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from bot_utils import chunk_digest
+
+
+def test_fits_in_one_message():
+    assert chunk_digest("Header", ["a", "b"], "Footer") == ["Header\na\nb\n\nFooter"]
+    assert chunk_digest("Header", []) == ["Header"]
+
+
+def test_lines_are_never_split():
+    lines = [f"line {i:02}" for i in range(10)]  # 7 characters each
+    chunks = chunk_digest("H", lines, limit=20)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert chunks[0] == "H\nline 00\nline 01"
+    assert "\n".join(chunks).split("\n")[1:] == lines
+
+
+def test_footer_moves_to_its_own_message_when_full():
+    chunks = chunk_digest("H", ["x" * 15], "footer", limit=20)
+    assert chunks == ["H\n" + "x" * 15, "footer"]
+
+
+def test_overlong_line_is_truncated():
+    chunks = chunk_digest("H", ["y" * 30], limit=20)
+    assert chunks == ["H", "y" * 20]
+
+
+def test_limit_is_exact():
+    assert chunk_digest("12345", ["678"], limit=9) == ["12345\n678"]
+    assert chunk_digest("12345", ["6789"], limit=9) == ["12345", "6789"]
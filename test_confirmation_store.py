@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Tests for TTL expiry, eviction and persistence of pending confirmations"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services import state_file
+from services.confirmation_store import ConfirmationStore
+
+
+def run_store(store, scenario):
+    """Starts `store`, runs `scenario(store, expired)` and returns the (chat_id, message_id, data) it expired."""
+    async def main():
+        expired = []
+
+        async def on_expire(chat_id, message_id, data):
+            expired.append((chat_id, message_id, data))
+
+        await store.start(on_expire)
+        try:
+            await scenario(store, expired)
+        finally:
+            await store.stop()
+        return expired
+
+    return asyncio.run(main())
+
+
+def test_expires_after_ttl():
+    async def scenario(store, expired):
+        store.add(-1, 10, {"type": "text"})
+        await asyncio.sleep(0.02)
+        assert store.get(-1, 10) == {"type": "text"}
+        assert expired == []
+        await asyncio.sleep(0.1)
+
+    store = ConfirmationStore(ttl=0.05, max_size=10)
+    assert run_store(store, scenario) == [(-1, 10, {"type": "text"})]
+    assert store.get(-1, 10) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_answered_confirmation_never_expires():
+    async def scenario(store, expired):
+        store.add(-1, 10, "a")
+        assert store.pop(-1, 10) == "a"
+        assert store.pop(-1, 10) is None
+        await asyncio.sleep(0.1)
+
+    store = ConfirmationStore(ttl=0.05, max_size=10)
+    assert run_store(store, scenario) == []
+    assert store.stats()["resolved"] == 1
+
+
+def test_full_store_evicts_the_oldest():
+    async def scenario(store, expired):
+        for message_id in range(3):
+            store.add(-1, message_id, message_id)
+        await asyncio.sleep(0)
+        assert len(store) == 2
+        assert store.get(-1, 0) is None
+
+    store = ConfirmationStore(ttl=60, max_size=2)
+    assert run_store(store, scenario) == [(-1, 0, 0)]
+    assert store.stats()["evicted"] == 1
+
+
+def test_reload_expires_overdue_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "confirmations.json")
+        state_file.save(path, [[-1, 1, time.time() - 5, "overdue"], [-1, 2, time.time() + 60, "pending"]])
+
+        async def scenario(store, expired):
+            await asyncio.sleep(0.01)
+            assert store.get(-1, 2) == "pending"
+
+        assert run_store(ConfirmationStore(ttl=60, max_size=10, state_path=path), scenario) == [(-1, 1, "overdue")]
+        # Still-pending entries are saved again on stop
+        assert [entry[:2] for entry in state_file.load(path, [])] == [[-1, 2]]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Tests that stored media of different members never ends up at the same path"""
+
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import pytest
+from services.file_storage import FileStorage
+
+
+class FakeFile:
+    def __init__(self, file_unique_id, content):
+        self.file_unique_id = file_unique_id
+        self.content = content
+
+    async def download_to_drive(self, path):
+        with open(path, "wb") as f:
+            f.write(self.content)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("content_addressed", [False, True])
+def test_same_filename_from_two_members(content_addressed):
+    async def scenario(base_path):
+        storage = FileStorage(base_path, content_addressed=content_addressed)
+        # Members without a username get the same "_<slot>_<timestamp>.jpg" name within a second
+        first = await storage.save_photo(-1, 1, "", "Walk", FakeFile("a", b"first"), "_Walk_2024.jpg")
+        second = await storage.save_photo(-1, 2, "", "Walk", FakeFile("b", b"second"), "_Walk_2024.jpg")
+        assert first != second
+        assert (read(first), read(second)) == (b"first", b"second")
+
+    with tempfile.TemporaryDirectory() as base_path:
+        asyncio.run(scenario(base_path))
+
+
+def test_link_refuses_to_replace_different_contents():
+    with tempfile.TemporaryDirectory() as base_path:
+        source, same, other = (os.path.join(base_path, name) for name in ("source", "same", "other"))
+        for path, content in ((source, b"x"), (same, b"x"), (other, b"y")):
+            with open(path, "wb") as f:
+                f.write(content)
+
+        FileStorage._link(source, same)  # identical bytes already there
+        with pytest.raises(FileExistsError):
+            FileStorage._link(source, other)
+        assert read(other) == b"y"
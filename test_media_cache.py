@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Tests for LRU eviction and size accounting in the lazy media cache"""
+
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services.media_cache import MediaCache
+
+
+class FakeFile:
+    def __init__(self, size):
+        self.file_path = "photos/file_0.jpg"
+        self.size = size
+
+    async def download_to_drive(self, path):
+        with open(path, "wb") as f:
+            f.write(b"x" * self.size)
+
+
+class FakeBot:
+    """get_file for file ids of the form "<name>:<size>"; counts downloads."""
+
+    def __init__(self):
+        self.downloads = []
+
+    async def get_file(self, file_id):
+        self.downloads.append(file_id)
+        return FakeFile(int(file_id.split(":")[1]))
+
+
+def test_lru_eviction_and_size_accounting():
+    async def scenario(cache_path):
+        bot = FakeBot()
+        cache = MediaCache(cache_path, max_bytes=250)
+        cache.start(bot)
+        a = await cache.get("a:100")
+        await cache.get("b:100")
+        assert cache.stats()["bytes"] == 200
+
+        assert await cache.get("a:100") == a  # hit; "a" is now the most recently used
+        await cache.get("c:100")              # over the limit: "b" is evicted, not "a"
+        stats = cache.stats()
+        assert (stats["files"], stats["bytes"], stats["evicted"]) == (2, 200, 1)
+        assert os.path.exists(a)
+
+        await cache.get("b:100")
+        assert bot.downloads == ["a:100", "b:100", "c:100", "b:100"]
+        assert cache.stats()["bytes"] == 200
+        assert sum(entry.stat().st_size for entry in os.scandir(cache_path)) == 200
+
+        # A file bigger than the whole cache is kept until the next miss
+        await cache.get("d:300")
+        assert cache.stats()["files"] == 1 and cache.stats()["bytes"] == 300
+
+        # Sizes and order are rebuilt from disk on restart
+        restarted = MediaCache(cache_path, max_bytes=250)
+        restarted.start(bot)
+        assert restarted.stats()["bytes"] == 300
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        asyncio.run(scenario(cache_path))
+
+
+def test_resolve_prefers_stored_file():
+    async def scenario(cache_path):
+        bot = FakeBot()
+        cache = MediaCache(os.path.join(cache_path, "cache"), max_bytes=1000)
+        cache.start(bot)
+        stored = os.path.join(cache_path, "stored.jpg")
+        open(stored, "wb").close()
+
+        assert await cache.resolve({"local_file_path": stored, "telegram_file_id": "a:10"}) == stored
+        fetched = await cache.resolve({"local_file_path": stored + ".tar.gz#x.jpg", "telegram_file_id": "a:10"})
+        assert fetched.startswith(cache.cache_path.as_posix())
+        assert await cache.resolve({"local_file_path": None, "telegram_file_id": None}) is None
+        assert bot.downloads == ["a:10"]
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        asyncio.run(scenario(cache_path))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Tests that the media pipeline restores a saved backlog larger than its queue bound"""
+
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services import state_file
+from services.file_storage import FileStorage
+from services.media_pipeline import MediaDownloadPipeline
+
+
+def test_restores_backlog_over_queue_bound():
+    async def scenario(directory):
+        state_path = os.path.join(directory, "media_queue.json")
+        jobs = [{"file_id": f"file{i}"} for i in range(5)]
+        state_file.save(state_path, jobs)
+        pipeline = MediaDownloadPipeline(FileStorage(directory), None, workers=1, max_queue=2, state_path=state_path)
+        downloaded = []
+        release = asyncio.Event()
+
+        async def download(job, bot):
+            await release.wait()
+            downloaded.append(job["file_id"])
+
+        pipeline._download = download
+        await pipeline.start(bot=None)
+        assert state_file.load(state_path, None) == []
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(pipeline._queue.join(), 1)
+        await pipeline.stop()
+        return [job["file_id"] for job in jobs], downloaded
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected, downloaded = asyncio.run(scenario(directory))
+    assert downloaded == expected
+
+
+def test_lazy_photos_are_hashed_but_not_stored():
+    class FakeCache:
+        async def get(self, file_id):
+            return f"/cache/{file_id}"
+
+    class FakeProcessor:
+        async def hash(self, path):
+            return 0b1010 if path == "/cache/photo" else None
+
+    class FakeIndex:
+        enabled = True
+
+        def __init__(self):
+            self.checked = []
+
+        async def check(self, group_id, user_id, file_id, image_hash):
+            self.checked.append((group_id, user_id, file_id, image_hash))
+
+    async def lazy(group_id):
+        return "lazy"
+
+    async def scenario(directory):
+        index = FakeIndex()
+        pipeline = MediaDownloadPipeline(FileStorage(directory), None, image_processor=FakeProcessor(), photo_index=index,
+                                         storage_mode=lazy, media_cache=FakeCache())
+        # Not started, so the job runs inline
+        await pipeline.submit(None, -1, 7, "member", "Walk", "photo", "photo.jpg")
+        await pipeline.submit(None, -1, 7, "member", "Walk", "video", "video.mp4", media_type="video")
+        return index.checked, pipeline.counters
+
+    with tempfile.TemporaryDirectory() as directory:
+        checked, counters = asyncio.run(scenario(directory))
+        assert not os.path.exists(os.path.join(directory, "groups"))
+    assert checked == [(-1, 7, "photo", 0b1010)]
+    assert counters["lazy"] == 2
+    assert counters["downloaded"] == 0
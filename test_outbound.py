@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Tests for the outbound token buckets and the dispatcher's ordering"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from bot_utils import OutboundDispatcher, Priority, TokenBucket
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    bucket.consume(now)
+    bucket.consume(now)
+    assert bucket.wait_time(now) == 0.5
+    assert bucket.wait_time(now + 0.5) == 0
+    # Never refills past capacity
+    assert bucket.wait_time(now + 100) == 0
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.pause(10)
+    now = bucket.updated - 10
+    assert 9.9 < bucket.wait_time(now) <= 10
+    assert not bucket.idle
+    # Only a single request is let through when the pause is over
+    bucket.consume(bucket.updated)
+    assert bucket.wait_time(bucket.updated) == 1
+
+
+def run_dispatcher(dispatcher, requests):
+    """Submits (chat_id, name, priority) requests while nothing can be sent, then lets them through."""
+    async def scenario():
+        order = []
+        await dispatcher.start()
+        dispatcher.global_bucket.pause(0.05)
+
+        async def call(name):
+            order.append(name)
+
+        await asyncio.gather(*(dispatcher.submit(chat_id, lambda name=name: call(name), priority)
+                               for chat_id, name, priority in requests))
+        await dispatcher.stop()
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_dispatch_by_priority_then_arrival():
+    order = run_dispatcher(OutboundDispatcher(1000, 1000), [
+        (-1, "digest", Priority.DIGEST),
+        (-2, "announcement-1", Priority.ANNOUNCEMENT),
+        (-1, "interactive", Priority.INTERACTIVE),
+        (-3, "announcement-2", Priority.ANNOUNCEMENT),
+    ])
+    assert order == ["interactive", "announcement-1", "announcement-2", "digest"]
+
+
+def test_busy_group_does_not_hold_up_others():
+    async def scenario():
+        dispatcher = OutboundDispatcher(1000, 1)  # one message per group, then one a minute
+        await dispatcher.start()
+        sent = []
+
+        async def call(name):
+            sent.append(name)
+
+        first = asyncio.create_task(dispatcher.submit(-1, lambda: call("a1"), Priority.INTERACTIVE))
+        second = asyncio.create_task(dispatcher.submit(-1, lambda: call("a2"), Priority.INTERACTIVE))
+        await first
+        await asyncio.wait_for(dispatcher.submit(-2, lambda: call("b1"), Priority.DIGEST), 1)
+        assert not second.done()
+        assert dispatcher.stats()["interactive"] == 1
+        await dispatcher.stop()
+        await asyncio.gather(second, return_exceptions=True)
+        assert second.cancelled()
+        return sent
+
+    assert asyncio.run(scenario()) == ["a1", "b1"]
+
+
+def test_cleanup_has_its_own_bucket():
+    dispatcher = OutboundDispatcher(1000, 1, cleanup_rate_per_minute=60)
+    order = run_dispatcher(dispatcher, [(-1, "send", Priority.ANNOUNCEMENT), (-1, "delete", Priority.CLEANUP)])
+    assert order == ["send", "delete"]
+    assert dispatcher._bucket((-1, False)).tokens < 1
+    assert dispatcher._bucket((-1, True)).tokens >= 58
+    assert dispatcher._bucket((123, False)) is None
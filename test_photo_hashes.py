@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Tests for the BK-tree radius query behind re-post detection and the per-group hash index"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services import photo_hashes
+from services.photo_hashes import BKTree, PhotoHashIndex, hamming
+
+
+def test_hamming():
+    assert hamming(0, 0) == 0
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(0, 2 ** 64 - 1) == 64
+
+
+def test_radius_query_matches_brute_force():
+    rng = random.Random(42)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    # Near-duplicates of a few hashes, a handful of bits apart
+    for base in hashes[:20]:
+        hashes.append(base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)))
+    tree = BKTree()
+    for index, value in enumerate(hashes):
+        tree.add(value, index)
+    assert tree.size == len(hashes)
+
+    for query in hashes[:40] + [rng.getrandbits(64) for _ in range(20)]:
+        for radius in (0, 2, 6, 30):
+            expected = sorted((hamming(query, value), index) for index, value in enumerate(hashes)
+                              if hamming(query, value) <= radius)
+            assert sorted(tree.search(query, radius)) == expected
+
+
+def test_identical_hashes_share_a_node():
+    tree = BKTree()
+    tree.add(0b1111, "first")
+    tree.add(0b1111, "second")
+    tree.add(0b0111, "near")
+    assert sorted(tree.search(0b1111, 0)) == [(0, "first"), (0, "second")]
+    assert sorted(tree.search(0b1111, 1)) == [(0, "first"), (0, "second"), (1, "near")]
+    assert BKTree().search(0, 64) == []
+
+
+def test_slow_load_holds_up_only_its_own_group(monkeypatch):
+    class SlowDatabase:
+        """Hash loads of group -1 take until `release` is set; everything else returns at once."""
+
+        def __init__(self):
+            self.release = asyncio.Event()
+
+        async def get_recent_photo_hashes(self, group_id, days):
+            if group_id == -1:
+                await self.release.wait()
+            return [{"dhash": 0b1111, "user_id": 1, "telegram_file_id": f"old{group_id}", "created_at": time.time()}]
+
+        async def add_photo_hash(self, *args):
+            pass
+
+        async def flag_suspected_duplicate(self, *args):
+            pass
+
+    async def scenario():
+        database = SlowDatabase()
+        monkeypatch.setattr(photo_hashes, "db", database)
+        index = PhotoHashIndex(max_distance=2, window_days=30)
+        slow = asyncio.create_task(index.check(-1, 2, "new-1", 0b1111))
+        await asyncio.sleep(0.01)
+        assert await asyncio.wait_for(index.check(-2, 2, "new-2", 0b0111), 1) == "old-2"
+        assert not slow.done()
+        database.release.set()
+        assert await slow == "old-1"
+
+    asyncio.run(scenario())
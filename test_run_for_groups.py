@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Tests for the bounded per-group fan-out used by periodic jobs"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from bot_utils import run_for_groups
+
+
+def test_concurrency_is_bounded():
+    async def scenario():
+        running, peak, done = 0, 0, []
+
+        async def handler(group):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            done.append(group["group_id"])
+
+        await run_for_groups([{"group_id": -i} for i in range(10)], handler, "test_job", concurrency=3)
+        return peak, done
+
+    peak, done = asyncio.run(scenario())
+    assert peak == 3
+    assert sorted(done) == [-i for i in range(9, -1, -1)]
+
+
+def test_failing_group_does_not_stop_others():
+    async def scenario():
+        done = []
+
+        async def handler(group):
+            if group["group_id"] == -2:
+                raise RuntimeError("boom")
+            done.append(group["group_id"])
+
+        await run_for_groups([{"group_id": -1}, {"group_id": -2}, {"group_id": -3}], handler, "test_job", concurrency=1)
+        return done
+
+    assert asyncio.run(scenario()) == [-1, -3]
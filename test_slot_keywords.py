@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Tests for the per-slot compiled keyword matcher"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services import slot_keywords
+from services.slot_keywords import KeywordMatcher
+
+
+def test_keywords_match_as_substrings():
+    matcher = KeywordMatcher(["Workout", "gym"])
+    assert matcher.matches("Morning WORKOUT done")
+    assert matcher.matches("gymnastics")  # substring rule, unlike banned words
+    assert not matcher.matches("rest day")
+
+
+def test_keywords_are_escaped():
+    matcher = KeywordMatcher(["10k+", "(run)"])
+    assert matcher.matches("did 10k+ steps")
+    assert not matcher.matches("did 10kk steps")
+    assert matcher.matches("(run) done")
+    assert not matcher.matches("run done")
+
+
+def test_keywords_are_deduplicated():
+    matcher = KeywordMatcher(["Walk", "walk", "", None])
+    assert len(matcher) == 1
+    assert matcher.keywords == ["walk"]
+
+
+def test_no_keywords():
+    matcher = KeywordMatcher([])
+    assert not matcher
+    assert not matcher.matches("anything")
+    assert not KeywordMatcher(["walk"]).matches(None)
+
+
+def test_cache():
+    slot_keywords.invalidate()
+    matcher = slot_keywords.store(7, ["walk"])
+    assert slot_keywords.get_cached(7, 60) is matcher
+    assert slot_keywords.get_cached(7, 0) is None
+    slot_keywords.invalidate()
+    assert slot_keywords.get_cached(7, 60) is None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Tests for the in-memory slot schedule index: inclusive boundaries and slots that wrap past midnight"""
+
+import os
+import sys
+from datetime import datetime, time, timedelta
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services.slot_schedule import SlotSchedule, ist
+
+
+def at(hour, minute=0, second=0, day=1):
+    return ist.localize(datetime(2024, 1, day, hour, minute, second))
+
+
+def slot(slot_id, start, end):
+    return {"slot_id": slot_id, "start_time": start, "end_time": end}
+
+
+def active_id(schedule, now):
+    active = schedule.active_slot(now)
+    return active["slot_id"] if active else None
+
+
+# TIME columns arrive as timedelta from MySQL; strings and time objects are accepted too
+SLOTS = [
+    slot(1, timedelta(hours=6), timedelta(hours=8, minutes=59, seconds=59)),
+    slot(2, "09:00:00", "09:59:59"),
+    slot(3, time(22), time(1, 59, 59)),  # wraps past midnight
+]
+
+
+def test_boundaries_are_inclusive():
+    schedule = SlotSchedule(SLOTS)
+    assert active_id(schedule, at(5, 59, 59)) is None
+    assert active_id(schedule, at(6)) == 1
+    assert active_id(schedule, at(8, 59, 59)) == 1
+    assert active_id(schedule, at(9)) == 2  # adjacent slots hand over without a gap
+    assert active_id(schedule, at(9, 59, 59)) == 2
+    assert active_id(schedule, at(10)) is None
+
+
+def test_slot_wrapping_past_midnight():
+    schedule = SlotSchedule(SLOTS)
+    assert active_id(schedule, at(21, 59, 59)) is None
+    assert active_id(schedule, at(22)) == 3
+    assert active_id(schedule, at(23, 59, 59)) == 3
+    assert active_id(schedule, at(0)) == 3
+    assert active_id(schedule, at(1, 59, 59)) == 3
+    assert active_id(schedule, at(2)) is None
+
+
+def test_next_boundary():
+    schedule = SlotSchedule(SLOTS)
+    assert schedule.next_boundary(at(5)) == at(6)
+    assert schedule.next_boundary(at(6)) == at(9)
+    assert schedule.next_boundary(at(9, 30)) == at(10)
+    assert schedule.next_boundary(at(12)) == at(22)
+    # Midnight is not a boundary while the same slot stays active
+    assert schedule.next_boundary(at(23)) == at(2, day=2)
+    assert schedule.next_boundary(at(0, 30)) == at(2)
+
+
+def test_next_boundary_wraps_to_tomorrow():
+    schedule = SlotSchedule([slot(1, "08:00:00", "08:59:59")])
+    assert schedule.next_boundary(at(10)) == at(8, day=2)
+    assert schedule.next_boundary(at(8, 30)) == at(9)
+
+
+def test_overlapping_slots_first_start_wins():
+    schedule = SlotSchedule([slot(2, "08:30:00", "09:59:59"), slot(1, "08:00:00", "08:59:59")])
+    assert active_id(schedule, at(8, 45)) == 1
+    assert active_id(schedule, at(9)) == 2
+
+
+def test_no_slots():
+    schedule = SlotSchedule([])
+    assert schedule.active_slot(at(12)) is None
+    assert schedule.next_boundary(at(12)) is None
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Checks that a full update queue really blocks producers (the webhook server) with concurrent updates on"""
+
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+from services.update_processor import InFlightUpdateQueue, KeyedUpdateProcessor
+
+
+class LocalBotApi(BaseRequest):
+    """Answers getMe locally so the Application can start without reaching Telegram."""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        result = {"id": 1, "is_bot": True, "first_name": "Test", "username": "test_bot"} if url.endswith("/getMe") else True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def test_full_queue_blocks_producers():
+    async def scenario():
+        queue = InFlightUpdateQueue(maxsize=3, max_in_flight=2)
+        application = (Application.builder().token("1:test").request(LocalBotApi()).get_updates_request(LocalBotApi())
+                       .update_queue(queue).concurrent_updates(KeyedUpdateProcessor(8)).build())
+        release = asyncio.Event()
+        started = []
+
+        async def slow_handler(update, context):
+            started.append(update.update_id)
+            await release.wait()
+
+        application.add_handler(TypeHandler(Update, slow_handler))
+        async with application:
+            await application.start()
+            for update_id in range(5):  # 2 in flight + 3 queued
+                await asyncio.wait_for(queue.put(Update(update_id)), 1)
+            await asyncio.sleep(0.05)
+            assert len(started) == 2
+            assert queue.qsize() == 3
+
+            blocked = asyncio.create_task(queue.put(Update(99)))
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+
+            release.set()
+            await asyncio.wait_for(blocked, 1)
+            await asyncio.wait_for(queue.join(), 1)
+            await application.stop()
+        return started
+
+    assert len(asyncio.run(scenario())) == 6
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for per-member update ordering and the in-flight bound on the update queue"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from telegram import Chat, Message, Update, User
+from services.update_processor import InFlightUpdateQueue, KeyedUpdateProcessor
+
+
+def make_update(update_id, chat_id=-100, user_id=1):
+    message = Message(update_id, datetime.now(), Chat(chat_id, Chat.SUPERGROUP), from_user=User(user_id, "Member", False))
+    return Update(update_id, message=message)
+
+
+def test_update_key():
+    assert KeyedUpdateProcessor.update_key(make_update(1, chat_id=-100, user_id=7)) == (-100, 7)
+    assert KeyedUpdateProcessor.update_key(make_update(2, chat_id=-200, user_id=7)) == (-200, 7)
+    assert KeyedUpdateProcessor.update_key(Update(3)) is None
+    assert KeyedUpdateProcessor.update_key("not an update") is None
+
+
+def test_same_member_runs_in_order():
+    async def scenario():
+        processor = KeyedUpdateProcessor(8)
+        order = []
+
+        async def handle(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        # The first update of member 1 is slow, but their second still waits for it;
+        # member 2 in the same chat is not held up.
+        await asyncio.gather(
+            processor.process_update(make_update(1, user_id=1), handle("m1-first", 0.05)),
+            processor.process_update(make_update(2, user_id=1), handle("m1-second", 0)),
+            processor.process_update(make_update(3, user_id=2), handle("m2", 0)),
+        )
+        return order, processor._locks
+
+    order, locks = asyncio.run(scenario())
+    assert order.index("m1-first") < order.index("m1-second")
+    assert order[0] == "m2"
+    assert locks == {}
+
+
+def test_queue_bounds_updates_in_flight():
+    async def scenario():
+        queue = InFlightUpdateQueue(maxsize=1, max_in_flight=1)
+        await queue.put("a")
+        assert await queue.get() == "a"
+        await queue.put("b")
+
+        # The only in-flight slot is taken, so the next get waits even though "b" is queued...
+        second = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.01)
+        assert not second.done()
+        # ...and the queue stays full, so producers block.
+        put = asyncio.create_task(queue.put("c"))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+
+        queue.task_done()
+        assert await second == "b"
+        await asyncio.wait_for(put, 1)
+        assert queue.in_flight == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Tests that stopping the write-behind queue never loses queued writes"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from services.write_behind import WriteBehindQueue
+
+
+def test_stop_during_flush_keeps_batch():
+    async def scenario():
+        written = []
+        flushing = asyncio.Event()
+
+        async def run_sync(func, batch):
+            flushing.set()
+            await asyncio.sleep(0.05)  # a slow database round trip
+            written.extend(row for row, _ in batch)
+
+        queue = WriteBehindQueue(run_sync, None, "log", flush_interval_ms=10)
+        await queue.start()
+        queue.log_activity("first")
+        await flushing.wait()
+        queue.log_activity("second")  # arrives while "first" is being written
+        await queue.stop()
+        return written, queue.stats()
+
+    written, stats = asyncio.run(scenario())
+    assert written == ["first", "second"]
+    assert stats["pending_rows"] == 0
+    assert stats["rows_flushed"] == 2